@@ -1,16 +1,236 @@
+"""
+Preprocessing for the Kaggle dataset: cleans `dataset.csv` once and caches
+the result as an uncompressed Feather (Arrow IPC) file that the dashboards
+memory-map instead of re-parsing the CSV on every cold start.
+
+Run `python data/dataset_clean.py` to (re)build the cache by hand; the pages
+also rebuild it automatically whenever the source CSV changes.
+
+For datasets too large for memory, `python data/dataset_clean.py --parquet`
+instead cleans the CSV chunk by chunk into a genre-partitioned Parquet
+directory for the streamed backend (SPOTIFY_KAGGLE_BACKEND=parquet).
+"""
+import hashlib
+import os
+import shutil
+import sys
+
+import numpy as np
+
 import pandas as pd
-df=pd.read_csv("dataset.csv")
-print(df.head())
-print(df.tail())
-print(df.info())
-print(df.isnull())
-print(df.isnull().sum())
-print(df[df.album_name.isnull()])
-print(df.drop(65900,inplace=True))
-print(df.isnull().sum())
-df1=pd.read_csv("spotify_scrap.csv")
-print(df1.head())
-print(df1.isnull().sum())
-print(df1.info())
 
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+KAGGLE_CSV = os.path.join(DATA_DIR, "dataset.csv")
+KAGGLE_CACHE = os.path.join(DATA_DIR, "dataset.feather")
+KAGGLE_PARQUET = os.path.join(DATA_DIR, "dataset_parquet")
+
+CATEGORICAL_COLUMNS = ['artists', 'album_name', 'track_genre']
+FLOAT_COLUMNS = [
+    'danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo'
+]
+INT_COLUMNS = ['popularity', 'duration_ms', 'key', 'mode', 'time_signature']
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def clean_kaggle(df):
+    """Cleans the raw Kaggle frame and shrinks it to compact dtypes."""
+    df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed')])
+    df = df.dropna(subset=['track_name', 'artists', 'popularity', 'track_genre'])
+
+    # Ensure 'popularity' is numeric
+    df['popularity'] = pd.to_numeric(df['popularity'], errors='coerce')
+    df = df.dropna(subset=['popularity']) # Drop any rows where popularity couldn't be converted
+
+    # Handle duplicates (e.g., based on track name and artist)
+    df = df.drop_duplicates(subset=['track_name', 'artists'])
+
+    # Genres are compared case-insensitively across the dashboards
+    df['track_genre'] = df['track_genre'].astype(str).str.strip().str.lower()
+
+    # --- Compact dtypes ---
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce', downcast='float')
+    for col in INT_COLUMNS:
+        if col in df.columns and not df[col].isna().any():
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    if 'explicit' in df.columns:
+        df['explicit'] = df['explicit'].astype(bool)
+
+    return df.reset_index(drop=True)
+
+
+def _source_metadata(csv_path):
+    stat = os.stat(csv_path)
+    return {"source_size": str(stat.st_size), "source_mtime": str(stat.st_mtime_ns)}
+
+
+def build_cache(csv_path=KAGGLE_CSV, cache_path=KAGGLE_CACHE):
+    """Cleans the CSV and writes the Feather cache tagged with the CSV's size, mtime and content hash."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    df = clean_kaggle(pd.read_csv(csv_path))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({key.encode(): value.encode() for key, value in _source_metadata(csv_path).items()})
+    metadata[b"source_sha256"] = file_hash(csv_path).encode()
+
+    # Written to a temporary file first so a concurrent reader never sees a partial cache
+    tmp_path = cache_path + ".tmp"
+    feather.write_feather(table.replace_schema_metadata(metadata), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+    return df
+
+
+def _cache_is_current(csv_path, cache_path):
+    import pyarrow as pa
+
+    with pa.memory_map(cache_path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    metadata = {key.decode(): value.decode() for key, value in metadata.items()}
+    if "source_sha256" not in metadata:
+        return False
+    # Cheap check first; only re-hash the CSV when its size or mtime changed
+    current = _source_metadata(csv_path)
+    if all(metadata.get(key) == value for key, value in current.items()):
+        return True
+    return metadata["source_sha256"] == file_hash(csv_path)
+
+
+def load_clean_kaggle(csv_path=KAGGLE_CSV, cache_path=KAGGLE_CACHE):
+    """
+    Returns the cleaned Kaggle dataset. The Feather cache is memory-mapped when
+    it matches the source CSV; otherwise it is rebuilt from the CSV first.
+    Raises FileNotFoundError if neither the CSV nor a cache exist.
+    """
+    import pyarrow.feather as feather
+
+    if os.path.exists(cache_path) and (not os.path.exists(csv_path) or _cache_is_current(csv_path, cache_path)):
+        table = feather.read_table(cache_path, memory_map=True)
+        # split_blocks lets numeric columns without nulls stay views of the mapped file
+        return table.to_pandas(split_blocks=True)
+
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(csv_path)
+    return build_cache(csv_path, cache_path)
+
+
+def _fixed_dtypes(df):
+    """Same column types in every chunk whatever its values, so the Parquet files share one schema."""
+    return df.astype({
+        **{col: object for col in CATEGORICAL_COLUMNS if col in df.columns},
+        **{col: 'float32' for col in FLOAT_COLUMNS if col in df.columns},
+        **{col: 'Int64' for col in INT_COLUMNS if col in df.columns},
+    })
+
+
+def _cleaned_chunks(csv_path, chunksize):
+    """(first row number, cleaned chunk) over the CSV; row numbers count cleaned rows, so they repeat across reads."""
+    start = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        chunk = clean_kaggle(chunk)
+        yield start, chunk
+        start += len(chunk)
+
+
+def _duplicate_rows(csv_path, chunksize, scratch_dir):
+    """
+    Sorted row numbers of the cleaned rows whose (track_name, artists) was
+    already seen in an earlier row. The 64-bit key hash and row number of
+    every row (16 B) are spilled to on-disk buckets by hash, then each
+    bucket is deduplicated on its own: memory holds one chunk or one bucket
+    (about one per 64 MB of CSV) plus the duplicates found, never every key.
+    """
+    n_buckets = int(np.clip(os.path.getsize(csv_path) >> 26, 1, 256))
+    paths = [os.path.join(scratch_dir, f"keys-{bucket}.bin") for bucket in range(n_buckets)]
+    files = [open(path, 'wb') for path in paths]
+    try:
+        for start, chunk in _cleaned_chunks(csv_path, chunksize):
+            keys = pd.util.hash_pandas_object(chunk[['track_name', 'artists']].astype(str), index=False).to_numpy()
+            rows = np.arange(start, start + len(chunk), dtype=np.uint64)
+            buckets = keys % np.uint64(n_buckets)
+            for bucket in np.unique(buckets):
+                mine = buckets == bucket
+                np.column_stack([keys[mine], rows[mine]]).tofile(files[bucket])
+    finally:
+        for file in files:
+            file.close()
+
+    duplicates = []
+    for path in paths:
+        keys, rows = np.fromfile(path, dtype=np.uint64).reshape(-1, 2).T
+        os.remove(path)
+        # Rows were written in ascending order, so the first occurrence of a key is its first row
+        first = np.unique(keys, return_index=True)[1]
+        repeated = np.ones(len(rows), dtype=bool)
+        repeated[first] = False
+        duplicates.append(rows[repeated])
+    return np.sort(np.concatenate(duplicates)).astype(np.int64)
+
+
+def build_parquet_dataset(csv_path=KAGGLE_CSV, dataset_dir=KAGGLE_PARQUET, chunksize=1_000_000):
+    """
+    Cleans the CSV one chunk at a time into a Parquet dataset partitioned by
+    genre (`track_genre=<genre>/` directories). Duplicates are dropped across
+    chunks by (track_name, artists), first row kept as in `clean_kaggle`: a
+    first pass over the CSV finds them (see `_duplicate_rows`), a second
+    writes the remaining rows in CSV order. Returns the number of rows
+    written.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    tmp_dir = dataset_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    scratch_dir = os.path.join(tmp_dir, "_keys") # Not a partition directory, removed before writing
+    os.makedirs(scratch_dir)
+    duplicates = _duplicate_rows(csv_path, chunksize, scratch_dir)
+    os.rmdir(scratch_dir)
+
+    rows = 0
+    for i, (start, chunk) in enumerate(_cleaned_chunks(csv_path, chunksize)):
+        lo, hi = np.searchsorted(duplicates, [start, start + len(chunk)])
+        keep = np.ones(len(chunk), dtype=bool)
+        keep[duplicates[lo:hi] - start] = False
+        chunk = chunk[keep]
+        # Without the pandas metadata, integer columns read back as NumPy ints rather than nullable Int64
+        table = pa.Table.from_pandas(_fixed_dtypes(chunk), preserve_index=False).replace_schema_metadata(None)
+        ds.write_dataset(table, tmp_dir, format="parquet", partitioning=['track_genre'], partitioning_flavor="hive",
+                         basename_template=f"part-{i}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore")
+        rows += len(chunk)
+
+    # Swapped in whole so a reader never sees a partial dataset
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    os.replace(tmp_dir, dataset_dir)
+    return rows
+
+
+if __name__ == "__main__":
+    if "--parquet" in sys.argv[1:]:
+        rows = build_parquet_dataset()
+        print(f"Wrote {KAGGLE_PARQUET} ({rows:,} rows)")
+        sys.exit()
+
+    df = build_cache()
+    print(f"Wrote {KAGGLE_CACHE} ({len(df):,} rows)")
+    print(df.info())
+    print(df.isnull().sum())
 
+    df1 = pd.read_csv(os.path.join(DATA_DIR, "spotify_scrap.csv"))
+    print(df1.head())
+    print(df1.isnull().sum())
+    print(df1.info())
@@ -1,66 +1,45 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
+from utils.charts import box_figure, feature_bin_edges, histogram_counts, histogram_figure
+from utils.compare import summary_table
+from utils.index import top_k
+from utils.load import load_kaggle_backend, load_kaggle_summary, refresh_scraped
+
 # --- Page Setup ---
 st.set_page_config(page_title="Spotify Dataset Comparison", layout="wide")
 st.title("📊 Spotify Dataset Comparison: Scraped vs Kaggle")
 
 # --- Load Data ---
-@st.cache_data
-def load_data():
-    df_scraped = pd.read_csv(r'C:\Users\Savy\OneDrive\Desktop\spotify\imp\spotify-analysis\data\spotify_scrap.csv')
-    df_kaggle = pd.read_csv(r'C:\Users\Savy\OneDrive\Desktop\spotify\imp\spotify-analysis\data\dataset.csv')
-    return df_scraped, df_kaggle
-
-df_scraped, df_kaggle = load_data()
-
-# --- Rename & Normalize ---
-df_scraped = df_scraped.rename(columns={
-    'Song Name': 'track_name',
-    'Artist Name': 'artists',
-    'Album Name': 'album',
-    'Release Date': 'release_date',
-    'Popularity': 'popularity'
-})
-df_scraped['Source'] = 'Scraped'
-df_kaggle['Source'] = 'Kaggle'
-
-# Ensure popularity is numeric
-df_scraped['popularity'] = pd.to_numeric(df_scraped['popularity'], errors='coerce')
-df_kaggle['popularity'] = pd.to_numeric(df_kaggle['popularity'], errors='coerce')
-
-# Add placeholder genre if missing
-if 'track_genre' not in df_scraped.columns:
-    df_scraped['track_genre'] = 'unknown'
-
-# Combine for shared analysis
-common_cols = list(set(df_scraped.columns) & set(df_kaggle.columns))
-df_combined = pd.concat([df_scraped[common_cols], df_kaggle[common_cols]], ignore_index=True)
+# Each source is summarized in one chunked pass when first loaded and the
+# summary is cached; the page only reads these small per-source results.
+# Everything scraped comes from one snapshot, so a run sees one version.
+audio_features = ['danceability', 'energy', 'tempo', 'valence']
+try:
+    scraped = refresh_scraped()
+except FileNotFoundError as error:
+    st.error(f"Error: {error}. Run the scraper (utils/main.py) or set SPOTIFY_SCRAPED_PATH.")
+    st.stop()
+summaries = {"Scraped": scraped.summary(audio_features), "Kaggle": load_kaggle_summary(tuple(audio_features))}
 
 # --- Summary Table ---
 st.subheader("🔍 Summary Statistics")
-summary = pd.DataFrame({
-    "Total Tracks": [len(df_scraped), len(df_kaggle)],
-    "Unique Artists": [df_scraped['artists'].nunique(), df_kaggle['artists'].nunique()],
-    "Avg Popularity": [df_scraped['popularity'].mean(), df_kaggle['popularity'].mean()],
-    "Top Genre": [
-        df_scraped['track_genre'].mode()[0] if not df_scraped['track_genre'].isna().all() else "N/A",
-        df_kaggle['track_genre'].mode()[0] if not df_kaggle['track_genre'].isna().all() else "N/A"
-    ]
-}, index=["Scraped", "Kaggle"])
-st.dataframe(summary)
+st.dataframe(summary_table(list(summaries.values())))
+estimated = [summary.name for summary in summaries.values() if not summary.artists.is_exact]
+if estimated:
+    st.caption(f"Unique Artists for {', '.join(estimated)} is approximate: it is estimated from a distinct-count "
+               "sketch (standard error about 1.6%).")
 
 # --- Genre Distribution (Relative % Bar) ---
 st.subheader("🎼 Genre Distribution (Top 10 by Source, % Share)")
 
-def top_genres_percent(df, source_label):
-    genre_counts = df['track_genre'].value_counts(normalize=True).head(10) * 100
-    return pd.DataFrame({'Genre': genre_counts.index, 'Percentage': genre_counts.values, 'Source': source_label})
+def top_genres_percent(summary):
+    genre_shares = summary.genre_shares(10)
+    return pd.DataFrame({'Genre': genre_shares.index, 'Percentage': genre_shares.values, 'Source': summary.name})
 
-genre_scraped = top_genres_percent(df_scraped, "Scraped")
-genre_kaggle = top_genres_percent(df_kaggle, "Kaggle")
-genre_df = pd.concat([genre_scraped, genre_kaggle])
+genre_df = pd.concat([top_genres_percent(summary) for summary in summaries.values()])
 
 fig_genre = px.bar(
     genre_df,
@@ -74,35 +53,50 @@ fig_genre = px.bar(
 st.plotly_chart(fig_genre, use_container_width=True)
 
 # --- Popularity Comparison (Box Plot) ---
+# Drawn from quantile sketches: only the box statistics and an outlier sample reach the browser
 st.subheader("🌟 Popularity Distribution")
-fig_pop = px.box(
-    df_combined,
-    x="Source",
-    y="popularity",
+fig_pop = box_figure(
+    {source: summary.popularity.box_summary() for source, summary in summaries.items()},
     title="Popularity Distribution (Box Plot)",
-    template="plotly_white"
+    yaxis_title="popularity"
 )
 st.plotly_chart(fig_pop, use_container_width=True)
 
+# --- Matched Tracks (Popularity Deltas) ---
+st.subheader("🔗 Tracks in Both Datasets")
+matches = scraped.matches
+if not matches.empty:
+    n_scraped = summaries["Scraped"].count
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Matched Tracks", f"{len(matches):,}", f"{len(matches) / n_scraped:.1%} of scraped", delta_color="off")
+    col2.metric("Fuzzy Matches", f"{(matches['match'] == 'fuzzy').sum():,}")
+    col3.metric("Avg Popularity Change", f"{matches['popularity_delta'].mean():+.2f}")
+
+    delta = matches['popularity_delta'].to_numpy()
+    delta_edges = feature_bin_edges(delta, 20)
+    fig_delta = histogram_figure(
+        delta_edges, histogram_counts(delta, delta_edges),
+        title="Scraped minus Kaggle Popularity", xaxis_title="Popularity change", yaxis_title="Tracks"
+    )
+    st.plotly_chart(fig_delta, use_container_width=True)
+
+    st.write("#### Largest Popularity Changes")
+    biggest = matches.iloc[top_k(np.abs(delta), 10)]
+    st.dataframe(biggest[['track_name', 'artists', 'kaggle_popularity', 'scraped_popularity', 'popularity_delta', 'match']])
+else:
+    st.info("No scraped tracks could be matched to Kaggle tracks.")
+
 # --- Optional Audio Feature Comparison ---
-audio_features = ['danceability', 'energy', 'tempo', 'valence']
-available = [f for f in audio_features if f in df_scraped.columns and f in df_kaggle.columns]
+available = [f for f in audio_features if all(f in summary.features for summary in summaries.values())]
 
 if available:
     st.subheader("🎧 Audio Feature Comparison")
     feature = st.selectbox("Select Audio Feature", available)
 
-    df_feat = pd.concat([
-        df_scraped[[feature]].assign(Source="Scraped"),
-        df_kaggle[[feature]].assign(Source="Kaggle")
-    ])
-
-    fig_feat = px.box(
-        df_feat,
-        x="Source",
-        y=feature,
+    fig_feat = box_figure(
+        {source: summary.features[feature].box_summary() for source, summary in summaries.items()},
         title=f"{feature.title()} Comparison (Box Plot)",
-        template="plotly_white"
+        yaxis_title=feature
     )
     st.plotly_chart(fig_feat, use_container_width=True)
 else:
@@ -111,9 +105,9 @@ else:
 # --- Raw Data (Optional Expanders) ---
 st.subheader("📂 Raw Data (First 10 Rows)")
 with st.expander("View Scraped Dataset"):
-    st.dataframe(df_scraped.head(10))
+    st.dataframe(scraped.as_kaggle.head(10))
 with st.expander("View Kaggle Dataset"):
-    st.dataframe(df_kaggle.head(10))
+    st.dataframe(load_kaggle_backend().head(10))
 
 # Footer
 st.markdown("---")
@@ -4,6 +4,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 
+from utils.charts import histogram_figure, lod_scatter, scatter_caption
+from utils.load import load_kaggle_backend, result_cache, result_cache_sidebar
+from utils.memo import filter_signature
+
 
 def add_bg_image():
     st.markdown(
@@ -31,51 +35,26 @@ st.set_page_config(
 
 # --- Data Loading and Preprocessing ---
 
-@st.cache_data
 def load_data():
     """
-    Loads the Spotify dataset ('dataset.csv'), performs initial cleaning and preprocessing
-    based on the provided column names.
+    Returns the shared query backend for the cleaned Spotify dataset: the
+    in-memory frame with its prebuilt indexes and cubes, or a streamed
+    Parquet dataset for data that does not fit in memory (utils/backend.py).
+    It is cached once per server process and must not be modified.
     """
-    try:
-        df = pd.read_csv(r'C:\Users\Savy\OneDrive\Desktop\spotify\imp\spotify-analysis\data\dataset.csv')
-    except FileNotFoundError:
-        st.error("Error: 'dataset.csv' not found. Please ensure the dataset is in the same directory as 'app.py'.")
-        st.stop() 
-
-    # --- Basic Data Cleaning ---
-   
-    initial_rows = df.shape[0]
-    df.dropna(subset=['track_name', 'artists', 'popularity', 'track_genre'], inplace=True)
-    
-    # Ensure 'popularity' is numeric
-    df['popularity'] = pd.to_numeric(df['popularity'], errors='coerce')
-    df.dropna(subset=['popularity'], inplace=True) # Drop any rows where popularity couldn't be converted
-
-    # Handle duplicates (e.g., based on track name and artist)
-    df.drop_duplicates(subset=['track_name', 'artists'], inplace=True)
-
-    
-    if 'artists' in df.columns:
-        df['artists'] = df['artists'].apply(lambda x: x.strip("[]").replace("'", "").split(", ") if isinstance(x, str) else [])
-       
-        df_exploded = df.explode('artists')
-        df_exploded['artists'] = df_exploded['artists'].str.strip() # Remove any leading/trailing whitespace
-    else:
-        st.warning("No 'artists' column found. Artist-based analysis will be limited.")
-        df_exploded = df.copy() # Create a copy to avoid errors later
+    backend = load_kaggle_backend()
 
-    # Clean 'track_genre' column (ensure consistency, handle potential leading/trailing spaces)
-    if 'track_genre' in df.columns:
-        df['track_genre'] = df['track_genre'].astype(str).str.strip().str.lower()
-        df_exploded['track_genre'] = df_exploded['track_genre'].astype(str).str.strip().str.lower()
-    else:
-        st.warning("No 'track_genre' column found. Genre-based analysis will be limited.")
+    if 'artists' not in backend.columns:
+        st.warning("No 'artists' column found. Artist-based analysis will be limited.")
 
-    return df, df_exploded # Return both original and exploded for different analyses
+    return backend
 
 # Load the data
-df_original, df_exploded_artists = load_data()
+try:
+    backend = load_data()
+except FileNotFoundError:
+    st.error("Error: 'dataset.csv' not found. Please ensure the dataset is in the 'data' directory or set SPOTIFY_KAGGLE_CSV.")
+    st.stop()
 
 
 audio_features = [
@@ -83,7 +62,7 @@ audio_features = [
     'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms'
 ]
 # Filter out features that might not exist in the loaded data (safety check)
-audio_features = [f for f in audio_features if f in df_original.columns]
+audio_features = [f for f in audio_features if f in backend.columns]
 
 # --- Streamlit App Title and Introduction ---
 st.title("🎵 Spotify Data Analysis Dashboard")
@@ -105,24 +84,27 @@ popularity_range = st.sidebar.slider(
     max_value=100,
     value=(0, 100)
 )
-df_filtered = df_original[
-    (df_original['popularity'] >= popularity_range[0]) &
-    (df_original['popularity'] <= popularity_range[1])
-].copy()
 
 # Genre Multiselect Filter
-all_genres = sorted(df_original['track_genre'].unique().tolist()) if 'track_genre' in df_original.columns else []
+all_genres = sorted(backend.genres)
 selected_genres = st.sidebar.multiselect(
     "Select Genres",
     options=all_genres,
     default=all_genres
 )
 
-if selected_genres:
-    df_filtered = df_filtered[df_filtered['track_genre'].isin(selected_genres)].copy()
-else:
+if not selected_genres:
     st.sidebar.info("No genres selected. Showing all tracks within popularity range.")
 
+selected_genre_codes = backend.genre_codes_for(selected_genres)
+
+# Results derived from the filters are shared by all sessions; "no genres"
+# and "all genres" select the same codes and so share a key
+cache = result_cache()
+result_cache_sidebar()
+filter_key = filter_signature(backend=backend.name, popularity_range=tuple(popularity_range),
+                              genres=selected_genre_codes)
+
 
 # Selectbox for Audio Feature Distribution
 selected_feature_dist = st.sidebar.selectbox(
@@ -140,22 +122,26 @@ y_feature = st.sidebar.selectbox("Y-axis Feature", audio_features, index=audio_f
 # Row 1: Key Metrics and Data Sample
 st.subheader("Key Metrics & Filtered Data Sample")
 col1, col2, col3 = st.columns(3)
+# Summed from the precomputed cube cells, not from the filtered rows
+total_tracks, avg_popularity, avg_duration_ms = backend.totals(popularity_range, selected_genres)
 with col1:
-    st.metric("Total Tracks (Filtered)", f"{df_filtered.shape[0]:,}")
+    st.metric("Total Tracks (Filtered)", f"{total_tracks:,}")
 with col2:
-    if 'popularity' in df_filtered.columns:
-        st.metric("Average Popularity", f"{df_filtered['popularity'].mean():.2f}")
+    if 'popularity' in backend.columns:
+        st.metric("Average Popularity", f"{avg_popularity:.2f}")
     else:
         st.metric("Average Popularity", "N/A")
 with col3:
-    if 'duration_ms' in df_filtered.columns:
-        st.metric("Avg. Track Duration (min)", f"{(df_filtered['duration_ms'] / 60000).mean():.2f}")
+    if 'duration_ms' in backend.columns:
+        st.metric("Avg. Track Duration (min)", f"{avg_duration_ms / 60000:.2f}")
     else:
         st.metric("Avg. Track Duration (min)", "N/A")
 
 st.markdown("---")
 st.write("### Filtered Data Preview")
-st.dataframe(df_filtered.head(10)) # Display first 10 rows of filtered data
+preview = cache.get_or_compute(('insights', 'preview', filter_key),
+                               lambda: backend.preview(10, popularity_range, selected_genres))
+st.dataframe(preview) # Display first 10 rows of filtered data
 
 st.markdown("---")
 
@@ -164,24 +150,28 @@ col_dist, col_genres = st.columns(2)
 
 with col_dist:
     st.subheader(f"Distribution of {selected_feature_dist.replace('_', ' ').title()}")
-    if selected_feature_dist in df_filtered.columns:
-        fig_dist = px.histogram(
-            df_filtered,
-            x=selected_feature_dist,
-            nbins=30,
+    if selected_feature_dist in backend.columns:
+        # Binned on the server: only the bin counts are sent to the browser
+        edges, counts = cache.get_or_compute(
+            ('insights', 'histogram', filter_key, selected_feature_dist),
+            lambda: backend.histogram(selected_feature_dist, popularity_range, selected_genres, 30)
+        )
+        fig_dist = histogram_figure(
+            edges,
+            counts,
             title=f'Distribution of {selected_feature_dist.replace("_", " ").title()}',
-            template="plotly_white",
-            color_discrete_sequence=px.colors.qualitative.Plotly
+            xaxis_title=selected_feature_dist.replace("_", " ").title(),
+            yaxis_title="Number of Tracks",
+            color=px.colors.qualitative.Plotly[0]
         )
-        fig_dist.update_layout(xaxis_title=selected_feature_dist.replace("_", " ").title(), yaxis_title="Number of Tracks")
         st.plotly_chart(fig_dist, use_container_width=True)
     else:
         st.warning(f"'{selected_feature_dist}' column not found in data.")
 
 with col_genres:
     st.subheader("Top Genres by Track Count")
-    if 'track_genre' in df_filtered.columns:
-        genre_counts = df_filtered['track_genre'].value_counts().head(10).reset_index()
+    if 'track_genre' in backend.columns:
+        genre_counts = backend.genre_counts(popularity_range, selected_genres).head(10).reset_index()
         genre_counts.columns = ['Genre', 'Count']
         fig_genres = px.bar(
             genre_counts,
@@ -205,10 +195,9 @@ col_corr, col_scatter = st.columns(2)
 
 with col_corr:
     st.subheader("Correlation Heatmap of Audio Features")
-    # Select only numeric columns for correlation
-    numeric_df = df_filtered[audio_features]
-    if not numeric_df.empty:
-        corr_matrix = numeric_df.corr()
+    # Assembled from per-(genre, popularity) partial sums instead of a pass over the filtered rows
+    corr_matrix = backend.correlation(audio_features, popularity_range, selected_genres) if audio_features else None
+    if corr_matrix is not None:
         fig_corr = px.imshow(
             corr_matrix,
             text_auto=True,
@@ -222,13 +211,21 @@ with col_corr:
 
 with col_scatter:
     st.subheader(f"Scatter Plot: {x_feature.replace('_', ' ').title()} vs. {y_feature.replace('_', ' ').title()}")
-    if x_feature in df_filtered.columns and y_feature in df_filtered.columns:
-        fig_scatter = px.scatter(
-            df_filtered,
-            x=x_feature,
-            y=y_feature,
+    if x_feature in backend.columns and y_feature in backend.columns:
+        hover_data = ['artists', 'popularity', 'track_genre']
+        points, total = cache.get_or_compute(
+            ('insights', 'scatter', filter_key, x_feature, y_feature),
+            # The most popular tracks are always drawn
+            lambda: backend.scatter_points(x_feature, y_feature, popularity_range, selected_genres,
+                                           [x_feature, y_feature, 'track_name'] + hover_data)
+        )
+        fig_scatter, total_points, drawn_points = lod_scatter(
+            points,
+            x_feature,
+            y_feature,
+            sample=(np.arange(len(points)), total),
             hover_name="track_name", # Show track name on hover
-            hover_data=['artists', 'popularity', 'track_genre'], # Add more info on hover
+            hover_data=hover_data, # Add more info on hover
             title=f'{x_feature.replace("_", " ").title()} vs. {y_feature.replace("_", " ").title()}',
             template="plotly_white",
             color_discrete_sequence=px.colors.qualitative.Plotly
@@ -238,6 +235,7 @@ with col_scatter:
             yaxis_title=y_feature.replace("_", " ").title()
         )
         st.plotly_chart(fig_scatter, use_container_width=True)
+        st.caption(scatter_caption(total_points, drawn_points))
     else:
         st.warning(f"Selected features '{x_feature}' or '{y_feature}' not found in data.")
 
@@ -247,22 +245,12 @@ st.markdown("---")
 st.subheader("Top Artists and Tracks")
 col_top_artists, col_top_tracks = st.columns(2)
 
-# Filter df_exploded_artists based on current filters
-df_exploded_artists_filtered = df_exploded_artists[
-    (df_exploded_artists['popularity'] >= popularity_range[0]) &
-    (df_exploded_artists['popularity'] <= popularity_range[1])
-].copy()
-
-if selected_genres and 'track_genre' in df_exploded_artists_filtered.columns:
-    df_exploded_artists_filtered = df_exploded_artists_filtered[
-        df_exploded_artists_filtered['track_genre'].isin(selected_genres)
-    ].copy()
-
-
-if 'artists' in df_exploded_artists_filtered.columns and 'popularity' in df_exploded_artists_filtered.columns:
+if 'artists' in backend.columns and 'popularity' in backend.columns:
     with col_top_artists:
         st.write("#### Top 10 Artists by Average Popularity (Filtered)")
-        top_artists = df_exploded_artists_filtered.groupby('artists')['popularity'].mean().sort_values(ascending=False).head(10).reset_index()
+        top_artists = cache.get_or_compute(('insights', 'top_artists', filter_key),
+                                           lambda: backend.top_artists(10, popularity_range, selected_genres))
+        top_artists = top_artists.rename_axis('artists').reset_index(name='popularity')
 
         if not top_artists.empty:
             fig_top_artists = px.bar(
@@ -282,17 +270,60 @@ if 'artists' in df_exploded_artists_filtered.columns and 'popularity' in df_expl
 
     with col_top_tracks:
         st.write("#### Top 10 Most Popular Tracks (Filtered)")
-        top_tracks = df_filtered.sort_values(by='popularity', ascending=False).head(10)
+        # Early-exit scan down the presorted popularity levels, or a running top 10 over a streamed scan
+        top_tracks = cache.get_or_compute(
+            ('insights', 'top_tracks', filter_key),
+            lambda: backend.top_tracks(10, popularity_range, selected_genres,
+                                       ['track_name', 'artists', 'popularity', 'track_genre'])
+        )
         if not top_tracks.empty:
-            st.dataframe(top_tracks[['track_name', 'artists', 'popularity', 'track_genre']])
+            st.dataframe(top_tracks)
         else:
             st.info("No tracks found for the selected filters.")
 else:
     st.info("Top artists/tracks analysis not available: Missing 'artists' or 'popularity' column.")
 
+st.markdown("---")
+
+# Row 5: Similar Tracks
+st.subheader("🎯 Tracks Like This")
+st.write("Find a track to list the most similar tracks by audio features, within the filters in the sidebar.")
+col_search, col_k = st.columns([3, 1])
+with col_search:
+    search_text = st.text_input("Search for a track by name", "")
+with col_k:
+    n_similar = st.slider("Number of similar tracks", min_value=5, max_value=25, value=10)
+
+if search_text.strip() and audio_features:
+    found_tracks = cache.get_or_compute(('insights', 'search', backend.name, search_text.strip().lower()),
+                                        lambda: backend.search_tracks(search_text.strip()))
+    if not found_tracks.empty:
+        track_position = st.selectbox(
+            "Select a track",
+            range(len(found_tracks)),
+            format_func=lambda i: (f"{found_tracks['track_name'].iloc[i]} — {found_tracks['artists'].iloc[i]}"
+                                   f" ({found_tracks['track_genre'].iloc[i]})")
+        )
+        track = found_tracks.iloc[track_position]
+        # Brute force over the filtered rows' standardized feature vectors
+        similar = cache.get_or_compute(
+            ('insights', 'similar', filter_key, track.name, track['track_name'], track['artists'], n_similar),
+            lambda: backend.similar_tracks(track, n_similar, popularity_range, selected_genres, audio_features,
+                                           ['track_name', 'artists', 'popularity', 'track_genre'])
+        )
+        if not similar.empty:
+            st.dataframe(similar[['track_name', 'artists', 'popularity', 'track_genre', 'distance']])
+        else:
+            st.info("No other tracks found for the selected filters.")
+    else:
+        st.info(f"No tracks found matching '{search_text}'.")
+
 st.markdown("---")
 st.markdown("### Raw Data (Full Dataset)")
 if st.checkbox("Show raw data"):
-    st.dataframe(df_original)
+    raw_data = backend.raw_data()
+    if len(raw_data) < backend.row_count:
+        st.caption(f"First {len(raw_data):,} of {backend.row_count:,} tracks.")
+    st.dataframe(raw_data)
 
 
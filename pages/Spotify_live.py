@@ -1,10 +1,15 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
 from PIL import Image
 
+from utils.charts import feature_bin_edges, histogram_counts, histogram_figure, lod_scatter, scatter_caption
+from utils.index import top_k
+from utils.load import refresh_scraped, result_cache, result_cache_sidebar
+from utils.memo import filter_signature
+from utils.words import word_cloud_png
+
 # Page configuration
 st.set_page_config(page_title="Spotify Dashboard",  layout="wide")
 # Background image CSS
@@ -24,17 +29,16 @@ page_bg_img = """
 """
 st.markdown(page_bg_img, unsafe_allow_html=True)
 
-# Load dataset
-@st.cache_data
-def load_data():
-    df = pd.read_csv(r"C:\Users\Savy\OneDrive\Desktop\spotify\imp\spotify-analysis\data\spotify_scrap.csv")
-    df.dropna(subset=['Song Name', 'Artist Name', 'Album Name', 'Release Date', 'Popularity'], inplace=True)
-    df['Release Date'] = pd.to_datetime(df['Release Date'], errors='coerce')
-    df.dropna(subset=['Release Date'], inplace=True)
-    df['Release Year'] = df['Release Date'].dt.year
-    return df
-
-df = load_data()
+# Load dataset (shared across pages and sessions; must not be modified). Rows the
+# scraper appended since the last run are folded in first, and everything this
+# run shows is read from the one snapshot, so it never mixes two versions.
+try:
+    scraped = refresh_scraped()
+except FileNotFoundError as error:
+    st.error(f"Error: {error}. Run the scraper (utils/main.py) or set SPOTIFY_SCRAPED_PATH.")
+    st.stop()
+df = scraped.timeline
+rollup = scraped.rollup # Per-(year, artist) counts for the filters and time charts
 
 # Sidebar UI
 try:
@@ -46,17 +50,27 @@ st.sidebar.title("Spotify Dashboard")
 menu = st.sidebar.radio("Go to", ["Home", "Popularity Insights", "Album Analysis", "Time Trends", "Word Cloud", "Raw Data"])
 
 # Sidebar Filters (Release Year)
-min_year = int(df['Release Year'].min())
-max_year = int(df['Release Year'].max())
+min_year, max_year = rollup.year_bounds
 year_range = st.sidebar.slider("Filter by Release Year", min_year, max_year, (min_year, max_year))
-df_filtered = df[(df['Release Year'] >= year_range[0]) & (df['Release Year'] <= year_range[1])]
 
 # Sidebar Filters (Artist — now optional)
-artist_options = sorted(df_filtered['Artist Name'].unique())
+artist_options = rollup.artists_in(year_range)
 selected_artists = st.sidebar.multiselect("Select Artists (optional)", artist_options)
 
-if selected_artists:
-    df_filtered = df_filtered[df_filtered['Artist Name'].isin(selected_artists)]
+# Filtered row positions and other filter-dependent results are shared by all sessions
+cache = result_cache()
+result_cache_sidebar()
+filter_key = filter_signature(data_version=scraped.version, year_range=tuple(year_range), artists=selected_artists)
+
+
+def filtered_positions():
+    mask = df['Release Year'].between(year_range[0], year_range[1])
+    if selected_artists:
+        mask &= df['Artist Name'].isin(selected_artists)
+    return np.flatnonzero(mask.to_numpy())
+
+
+df_filtered = df.iloc[cache.get_or_compute(('live', 'rows', filter_key), filtered_positions)]
 
 # --- Home ---
 if menu == "Home":
@@ -72,12 +86,13 @@ if menu == "Home":
     col_left, col_right = st.columns([2, 1])  # left: text & metrics, right: image
 
     with col_left:
-        st.write(f"🎯 Showing **{df_filtered.shape[0]}** songs out of **{df.shape[0]}** total songs.")
+        song_count, artist_count, mean_popularity = rollup.totals(year_range, selected_artists)
+        st.write(f"🎯 Showing **{song_count}** songs out of **{df.shape[0]}** total songs.")
 
         col1, col2, col3 = st.columns(3)
-        col1.metric("🎶 Total Songs", f"{df_filtered.shape[0]}")
-        col2.metric("🧑‍🎤 Unique Artists", df_filtered['Artist Name'].nunique())
-        col3.metric("🔥 Avg Popularity", f"{df_filtered['Popularity'].mean():.2f}")
+        col1.metric("🎶 Total Songs", f"{song_count}")
+        col2.metric("🧑‍🎤 Unique Artists", artist_count)
+        col3.metric("🔥 Avg Popularity", f"{mean_popularity:.2f}")
 
     with col_right:
         st.image("https://c.ndtvimg.com/2025-04/ogp7i0fc_spotify-erhht-im-sommer-2025-erneut-die-preise-jhrlich-wird-das-zur-regel_625x300_30_April_25.jpg?im=FitAndFill,algorithm=dnn,width=1200,height=738", use_column_width=True, caption="Spotify Vibes 🎵")
@@ -86,12 +101,15 @@ if menu == "Home":
 # --- Popularity Insights ---
 elif menu == "Popularity Insights":
     st.subheader("Popularity Distribution")
-    fig_pop = px.histogram(df_filtered, x="Popularity", nbins=20, color_discrete_sequence=px.colors.sequential.RdBu)
-    fig_pop.update_layout(xaxis_title="Popularity", yaxis_title="Number of Songs")
+    # Binned on the server with edges fixed across filters; only the counts reach the browser
+    popularity_edges = scraped.bin_edges("Popularity", 20, feature_bin_edges)
+    fig_pop = histogram_figure(popularity_edges, histogram_counts(df_filtered["Popularity"], popularity_edges),
+                               xaxis_title="Popularity", yaxis_title="Number of Songs",
+                               template=None, color=px.colors.sequential.RdBu[0])
     st.plotly_chart(fig_pop, use_container_width=True)
 
     st.subheader("Top 10 Songs by Popularity")
-    top_songs = df_filtered.sort_values(by="Popularity", ascending=False).head(10)
+    top_songs = df_filtered.iloc[top_k(df_filtered["Popularity"].to_numpy(dtype=float), 10)]
     fig_top = px.bar(top_songs, x="Popularity", y="Song Name", color='Artist Name', orientation='h',
                      title="Top Songs", color_discrete_sequence=px.colors.qualitative.Pastel)
     st.plotly_chart(fig_top, use_container_width=True)
@@ -107,25 +125,30 @@ elif menu == "Album Analysis":
 # --- Time Trends ---
 elif menu == "Time Trends":
     st.subheader("Tracks Released per Year")
-    year_counts = df_filtered['Release Year'].value_counts().sort_index()
+    year_counts = rollup.per_year(year_range, selected_artists)['count']
     fig_years = px.bar(x=year_counts.index, y=year_counts.values,
                        labels={'x': 'Year', 'y': 'Number of Songs'}, color_discrete_sequence=px.colors.sequential.Cividis)
     st.plotly_chart(fig_years, use_container_width=True)
 
     st.subheader("Popularity Over Time")
-    fig_time = px.scatter(df_filtered, x="Release Date", y="Popularity", color="Artist Name",
-                          hover_data=["Song Name", "Album Name"], color_discrete_sequence=px.colors.diverging.Portland)
+    fig_time, total_points, drawn_points = lod_scatter(
+        df_filtered, "Release Date", "Popularity", priority="Popularity", color="Artist Name",
+        hover_data=["Song Name", "Album Name"], color_discrete_sequence=px.colors.diverging.Portland)
     st.plotly_chart(fig_time, use_container_width=True)
+    st.caption(scatter_caption(total_points, drawn_points))
 
 # --- Word Cloud ---
 elif menu == "Word Cloud":
     st.subheader("Word Cloud of Song Titles")
-    text = " ".join(df_filtered['Song Name'].dropna())
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
-    fig_wc, ax = plt.subplots(figsize=(10, 5))
-    ax.imshow(wordcloud, interpolation='bilinear')
-    ax.axis("off")
-    st.pyplot(fig_wc)
+    # Rendered once per filter; a filter seen before is served from the cache
+    word_cloud = cache.get_or_compute(
+        ('live', 'word_cloud', filter_key),
+        lambda: word_cloud_png(scraped.words.frequencies(year_range, selected_artists))
+    )
+    if word_cloud is not None:
+        st.image(word_cloud, use_container_width=True)
+    else:
+        st.info("No words to show for the selected filters.")
 
 # --- Raw Data ---
 elif menu == "Raw Data":
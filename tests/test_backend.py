@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.dataset_clean import build_parquet_dataset, clean_kaggle
+from utils.backend import PandasBackend, ParquetBackend
+from utils.charts import FeatureBins
+from utils.cube import GenreCube, MomentCube
+from utils.index import ArtistIndex, FilterEngine
+from utils.neighbors import FeatureNeighbors
+
+FEATURES = ['danceability', 'energy', 'valence']
+FILTERS = [((0, 100), []), ((30, 70), ['rock', 'jazz']), ((95, 100), ['pop']), ((0, 100), ['metal'])]
+
+
+def kaggle_csv(path, rows=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'track_id': [f"id{i}" for i in range(rows)],
+        'artists': rng.choice([f"Artist {i}" for i in range(200)] + ["Artist 1;Artist 2"], rows),
+        'album_name': "Album",
+        'track_name': [f"Track {i}" for i in rng.integers(0, rows // 2, rows)], # Some duplicates
+        'popularity': rng.integers(0, 101, rows),
+        'duration_ms': rng.integers(100_000, 300_000, rows),
+        'track_genre': rng.choice(['Pop', 'rock', 'jazz', 'folk'], rows),
+    })
+    for feature in FEATURES:
+        df[feature] = rng.random(rows)
+    df.to_csv(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def backends(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("kaggle")
+    csv_path = kaggle_csv(str(directory / "dataset.csv"))
+    df = clean_kaggle(pd.read_csv(csv_path))
+    engine = FilterEngine.from_frame(df)
+    pandas_backend = PandasBackend(
+        df, engine, GenreCube.from_frame(df), ArtistIndex.from_series(df['artists']),
+        lambda features: MomentCube.from_frame(df, list(features)),
+        lambda feature, nbins: FeatureBins.from_values(df[feature].to_numpy(), nbins),
+        lambda features: FeatureNeighbors.from_frame(df, list(features), engine.order),
+    )
+    dataset_dir = str(directory / "dataset_parquet")
+    assert build_parquet_dataset(csv_path, dataset_dir, chunksize=700) == len(df)
+    return pandas_backend, ParquetBackend.open(dataset_dir, FEATURES + ['duration_ms'])
+
+
+def test_aggregates_agree(backends):
+    pandas_backend, parquet_backend = backends
+    assert parquet_backend.row_count == pandas_backend.row_count
+    assert parquet_backend.genres == pandas_backend.genres
+
+    for popularity_range, genres in FILTERS:
+        assert parquet_backend.totals(popularity_range, genres) == pytest.approx(
+            pandas_backend.totals(popularity_range, genres), nan_ok=True)
+        pd.testing.assert_series_equal(parquet_backend.genre_counts(popularity_range, genres),
+                                       pandas_backend.genre_counts(popularity_range, genres))
+        for feature in FEATURES:
+            edges, counts = parquet_backend.histogram(feature, popularity_range, genres)
+            expected_edges, expected_counts = pandas_backend.histogram(feature, popularity_range, genres)
+            assert np.allclose(edges, expected_edges) and np.array_equal(counts, expected_counts)
+        corr = parquet_backend.correlation(FEATURES, popularity_range, genres)
+        expected = pandas_backend.correlation(FEATURES, popularity_range, genres)
+        if expected is None:
+            assert corr is None
+        else:
+            pd.testing.assert_frame_equal(corr, expected, atol=1e-9)
+
+
+def test_row_queries_agree(backends):
+    pandas_backend, parquet_backend = backends
+    columns = ['track_name', 'artists', 'popularity']
+
+    for popularity_range, genres in FILTERS:
+        # The Parquet rows are grouped by genre, so rows tied on popularity may come in another order
+        top = parquet_backend.top_tracks(50, popularity_range, genres, columns)
+        expected = pandas_backend.top_tracks(50, popularity_range, genres, columns)
+        assert top['popularity'].tolist() == expected['popularity'].tolist()
+
+        artists = parquet_backend.top_artists(20, popularity_range, genres)
+        expected = pandas_backend.top_artists(20, popularity_range, genres)
+        assert artists.tolist() == pytest.approx(expected.tolist())
+
+        points, total = parquet_backend.scatter_points('energy', 'valence', popularity_range, genres, columns)
+        expected_points, expected_total = pandas_backend.scatter_points('energy', 'valence', popularity_range,
+                                                                        genres, columns)
+        assert total == expected_total and len(points) == len(expected_points)
+
+    assert len(parquet_backend.preview(10, (30, 70), ['rock'])) == 10
+    assert set(parquet_backend.search_tracks("track 12", 1000)['track_name']) == \
+        set(pandas_backend.search_tracks("track 12", 1000)['track_name'])
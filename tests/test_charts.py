@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from utils.charts import FeatureBins, downsample_points, feature_bin_edges, histogram_counts, lod_scatter
+
+
+def test_feature_bins_match_np_histogram():
+    rng = np.random.default_rng(0)
+    values = rng.normal(0, 1, 5000)
+    values[::97] = np.nan
+    values[0] = np.nanmax(values) # A value on the last edge belongs to the last bin
+    bins = FeatureBins.from_values(values, nbins=20)
+    finite = np.isfinite(values)
+
+    assert np.array_equal(bins.edges, np.linspace(np.nanmin(values), np.nanmax(values), 21))
+    assert np.array_equal(bins.counts(), np.histogram(values[finite], bins=bins.edges)[0])
+    rows = np.flatnonzero(values > 0.5)
+    assert np.array_equal(bins.counts(rows), np.histogram(values[rows], bins=bins.edges)[0])
+    assert np.array_equal(histogram_counts(values, bins.edges), bins.counts())
+
+
+def test_edges_of_degenerate_values():
+    assert np.array_equal(feature_bin_edges([3.0, 3.0], nbins=2), [2.5, 3.0, 3.5])
+    assert np.array_equal(feature_bin_edges([np.nan], nbins=2), [0, 0.5, 1])
+    assert FeatureBins.from_values([3.0, 3.0, np.nan], nbins=2).counts().tolist() == [0, 2]
+
+
+def test_downsample_keeps_outliers_and_top_priority():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(0, 1, 50_000), rng.normal(0, 1, 50_000)
+    x[123], y[456] = 100.0, -100.0
+    priority = rng.random(50_000)
+    priority[789] = 2.0
+    keep = downsample_points(x, y, 2000, priority=priority)
+
+    assert len(keep) == 2000
+    assert np.array_equal(keep, np.unique(keep))
+    assert {123, 456, 789} <= set(keep.tolist())
+    assert np.array_equal(downsample_points(x[:100], y[:100], 2000), np.arange(100))
+
+
+def test_lod_scatter_caps_points_and_colour_traces():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        'x': rng.random(30_000), 'y': rng.random(30_000),
+        'genre': rng.choice([f"genre {i}" for i in range(40)], 30_000),
+    })
+    fig, total, drawn = lod_scatter(df, 'x', 'y', max_points=10_000, max_colors=5, color='genre')
+
+    assert (total, drawn) == (30_000, 10_000)
+    assert len(fig.data) == 6 and fig.data[-1].name == "Other"
+    assert all(trace.type == "scattergl" for trace in fig.data)
+    assert sum(len(trace.x) for trace in fig.data) == drawn
+
+    fig, total, drawn = lod_scatter(df.head(100), 'x', 'y')
+    assert (total, drawn) == (100, 100) and fig.data[0].type == "scatter"
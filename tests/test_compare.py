@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from utils.compare import SourceSummary, summary_table
+
+
+def source(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'artists': rng.choice([f"Artist {i}" for i in range(300)], n),
+        'popularity': np.where(rng.random(n) < 0.05, np.nan, rng.integers(0, 101, n)),
+        'track_genre': pd.Categorical(rng.choice(['pop', 'rock', 'jazz', 'folk'], n)),
+        'energy': rng.random(n),
+    })
+
+
+def test_summary_matches_the_whole_frame():
+    df = source(5000, 0)
+    summary = SourceSummary.from_frame("Kaggle", df, features=('energy', 'tempo'), chunk_size=700)
+
+    assert summary.count == len(df)
+    assert summary.unique_artists == df['artists'].nunique() # Exact below the sketch size
+    assert np.isclose(summary.mean_popularity, df['popularity'].mean())
+    assert summary.popularity.count == df['popularity'].notna().sum()
+    expected = df['track_genre'].astype(str).value_counts()
+    assert summary.genre_counts.to_dict() == expected.to_dict()
+    assert list(summary.features) == ['energy'] # Missing features are skipped
+    assert summary.features['energy'].count == len(df)
+
+
+def test_summary_table_breaks_genre_ties_by_name():
+    tied = pd.DataFrame({'artists': ['A', 'B', 'B', 'C'], 'popularity': [10, 20, 30, 40],
+                         'track_genre': ['rock', 'pop', 'rock', 'pop']})
+    empty = tied.iloc[:0]
+    table = summary_table([SourceSummary.from_frame("Tied", tied), SourceSummary.from_frame("Empty", empty)])
+
+    assert table.loc["Tied"].tolist() == [4, 3, 25.0, "pop"]
+    assert table.loc["Empty", "Top Genre"] == "N/A" and np.isnan(table.loc["Empty", "Avg Popularity"])
@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import utils.main as main
+from utils.store import CrawlStore
+
+
+def test_related_artists_failure_is_reported_once(monkeypatch, capsys):
+    barrier = threading.Barrier(8)
+
+    def related_artists(artist_id):
+        barrier.wait() # Every worker is past the flag check before any of them fails
+        raise requests.HTTPError("404 Client Error")
+
+    monkeypatch.setattr(main, "related_artists_available", True)
+    monkeypatch.setattr(main, "get_songs_by_artist", lambda artist_id: [{"id": artist_id}])
+    monkeypatch.setattr(main, "get_related_artists", related_artists)
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(main.fetch_artist, [{"id": str(number)} for number in range(8)]))
+
+    assert results == [([{"id": str(number)}], []) for number in range(8)]
+    assert capsys.readouterr().out.count("Related artists unavailable") == 1
+    assert not main.related_artists_available
+
+
+def test_artists_are_fetched_concurrently(monkeypatch, tmp_path):
+    barrier = threading.Barrier(4, timeout=5)
+
+    def fetch_artist(artist, expand_related=True):
+        barrier.wait() # Only returns once four fetches are in flight together
+        return [{"id": f"{artist['id']}-{number}"} for number in range(2)], []
+
+    artists = [{"id": f"a{number}", "name": f"Artist {number}"} for number in range(8)]
+    monkeypatch.setattr(main, "search_for_artist", lambda query, limit, offset: artists)
+    monkeypatch.setattr(main, "fetch_artist", fetch_artist)
+
+    with CrawlStore(str(tmp_path / "crawl.sqlite")) as store:
+        count = main.collect_songs(store, ["rock"], song_limit=16, concurrency=4)
+        assert count == 16
+        assert sorted(store.fetched_artist_ids()) == [artist["id"] for artist in artists]
+
+
+def test_tracks_are_enriched_in_batches(monkeypatch, tmp_path):
+    requested = {"tracks": [], "features": []}
+
+    def several_tracks(track_ids):
+        requested["tracks"].append(len(track_ids))
+        return [{"id": track_id, "album": {"name": "Album"}, "popularity": 50} for track_id in track_ids]
+
+    def audio_features(track_ids):
+        requested["features"].append(len(track_ids))
+        return [{"id": track_id, "energy": 0.5} for track_id in track_ids]
+
+    monkeypatch.setattr(main, "get_several_tracks", several_tracks)
+    monkeypatch.setattr(main, "get_audio_features", audio_features)
+
+    # Every other track comes from search without its album or popularity
+    songs = [{"id": f"t{number}"} if number % 2 else {"id": f"t{number}", "album": {}, "popularity": 1}
+             for number in range(250)]
+    emitted = []
+    with CrawlStore(str(tmp_path / "crawl.sqlite")) as store:
+        store.save_artist_tracks({"id": "a1"}, songs)
+        enricher = main.TrackEnricher(emitted.append, store=store, batch_size=250)
+        enricher.add(songs)
+
+        assert requested == {"tracks": [50, 50, 25], "features": [100, 100, 50]}
+        assert [len(batch) for batch in emitted] == [250]
+        assert all(song["audio_features"] == {"id": song["id"], "energy": 0.5} for song in emitted[0])
+        assert emitted[0][1]["popularity"] == 50 and emitted[0][0]["popularity"] == 1
+        assert list(store.iter_tracks()) == emitted[0] # Saved back for a resumed crawl
+
+
+def test_unavailable_audio_features_are_skipped_after_one_attempt(monkeypatch, capsys):
+    attempts = []
+
+    def audio_features(track_ids):
+        attempts.append(track_ids)
+        raise requests.HTTPError("403 Client Error")
+
+    monkeypatch.setattr(main, "get_audio_features", audio_features)
+    emitted = []
+    enricher = main.TrackEnricher(emitted.append, batch_size=2)
+    enricher.add([{"id": f"t{number}", "album": {}, "popularity": 1} for number in range(5)])
+    enricher.flush()
+
+    assert len(attempts) == 1
+    assert [len(batch) for batch in emitted] == [2, 2, 1]
+    assert not any("audio_features" in song for batch in emitted for song in batch)
+    assert capsys.readouterr().out.count("Audio features unavailable") == 1
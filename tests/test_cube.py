@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.cube import GenreCube, MomentCube
+
+FEATURES = ['danceability', 'energy', 'valence']
+FILTERS = [((0, 100), ['pop', 'rock', 'jazz']), ((20, 60), ['rock', 'jazz']), ((95, 100), ['pop']), ((0, 10), [])]
+
+
+@pytest.fixture
+def tracks():
+    rng = np.random.default_rng(0)
+    n = 3000
+    return pd.DataFrame({
+        'track_genre': rng.choice(np.array(['pop', 'rock', 'jazz', None], dtype=object), n),
+        'popularity': rng.integers(0, 101, n),
+        'duration_ms': rng.normal(220_000, 40_000, n),
+        'danceability': rng.random(n),
+        'energy': rng.random(n),
+        'valence': rng.random(n),
+    })
+
+
+def selected(df, popularity_range, genres):
+    return df[df['popularity'].between(*popularity_range) & df['track_genre'].isin(genres)]
+
+
+def genre_codes(categories, genres):
+    return [list(categories).index(genre) for genre in genres]
+
+
+def test_genre_cube_matches_the_filtered_rows(tracks):
+    cube = GenreCube.from_frame(tracks)
+    # Built batch by batch over a fixed genre list, then merged
+    batches = [GenreCube.from_frame(tracks.iloc[start:start + 700], genres=cube.genres)
+               for start in range(0, len(tracks), 700)]
+    merged = batches[0]
+    for batch in batches[1:]:
+        merged = merged.merge(batch)
+
+    for popularity_range, genres in FILTERS:
+        rows = selected(tracks, popularity_range, genres)
+        for built in (cube, merged):
+            count, mean_popularity, mean_duration = built.totals(popularity_range, genre_codes(built.genres, genres))
+            assert count == len(rows)
+            if len(rows):
+                assert mean_popularity == pytest.approx(rows['popularity'].mean())
+                assert mean_duration == pytest.approx(rows['duration_ms'].mean())
+            else:
+                assert np.isnan(mean_popularity) and np.isnan(mean_duration)
+            counts = built.genre_counts(popularity_range, genre_codes(built.genres, genres))
+            assert counts.to_dict() == rows['track_genre'].value_counts().to_dict()
+
+
+def test_moment_cube_correlation_matches_pandas(tracks):
+    tracks = tracks.assign(energy=tracks['energy'] + tracks['danceability'] + 1e6) # Correlated and off-centre
+    tracks.loc[::50, 'valence'] = np.nan # Missing values count as the mean
+    filled = tracks.fillna({'valence': tracks['valence'].mean()})
+    cube = MomentCube.from_frame(tracks, FEATURES)
+    categories = tracks['track_genre'].astype('category').cat.categories
+    centers = [tracks[feature].mean() for feature in FEATURES]
+    merged = MomentCube.from_frame(tracks.iloc[:1000], FEATURES, genres=categories, centers=centers).merge(
+        MomentCube.from_frame(tracks.iloc[1000:], FEATURES, genres=categories, centers=centers))
+
+    for popularity_range, genres in FILTERS:
+        expected = selected(filled, popularity_range, genres)[FEATURES].corr()
+        for built in (cube, merged):
+            corr = built.correlation(popularity_range, genre_codes(categories, genres))
+            if genres:
+                pd.testing.assert_frame_equal(corr, expected, atol=1e-9)
+            else:
+                assert corr is None
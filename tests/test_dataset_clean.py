@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data.dataset_clean as dataset_clean
+
+CSV = """Unnamed: 0,track_id,artists,album_name,track_name,popularity,duration_ms,explicit,danceability,track_genre
+0,id0,Artist 1,Album 0,Track 0,39,100156,True,0.35, Rock 
+1,id1,Artist 2,Album 1,Track 1,53,136254,False,0.03,pop
+2,id2,Artist 2,Album 1,Track 1,50,136254,False,0.03,pop
+3,id3,,Album 2,Track 3,10,200000,False,0.5,jazz
+"""
+
+
+@pytest.fixture
+def paths(tmp_path):
+    csv_path = tmp_path / "dataset.csv"
+    csv_path.write_text(CSV)
+    return str(csv_path), str(tmp_path / "dataset.feather")
+
+
+def test_cache_holds_the_cleaned_frame(paths):
+    csv_path, cache_path = paths
+    built = dataset_clean.load_clean_kaggle(csv_path, cache_path)
+
+    assert list(built['track_name']) == ['Track 0', 'Track 1'] # Missing artist and duplicate dropped
+    assert list(built['track_genre']) == ['rock', 'pop']
+    assert isinstance(built['artists'].dtype, pd.CategoricalDtype)
+    assert built['danceability'].dtype == 'float32'
+    assert 'Unnamed: 0' not in built.columns
+    pd.testing.assert_frame_equal(dataset_clean.load_clean_kaggle(csv_path, cache_path), built)
+
+
+def test_cache_is_reused_until_the_csv_content_changes(paths, monkeypatch):
+    csv_path, cache_path = paths
+    dataset_clean.load_clean_kaggle(csv_path, cache_path)
+    builds = []
+    build_cache = dataset_clean.build_cache
+    monkeypatch.setattr(dataset_clean, "build_cache", lambda *args: builds.append(args) or build_cache(*args))
+
+    # A touched but unchanged CSV is re-hashed, not re-cleaned
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(dataset_clean.load_clean_kaggle(csv_path, cache_path)) == 2
+    assert builds == []
+
+    with open(csv_path, "a") as file:
+        file.write("4,id4,Artist 3,Album 3,Track 4,70,180000,False,0.9,pop\n")
+    assert len(dataset_clean.load_clean_kaggle(csv_path, cache_path)) == 3
+    assert len(builds) == 1
+
+
+def test_missing_source_and_cache_is_reported(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        dataset_clean.load_clean_kaggle(str(tmp_path / "dataset.csv"), str(tmp_path / "dataset.feather"))
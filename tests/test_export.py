@@ -0,0 +1,59 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from utils.export import EXPORT_COLUMNS, TrackWriter, export_format, open_writer
+
+
+def song(number):
+    return {
+        "name": f"Song {number}",
+        "artists": [{"name": f"Artist {number % 4}"}, {"name": "Guest"}],
+        "album": {"name": f"Album {number % 3}", "release_date": ["2001-02-03", "1999", "2010-07"][number % 3],
+                  "release_date_precision": ["day", "year", "month"][number % 3]},
+        "popularity": number % 100,
+        "id": f"id{number}",
+        "duration_ms": 180_000 + number,
+        "audio_features": {"danceability": 0.5, "tempo": 120.0 + number} if number % 2 else None,
+    }
+
+
+def read(path):
+    if path.endswith(".csv"):
+        return pd.read_csv(path, na_values=["N/A"])
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_feather(path)
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet", "arrow"])
+def test_tracks_round_trip(tmp_path, extension):
+    path = str(tmp_path / f"tracks.{extension}")
+    with open_writer(path, row_group_size=7) as writer: # Several row groups / record batches
+        writer.write_many(song(number) for number in range(30))
+    assert writer.count == 30
+
+    df = read(path)
+    assert list(df.columns) == EXPORT_COLUMNS
+    assert df["Song Number"].tolist() == list(range(1, 31))
+    assert df["Song Name"].astype(str).tolist() == [f"Song {number}" for number in range(30)]
+    assert df["Artist Name"].astype(str).tolist() == [f"Artist {number % 4}" for number in range(30)]
+    assert df["Popularity"].tolist() == [number % 100 for number in range(30)]
+    assert df["duration_ms"].tolist() == [180_000 + number for number in range(30)]
+    assert df["tempo"].isna().tolist() == [number % 2 == 0 for number in range(30)]
+    assert df["tempo"].iloc[1] == pytest.approx(121.0)
+    if extension != "csv": # Dates are typed; partial ones start at the first day
+        assert df["Release Date"].iloc[:3].tolist() == [
+            datetime.date(2001, 2, 3), datetime.date(1999, 1, 1), datetime.date(2010, 7, 1)
+        ]
+
+
+def test_format_follows_the_extension(tmp_path):
+    assert export_format("a.parquet") == "parquet"
+    assert export_format("a.feather") == export_format("a.arrow") == "arrow"
+    assert export_format("a.txt", "csv") == "csv"
+    with pytest.raises(ValueError):
+        export_format("a.json")
+    with pytest.raises(TypeError): # _write_row is abstract
+        TrackWriter(str(tmp_path / "x"))
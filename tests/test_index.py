@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from utils.index import ArtistIndex, FilterEngine, top_k
+
+
+def exploded_artists(df):
+    """The per-artist frame the index replaces: one row per (track, artist)."""
+    artists = df['artists'].str.strip("[]").str.replace("'", "").str.split(r";|, ", regex=True)
+    exploded = df.assign(artist=artists).explode('artist').dropna(subset=['artist'])
+    return exploded.assign(artist=exploded['artist'].str.strip())
+
+
+def test_artist_index_matches_the_exploded_frame():
+    rng = np.random.default_rng(0)
+    combos = np.array(["A;B", "B", "['C', 'A']", "C, D", None, "D;E ;B"], dtype=object)
+    df = pd.DataFrame({'artists': rng.choice(combos, 500), 'popularity': rng.integers(0, 101, 500)})
+    index = ArtistIndex.from_series(df['artists'])
+    exploded = exploded_artists(df)
+
+    expected = exploded.groupby('artist')['popularity'].mean()
+    pd.testing.assert_series_equal(index.mean_by_artist(df['popularity']), expected,
+                                   check_names=False, check_index_type=False)
+
+    rows = np.flatnonzero(df['popularity'] > 50)
+    codes, pair_rows = index.pairs(rows)
+    selected = exploded[exploded['popularity'] > 50]
+    assert sorted(zip(pair_rows, index.names[codes])) == sorted(zip(selected.index, selected['artist']))
+
+
+def test_filter_engine_matches_boolean_masks():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        'track_genre': rng.choice(np.array(['pop', 'rock', 'jazz', None], dtype=object), 2000),
+        'popularity': rng.integers(0, 101, 2000),
+    })
+    engine = FilterEngine.from_frame(df)
+
+    for popularity_range, genres in [((0, 100), []), ((20, 60), ['rock', 'jazz']), ((90, 100), ['pop', 'metal']),
+                                     ((60, 20), None), ((50, 50), ['metal'])]:
+        mask = df['popularity'].between(*popularity_range)
+        if genres:
+            mask &= df['track_genre'].isin(genres)
+        else:
+            mask &= df['track_genre'].notna()
+        selection = engine.select(popularity_range, genres)
+        assert np.array_equal(np.sort(selection.rows), np.flatnonzero(mask))
+        assert np.array_equal(selection.first_rows(10), np.flatnonzero(mask)[:10])
+
+
+def test_top_k_matches_nlargest():
+    rng = np.random.default_rng(2)
+    values = pd.Series(rng.integers(0, 20, 1000).astype(float)) # Many ties
+    values[::7] = np.nan
+    rows = np.flatnonzero(rng.random(1000) < 0.5)
+
+    for k in (0, 1, 10, 400, 2000): # NaNs are never selected, even when k exceeds the other values
+        assert np.array_equal(top_k(values, k), values.dropna().nlargest(k, keep='first').index)
+        assert np.array_equal(top_k(values, k, rows), values.iloc[rows].dropna().nlargest(k, keep='first').index)
+
+
+def test_top_rows_match_a_sorted_selection():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        'track_genre': rng.choice(['pop', 'rock', 'jazz'], 2000),
+        'popularity': rng.integers(0, 101, 2000),
+    })
+    engine = FilterEngine.from_frame(df)
+
+    for n, popularity_range, genres in [(25, (0, 100), []), (300, (20, 60), ['rock']), (5000, (90, 100), ['pop'])]:
+        rows = df[df['popularity'].between(*popularity_range) & (df['track_genre'].isin(genres) if genres else True)]
+        expected = rows.sort_values('popularity', ascending=False, kind='stable').index[:n]
+        assert np.array_equal(engine.top_rows(n, popularity_range, genres), expected)
@@ -0,0 +1,35 @@
+import pytest
+
+import utils.load as load
+
+CSV = """track_id,artists,album_name,track_name,popularity,duration_ms,explicit,danceability,track_genre
+id0,Artist 1,Album 0,Track 0,39,100156,True,0.35,rock
+id1,Artist 2,Album 1,Track 1,53,136254,False,0.03,pop
+"""
+
+
+@pytest.fixture
+def kaggle_csv(tmp_path, monkeypatch):
+    csv_path = tmp_path / "dataset.csv"
+    csv_path.write_text(CSV)
+    monkeypatch.setenv("SPOTIFY_KAGGLE_CSV", str(csv_path))
+    monkeypatch.setenv("SPOTIFY_KAGGLE_CACHE", str(tmp_path / "dataset.feather"))
+    load.load_kaggle.clear()
+    yield csv_path
+    load.load_kaggle.clear()
+
+
+def test_paths_come_from_the_environment(kaggle_csv, monkeypatch):
+    assert load.kaggle_paths() == (str(kaggle_csv), str(kaggle_csv.with_suffix(".feather")))
+    monkeypatch.delenv("SPOTIFY_KAGGLE_CSV")
+    assert load.kaggle_paths()[0] == load.KAGGLE_CSV
+
+
+def test_every_caller_shares_one_frame(kaggle_csv):
+    df = load.load_kaggle()
+    assert list(df['track_name']) == ['Track 0', 'Track 1']
+    assert load.load_kaggle() is df
+    # Writing to a derived frame leaves the shared one untouched
+    derived = df.rename(columns={'popularity': 'score'})
+    derived.loc[0, 'score'] = 0
+    assert list(load.load_kaggle()['popularity']) == [39, 53]
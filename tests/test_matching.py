@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.matching import MIN_TITLE_SIMILARITY, KaggleArtistBlocks, KaggleTracks, normalize_names, primary_artists
+
+
+def kaggle_frame(rows=3_000, artists=40, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array(["love", "night", "fire", "heart", "dream", "rain"])
+    return pd.DataFrame({
+        'track_name': [" ".join(title) for title in rng.choice(words, (rows, 3))],
+        'artists': [f"Artist {number}" for number in rng.integers(0, artists, rows)],
+        'popularity': rng.integers(0, 101, rows),
+    })
+
+
+def batches(df, size=500):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+def reference_match(kaggle, title, artist):
+    """
+    (similarity, row) of the match for `title` by `artist`: the first equal
+    Kaggle title, else the most similar, comparing titles one at a time.
+    """
+    def trigrams(text):
+        padded = "  " + text + " "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    kaggle_titles, kaggle_artists = normalize_names(kaggle['track_name']), primary_artists(kaggle['artists'])
+    equal = np.flatnonzero((kaggle_titles == title) & (kaggle_artists == artist))
+    if len(equal):
+        return 1.0, equal[0]
+    best = None
+    for row, (other_title, other_artist) in enumerate(zip(kaggle_titles, kaggle_artists)):
+        length, other_length = len(title) + 1, len(other_title) + 1
+        if other_artist != artist or min(length, other_length) < MIN_TITLE_SIMILARITY * max(length, other_length):
+            continue
+        a, b = trigrams(title), trigrams(other_title)
+        score = len(a & b) / len(a | b)
+        if score >= MIN_TITLE_SIMILARITY and (best is None or score > best[0]):
+            best = (score, row)
+    return best
+
+
+def test_exact_matches_ignore_suffixes_accents_and_featured_artists():
+    kaggle = pd.DataFrame({
+        'track_name': ["Blinding Lights", "Café del Mar", "Blinding Lights", "Yellow", "Intro"],
+        'artists': ["The Weeknd", "Energy 52", "The Weeknd", "Coldplay", "The xx"],
+        'popularity': [90, 40, 10, 80, 50],
+    })
+    scraped = pd.DataFrame({
+        'track_name': ["Blinding Lights - 2020 Remaster", "CAFE DEL MAR (feat. Someone)", "Yellow", "(Intro)"],
+        'artists': ["The Weeknd;Someone", "['Energy 52', 'Someone']", "Adele", "The XX"],
+        'popularity': [95, 45, 70, 55],
+    })
+    matches = KaggleTracks.from_batches(batches(kaggle)).match(scraped)
+
+    assert matches['scraped_row'].tolist() == [0, 1, 3] # Same title by another artist is not a match
+    assert matches['kaggle_row'].tolist() == [0, 1, 4] # The first of duplicate Kaggle rows wins
+    assert matches['match'].tolist() == ["exact", "exact", "exact"]
+    assert matches['popularity_delta'].tolist() == [5.0, 5.0, 5.0]
+
+
+def test_fuzzy_matches_agree_with_pairwise_scoring():
+    kaggle = kaggle_frame(rows=600, artists=8)
+    scraped = kaggle.sample(200, random_state=2).reset_index(drop=True)
+    # Typos in a third of the titles and a trailing "s" in every other one
+    typo = scraped['track_name'].str.replace("e", "a", n=1)
+    scraped['track_name'] = scraped['track_name'].where(scraped.index % 3 > 0, typo) + np.where(scraped.index % 2, "s", "")
+    scraped.loc[::7, 'artists'] = "Somebody Else"
+    matches = KaggleTracks.from_batches(batches(kaggle, 128)).match(scraped).set_index('scraped_row')
+
+    titles, artists = normalize_names(scraped['track_name']), primary_artists(scraped['artists'])
+    for row, (title, artist) in enumerate(zip(titles, artists)):
+        expected = reference_match(kaggle, title, artist)
+        if expected is None:
+            assert row not in matches.index
+        else:
+            match = matches.loc[row]
+            assert (match['similarity'], match['kaggle_row']) == pytest.approx(expected)
+            # Different titles can share every trigram, so only equal titles are exact
+            assert match['match'] == ("exact" if titles[row] == normalize_names([match['kaggle_track_name']])[0]
+                                      else "fuzzy")
+
+
+def test_artist_blocks_hold_only_the_scraped_artists(monkeypatch):
+    monkeypatch.setattr("utils.matching.ROWS_PER_BUCKET", 256) # Several buckets for a small frame
+    kaggle = kaggle_frame()
+    scraped = kaggle.sample(400, random_state=1).reset_index(drop=True)
+    scraped.loc[::3, 'track_name'] += "s" # Fuzzy matches
+    full = KaggleTracks.from_batches(batches(kaggle))
+    blocks = KaggleArtistBlocks.from_batches(batches(kaggle), len(kaggle))
+    assert blocks.bucket_count == 11
+
+    first = scraped[scraped['artists'].isin(["Artist 1", "Artist 2"])]
+    assert blocks.match(first).equals(full.match(first))
+    assert set(blocks.tracks.rows) == set(np.flatnonzero(kaggle['artists'].isin(["Artist 1", "Artist 2"])))
+
+    # Newly scraped artists extend the index; those seen before are not read again
+    read = blocks._read
+    reads = []
+    blocks._read = lambda artist_hashes: reads.append(len(artist_hashes)) or read(artist_hashes)
+    assert blocks.match(scraped).equals(full.match(scraped))
+    assert len(blocks.tracks.rows) == len(kaggle)
+    assert reads == [38]
+    blocks.match(first)
+    assert reads == [38]
@@ -0,0 +1,51 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.memo import ResultCache, filter_signature
+
+
+def test_signature_ignores_selection_order():
+    assert filter_signature(genres=['rock', 'pop'], popularity=(10, 90)) == \
+        filter_signature(popularity=(np.int64(10), 90), genres={'pop', 'rock'})
+    assert filter_signature(genres=[]) == filter_signature(genres=None)
+    assert filter_signature(popularity=(10, 90)) != filter_signature(popularity=(90, 10))
+
+
+def test_least_recently_used_results_are_evicted_over_budget():
+    cache = ResultCache(max_bytes=3000)
+    for key in "abc":
+        cache.get_or_compute(key, lambda: np.zeros(100)) # 800 bytes each
+    cache.get_or_compute("a", lambda: None) # Hit: "a" becomes the most recent
+    cache.get_or_compute("d", lambda: np.zeros(100))
+
+    assert list(cache._entries) == ["c", "a", "d"]
+    assert cache.get_or_compute("too big", lambda: np.zeros(1000)).shape == (1000,) # Returned, not kept
+    assert cache.stats() == {'entries': 3, 'bytes': 2400, 'max_bytes': 3000, 'hits': 1, 'misses': 5,
+                             'evictions': 1, 'hit_rate': 1 / 6}
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()['bytes'] == 0
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache()
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05) # The other sessions ask while this one computes
+        return "result"
+
+    with ThreadPoolExecutor(8) as executor:
+        first = executor.submit(cache.get_or_compute, "key", compute)
+        started.wait()
+        others = [executor.submit(cache.get_or_compute, "key", compute) for _ in range(7)]
+        results = [future.result() for future in [first] + others]
+
+    assert results == ["result"] * 8
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (7, 1)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from utils.index import FilterEngine
+from utils.neighbors import FeatureNeighbors, feature_scales
+
+FEATURES = ['danceability', 'energy', 'tempo']
+
+
+def test_nearest_matches_brute_force():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'track_genre': rng.choice(['pop', 'rock', 'jazz'], 3000),
+        'popularity': rng.integers(0, 101, 3000),
+        'danceability': rng.random(3000),
+        'energy': rng.random(3000),
+        'tempo': rng.normal(120, 30, 3000),
+    })
+    df.loc[::100, 'energy'] = np.nan # Missing values sit at the mean
+    engine = FilterEngine.from_frame(df)
+    neighbors = FeatureNeighbors.from_frame(df, FEATURES, engine.order)
+
+    values = df[FEATURES].to_numpy(dtype=np.float64)
+    means, scales = feature_scales(values)
+    standardized = np.nan_to_num((values - means) / scales)
+    for row, popularity_range, genres in [(5, (0, 100), []), (200, (20, 80), ['rock', 'jazz']), (7, (90, 100), ['pop'])]:
+        ranges = engine.select_ranges(popularity_range, genres)
+        for workers in (1, 3):
+            rows, distances = neighbors.nearest(row, 10, ranges, block_rows=64, workers=workers)
+
+            candidates = engine.select(popularity_range, genres).rows
+            candidates = candidates[candidates != row] # Not its own neighbour
+            expected = np.linalg.norm(standardized[candidates] - standardized[row], axis=1)
+            nearest = np.argsort(expected, kind='stable')[:10]
+            assert np.array_equal(rows, candidates[nearest])
+            assert np.allclose(distances, expected[nearest], atol=1e-4)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.compare import SourceSummary
+from utils.cube import GenreCube, MomentCube
+from utils.index import ArtistIndex
+from utils.parallel import MIN_ROWS_PER_PART, map_reduce, row_ranges
+
+FEATURES = ['danceability', 'energy']
+
+
+@pytest.fixture(scope="module")
+def tracks():
+    rng = np.random.default_rng(0)
+    n = 4 * MIN_ROWS_PER_PART # Enough rows for several parts
+    return pd.DataFrame({
+        'track_genre': pd.Categorical.from_codes(rng.integers(0, 20, n), [f"genre {i}" for i in range(20)]),
+        'popularity': rng.integers(0, 101, n),
+        'duration_ms': rng.normal(220_000, 40_000, n),
+        'artists': pd.Categorical.from_codes(rng.integers(0, 500, n), [f"Artist {i};Artist {i + 1}" for i in range(500)]),
+        'danceability': rng.random(n),
+        'energy': rng.random(n),
+    })
+
+
+def test_row_ranges_cover_the_rows():
+    assert row_ranges(1000, workers=8) == [(0, 1000)] # Too few rows to split
+    ranges = row_ranges(10 * MIN_ROWS_PER_PART, workers=2)
+    assert len(ranges) == 8 and ranges[0][0] == 0 and ranges[-1][1] == 10 * MIN_ROWS_PER_PART
+    assert all(stop == start for (_, stop), (start, _) in zip(ranges, ranges[1:]))
+
+
+def test_merge_follows_input_order():
+    assert map_reduce(lambda item: [item], lambda a, b: a + b, range(50), workers=4) == list(range(50))
+
+
+def test_parallel_aggregates_equal_serial(tracks):
+    serial, parallel = GenreCube.from_frame(tracks), GenreCube.from_frame(tracks, workers=4)
+    assert np.array_equal(parallel.counts, serial.counts)
+    assert np.allclose(parallel.duration_sums, serial.duration_sums)
+
+    everything = np.arange(20)
+    pd.testing.assert_frame_equal(MomentCube.from_frame(tracks, FEATURES, workers=4).correlation((0, 100), everything),
+                                  MomentCube.from_frame(tracks, FEATURES).correlation((0, 100), everything))
+
+    index = ArtistIndex.from_series(tracks['artists'])
+    rows = np.flatnonzero(tracks['popularity'].to_numpy() > 30)
+    pd.testing.assert_series_equal(index.mean_by_artist(tracks['popularity'], rows, workers=4),
+                                   index.mean_by_artist(tracks['popularity'], rows))
+
+    serial = SourceSummary.from_frame("Kaggle", tracks, FEATURES)
+    parallel = SourceSummary.from_frame("Kaggle", tracks, FEATURES, workers=4)
+    assert (parallel.count, parallel.unique_artists) == (serial.count, serial.unique_artists)
+    assert parallel.mean_popularity == pytest.approx(serial.mean_popularity)
+    assert parallel.genre_counts.equals(serial.genre_counts)
@@ -0,0 +1,121 @@
+import pandas as pd
+import pytest
+
+from utils.export import open_writer
+from utils.matching import KaggleTracks
+from utils.refresh import AppendOnlyFile, ScrapedData
+
+
+def song(number):
+    return {
+        "name": f"Song {number}",
+        "artists": [{"name": f"Artist {number % 7}"}],
+        "album": {"name": "Album", "release_date": f"{2000 + number % 20}-05-01", "release_date_precision": "day"},
+        "popularity": number % 100,
+        "id": f"id{number}",
+        "duration_ms": 200_000 + number,
+    }
+
+
+def no_kaggle():
+    return KaggleTracks.from_batches(iter(()))
+
+
+@pytest.mark.parametrize("extension", ["parquet", "arrow"])
+def test_poll_waits_for_writer_to_close(tmp_path, extension):
+    path = str(tmp_path / f"tracks.{extension}")
+    data = ScrapedData(path, no_kaggle)
+    writer = open_writer(path, row_group_size=100)
+    writer.write_many(song(number) for number in range(350)) # Three row groups flushed, no footer yet
+
+    assert data.file.poll() == (None, False)
+    with pytest.raises(FileNotFoundError):
+        data.refresh()
+
+    writer.close()
+    snapshot = data.refresh()
+    assert len(snapshot.frame) == 350
+    assert len(snapshot.timeline) == 350
+
+    # Rewritten by a new crawl: the loaded data stays until the new file is complete
+    writer = open_writer(path, row_group_size=100)
+    writer.write_many(song(number) for number in range(500))
+    assert data.refresh() is snapshot
+    writer.close()
+    assert len(data.refresh().frame) == 500
+    assert data.snapshot.version == snapshot.version + 1
+    assert len(snapshot.frame) == 350
+
+
+def test_csv_appends_are_parsed_incrementally(tmp_path):
+    path = str(tmp_path / "tracks.csv")
+    writer = open_writer(path)
+    writer.write_many(song(number) for number in range(100))
+    writer._file.flush()
+
+    data = ScrapedData(path, no_kaggle)
+    first = data.refresh()
+    rollup = first.rollup
+    words, summary = first.words, first.summary(('popularity',)) # Merged with the appended rows from now on
+    assert len(first.frame) == 100
+
+    writer.write_many(song(number) for number in range(100, 151))
+    writer.close()
+    with open(path, "rb") as file:
+        content = file.read()
+    last_line = content.rstrip(b"\n").rfind(b"\n") + 1
+    with open(path, "wb") as file:
+        file.write(content[:last_line + 10]) # The last row is still being written
+    second = data.refresh()
+    assert len(second.frame) == 150
+    assert second.frame.index.equals(pd.RangeIndex(150))
+
+    with open(path, "ab") as file:
+        file.write(content[last_line + 10:])
+    third = data.refresh()
+    full = ScrapedData(path, no_kaggle).refresh()
+    assert third.frame.equals(full.frame)
+    assert third.rollup is not rollup
+    assert third.rollup.year_bounds == full.rollup.year_bounds
+    assert third.timeline.equals(full.timeline)
+    assert third.rollup.per_year().equals(full.rollup.per_year())
+    assert third.rollup.totals((2005, 2010), ["Artist 3"]) == full.rollup.totals((2005, 2010), ["Artist 3"])
+    assert third.words is not words
+    assert third.words.frequencies((2005, 2010), ["Artist 3"]) == full.words.frequencies((2005, 2010), ["Artist 3"])
+    merged_summary, full_summary = third.summary(('popularity',)), full.summary(('popularity',))
+    assert merged_summary is not summary and merged_summary.count == full_summary.count == 151
+    assert merged_summary.unique_artists == full_summary.unique_artists
+    assert merged_summary.mean_popularity == pytest.approx(full_summary.mean_popularity)
+    # Earlier snapshots keep the version they were taken at
+    assert len(first.frame) == 100 and first.rollup is rollup and summary.count == 100
+    assert len(second.timeline) == 150
+
+
+def test_unknown_extension_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="txt"):
+        AppendOnlyFile(str(tmp_path / "tracks.txt"))
+
+
+def test_appended_rows_are_matched_against_the_index(tmp_path):
+    kaggle = pd.DataFrame({
+        'track_name': [f"Song {number}" for number in range(0, 300, 2)] + ["Song 9 (Live)"],
+        'artists': [f"Artist {number % 7}" for number in range(0, 300, 2)] + ["Artist 2"],
+        'popularity': list(range(150)) + [5],
+    })
+    batches = lambda: (kaggle.iloc[start:start + 40] for start in range(0, len(kaggle), 40))
+    tracks = KaggleTracks.from_batches(batches())
+    path = str(tmp_path / "tracks.csv")
+    with open_writer(path) as writer:
+        writer.write_many(song(number) for number in range(100))
+
+    data = ScrapedData(path, lambda: tracks)
+    assert len(data.refresh().matches) == 51 # Even songs, and "Song 9" through the bracket-stripped title
+    with open_writer(str(tmp_path / "more.csv")) as writer:
+        writer.count = 100
+        writer.write_many(song(number) for number in range(100, 200))
+    with open(str(tmp_path / "more.csv"), "rb") as more, open(path, "ab") as file:
+        file.write(more.read().split(b"\n", 1)[1]) # Without the header
+
+    full = ScrapedData(path, lambda: tracks).refresh()
+    assert data.refresh().matches.equals(full.matches)
+    assert len(full.matches) == 101
@@ -0,0 +1,126 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.scheduler import RequestScheduler, TokenCache, make_session
+
+
+class FakeSpotify(ThreadingHTTPServer):
+    """
+    Local stand-in for the Spotify API. Each request takes the next scripted
+    reply (status, headers, delay in seconds), then 200 once the script runs
+    out, and is logged with its Authorization header.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.replies = []
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get("Authorization")))
+            status, headers, delay = self.server.replies.pop(0) if self.server.replies else (200, {}, 0)
+        time.sleep(delay)
+        body = b'{"ok": true}'
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError: # The client gave up waiting
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FakeSpotify()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_scheduler(sleeps=None, **kwargs):
+    tokens = iter(f"token-{number}" for number in range(100))
+    sleep = time.sleep if sleeps is None else sleeps.append
+    kwargs.setdefault("rate", 1000.0)
+    return RequestScheduler(make_session(4), TokenCache(lambda: (next(tokens), 3600)), sleep=sleep, **kwargs)
+
+
+def test_read_timeout_is_retried(server):
+    server.replies = [(200, {}, 1.0)] # Stalls past the read timeout
+    scheduler = make_scheduler(timeout=(1.0, 0.2), backoff_base=0.01)
+
+    response = scheduler.get(server.url + "/v1/artists/1")
+
+    assert response.json() == {"ok": True}
+    assert len(server.requests) == 2
+    assert scheduler.stats.retries == 1
+
+
+def test_requests_are_throttled_to_the_rate(server):
+    scheduler = make_scheduler(rate=20.0, burst=1)
+
+    started = time.perf_counter()
+    for _ in range(6):
+        scheduler.get(server.url + "/v1/tracks")
+
+    assert time.perf_counter() - started >= 5 / 20 * 0.9 # Five waits of 1 / rate after the first request
+    assert len(server.requests) == 6
+
+
+def test_retry_after_takes_precedence_over_backoff(server):
+    server.replies = [(429, {"Retry-After": "3"}, 0)]
+    sleeps = []
+    scheduler = make_scheduler(sleeps, backoff_base=0.5)
+
+    assert scheduler.get(server.url + "/v1/tracks").status_code == 200
+    assert len(server.requests) == 2
+    assert len(sleeps) == 1
+    assert 3 <= sleeps[0] <= 3.5 # Retry-After plus jitter up to backoff_base
+
+
+def test_server_errors_back_off_until_retries_run_out(server):
+    server.replies = [(503, {}, 0)] * 10
+    sleeps = []
+    scheduler = make_scheduler(sleeps, max_retries=3, backoff_base=0.5, backoff_cap=1.5)
+
+    with pytest.raises(requests.HTTPError) as error:
+        scheduler.get(server.url + "/v1/tracks")
+
+    assert error.value.response.status_code == 503
+    assert len(server.requests) == 4 # The first attempt and three retries
+    assert len(sleeps) == 3
+    assert all(0 <= delay <= min(1.5, 0.5 * 2 ** attempt) for attempt, delay in enumerate(sleeps))
+
+
+def test_rejected_token_is_refreshed_once(server):
+    server.replies = [(401, {}, 0), (401, {}, 0)]
+    scheduler = make_scheduler()
+
+    with pytest.raises(requests.HTTPError):
+        scheduler.get(server.url + "/v1/tracks") # Still rejected after one refresh
+
+    assert [auth for _, auth in server.requests] == ["Bearer token-0", "Bearer token-1"]
+    assert scheduler.get(server.url + "/v1/tracks").status_code == 200
+    assert server.requests[-1][1] == "Bearer token-1"
@@ -0,0 +1,56 @@
+import numpy as np
+
+from utils.sketch import DistinctSketch, QuantileSketch
+
+
+def names(start, stop):
+    return np.array([f"Artist {number}" for number in range(start, stop)], dtype=object)
+
+
+def test_distinct_count_is_exact_below_k():
+    sketch = DistinctSketch(k=64).update(names(0, 50)).update(names(25, 60)).update([None, np.nan])
+    assert sketch.is_exact
+    assert sketch.count() == 60
+
+
+def test_distinct_merge_does_not_depend_on_the_split():
+    whole = DistinctSketch(k=256).update(names(0, 20_000))
+    # Overlapping parts: every name is seen once or twice
+    parts = [DistinctSketch(k=256).update(names(start, min(start + 3_000, 20_000)))
+             for start in range(0, 20_000, 2_000)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert not merged.is_exact
+    assert np.array_equal(merged.hashes, whole.hashes)
+    assert abs(merged.count() / 20_000 - 1) < 0.25 # Standard error about 1 / sqrt(256)
+
+
+def test_quantile_rank_error_is_bounded():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(0, 1, 200_000)
+    values[::1000] = np.nan
+    finite = np.sort(values[np.isfinite(values)])
+    whole = QuantileSketch.from_values(values)
+    merged = QuantileSketch.from_values(values[:50_000])
+    for start in range(50_000, len(values), 50_000):
+        merged.merge(QuantileSketch.from_values(values[start:start + 50_000]))
+
+    qs = np.linspace(0, 1, 21)
+    for sketch in (whole, merged):
+        assert sketch.count == len(finite)
+        assert (sketch.min, sketch.max) == (finite[0], finite[-1])
+        ranks = np.searchsorted(finite, sketch.quantiles(qs), side='right') / len(finite)
+        assert np.abs(ranks - qs).max() < 0.02 # About 1.7 / k for k = 200
+        assert len(np.concatenate(sketch.levels)) < 2_000
+
+
+def test_box_summary_keeps_exact_extremes():
+    values = np.concatenate([np.random.default_rng(1).normal(0, 1, 100_000), [50.0, -40.0]])
+    summary = QuantileSketch.from_values(values).box_summary()
+
+    assert summary['count'] == len(values)
+    assert (summary['min'], summary['max']) == (-40.0, 50.0)
+    assert {-40.0, 50.0} <= set(summary['outliers'])
+    assert abs(summary['median']) < 0.05 and summary['lowerfence'] < summary['q1'] < summary['q3']
+    assert QuantileSketch().box_summary() is None
@@ -0,0 +1,38 @@
+from utils.store import CrawlStore
+
+
+def track(number, artist="a1"):
+    return {"id": f"t{number}", "name": f"Song {number}", "artists": [{"id": artist}]}
+
+
+def test_crawl_resumes_from_the_store(tmp_path):
+    path = str(tmp_path / "crawl.sqlite")
+    with CrawlStore(path) as store:
+        store.add_pending_artists([{"id": "a1", "name": "One"}, {"id": "a2", "name": "Two", "found_via": "a1"}])
+        added = store.save_artist_tracks({"id": "a1", "name": "One"}, [track(1), track(2), {"name": "no id"}])
+        assert [song["id"] for song in added] == ["t1", "t2"]
+        # A track seen again through another artist is not stored twice
+        added = store.save_artist_tracks({"id": "a2", "name": "Two"}, [track(2, "a2"), track(3, "a2")])
+        assert [song["id"] for song in added] == ["t3"]
+        store.add_pending_artists([{"id": "a3"}])
+        store.advance_offset("rock", 50)
+        store.advance_offset("jazz", 20, exhausted=True)
+
+    with CrawlStore(path) as store: # Reopened, as by a restarted crawl
+        assert sorted(store.fetched_artist_ids()) == ["a1", "a2"]
+        assert store.pending_artists() == [{"id": "a3", "name": None, "found_via": None}]
+        assert store.track_count() == 3
+        assert store.next_offset("rock") == 50
+        assert store.next_offset("jazz") is None
+        assert store.next_offset("pop") == 0
+
+
+def test_tracks_are_paged_in_collection_order(tmp_path):
+    with CrawlStore(str(tmp_path / "crawl.sqlite")) as store:
+        store.save_artist_tracks({"id": "a1"}, [track(number) for number in range(25)])
+        store.update_tracks([{**track(3), "popularity": 70}])
+
+        songs = list(store.iter_tracks(page_size=10))
+        assert [song["id"] for song in songs] == [f"t{number}" for number in range(25)]
+        assert songs[3]["popularity"] == 70
+        assert len(list(store.iter_tracks(limit=12, page_size=5))) == 12
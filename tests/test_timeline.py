@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.timeline import YearArtistRollup, parse_release_dates
+
+
+def test_release_dates_are_parsed_by_precision():
+    parsed = parse_release_dates(["1999", "2004-07", "2011-02-28", " 2020-01-05 ", "0000", "2019-13", None])
+    expected = pd.to_datetime(["1999-01-01", "2004-07-01", "2011-02-28", "2020-01-05", None, None, None])
+    assert parsed.tolist() == expected.tolist()
+    already = pd.Series(pd.to_datetime(["2001-05-06"]))
+    assert parse_release_dates(already).equals(already)
+
+
+def test_rollup_matches_grouped_tracks():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'Release Year': rng.integers(1990, 2024, 2000),
+        'Artist Name': rng.choice(['A', 'B', 'C', 'D', 'E'], 2000),
+        'Popularity': rng.integers(0, 101, 2000),
+    })
+    rollup = YearArtistRollup.from_frame(df)
+
+    assert rollup.year_bounds == (df['Release Year'].min(), df['Release Year'].max())
+    for year_range, artists in [(None, None), ((2000, 2010), ['B', 'D']), ((2023, 2023), ['E']), ((1950, 1960), [])]:
+        selected = df
+        if year_range is not None:
+            selected = selected[selected['Release Year'].between(*year_range)]
+        if artists:
+            selected = selected[selected['Artist Name'].isin(artists)]
+        count, unique_artists, mean_popularity = rollup.totals(year_range, artists)
+        assert (count, unique_artists) == (len(selected), selected['Artist Name'].nunique())
+        assert mean_popularity == pytest.approx(selected['Popularity'].mean(), nan_ok=True)
+        assert rollup.artists_in(year_range) == sorted(
+            df.loc[df['Release Year'].between(*(year_range or (0, 9999))), 'Artist Name'].unique())
+
+        per_year = selected.groupby('Release Year')['Popularity'].agg(['count', 'mean'])
+        result = rollup.per_year(year_range, artists)
+        assert result.index.tolist() == per_year.index.tolist()
+        assert result['count'].tolist() == per_year['count'].tolist()
+        assert np.allclose(result['mean_popularity'], per_year['mean'])
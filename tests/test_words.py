@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from wordcloud import WordCloud
+
+from utils.words import WordFrequencies
+
+TITLES = ["Dogs and Cats", "The Dog's Night", "Love Songs", "Love Song 2", "Night of the Dog",
+          "Café Nights", "Kiss Kiss", "Kisses", "It's a Love Thing", "99 Problems"]
+
+
+def titles_frame():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'Song Name': rng.choice(TITLES, 300),
+        'Release Year': rng.integers(2000, 2010, 300),
+        'Artist Name': rng.choice(['A', 'B', 'C'], 300),
+    })
+
+
+def wordcloud_counts(titles):
+    """What WordCloud counts when given the titles as text, with case folded."""
+    counts = WordCloud(collocations=False).process_text("\n".join(titles))
+    return {word.lower(): count for word, count in counts.items()}
+
+
+def test_frequencies_match_wordcloud():
+    df = titles_frame()
+    frequencies = WordFrequencies.from_frame(df)
+
+    for year_range, artists in [(None, None), ((2003, 2006), ['A', 'C']), ((2009, 2009), ['B'])]:
+        selected = df
+        if year_range is not None:
+            selected = selected[selected['Release Year'].between(*year_range)]
+        if artists:
+            selected = selected[selected['Artist Name'].isin(artists)]
+        assert frequencies.frequencies(year_range, artists) == wordcloud_counts(selected['Song Name'])
+    assert frequencies.frequencies((1990, 1995)) == {}
@@ -0,0 +1,354 @@
+"""
+Query backends for the Kaggle-style track data behind the Insights and
+Comparison pages. Both answer the same filter queries (popularity range
+plus genres): aggregates, histograms, correlations, top-k and samples.
+
+- `PandasBackend` keeps the whole frame in memory with the prebuilt row
+  indexes (utils/index.py) and cubes (utils/cube.py); the default.
+- `ParquetBackend` never holds more than one record batch of rows. It
+  builds the cubes in two streamed passes when opened and answers row-level
+  queries with filtered scans that prune genre partitions and stop early
+  where they can, so memory depends on the number of genres, artists and
+  drawn points rather than on the number of tracks.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.charts import MAX_SCATTER_POINTS, downsample_points, feature_bin_edges, scatter_sample
+from utils.cube import GenreCube, HistogramCube, MomentCube
+from utils.index import ArtistIndex, top_k
+from utils.neighbors import nearest_in_block, standardize
+from utils.parallel import imap
+
+BATCH_SIZE = 1 << 16
+RAW_PREVIEW_ROWS = 10_000 # Rows shown as "raw data" when the dataset is not in memory
+
+
+class PandasBackend:
+    """The in-memory backend: the cleaned frame and its cached indexes."""
+
+    name = "pandas"
+
+    def __init__(self, df, filter_engine, genre_cube, artist_index, moment_cube_for, feature_bins_for, neighbors_for,
+                 workers=1):
+        self.df = df
+        self.filter_engine = filter_engine
+        self.genre_cube = genre_cube
+        self.artist_index = artist_index
+        self._moment_cube_for = moment_cube_for # Cached loaders, keyed by features / feature
+        self._feature_bins_for = feature_bins_for
+        self._neighbors_for = neighbors_for
+        self.workers = workers # Threads for row-range aggregation (utils/parallel.py)
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    @property
+    def row_count(self):
+        return len(self.df)
+
+    @property
+    def genres(self):
+        return self.filter_engine.genres
+
+    def genre_codes_for(self, genres):
+        return self.filter_engine.genre_codes_for(genres)
+
+    def totals(self, popularity_range, genres):
+        return self.genre_cube.totals(popularity_range, self.genre_codes_for(genres))
+
+    def genre_counts(self, popularity_range, genres):
+        return self.genre_cube.genre_counts(popularity_range, self.genre_codes_for(genres))
+
+    def histogram(self, feature, popularity_range, genres, nbins=30):
+        feature_bins = self._feature_bins_for(feature, nbins)
+        rows = self.filter_engine.select(popularity_range, genres).rows
+        return feature_bins.edges, feature_bins.counts(rows)
+
+    def correlation(self, features, popularity_range, genres):
+        return self._moment_cube_for(tuple(features)).correlation(popularity_range, self.genre_codes_for(genres))
+
+    def preview(self, n, popularity_range, genres):
+        return self.df.take(self.filter_engine.select(popularity_range, genres).first_rows(n))
+
+    def top_tracks(self, n, popularity_range, genres, columns):
+        return self.df.take(self.filter_engine.top_rows(n, popularity_range, genres))[columns]
+
+    def top_artists(self, n, popularity_range, genres):
+        rows = self.filter_engine.select(popularity_range, genres).rows
+        artist_popularity = self.artist_index.mean_by_artist(self.df['popularity'].to_numpy(), rows, self.workers)
+        return artist_popularity.iloc[top_k(artist_popularity.to_numpy(), n)]
+
+    def scatter_points(self, x, y, popularity_range, genres, columns):
+        """(points to draw with `columns`, number of matching tracks)."""
+        rows = self.filter_engine.select(popularity_range, genres).rows
+        drawn, total = scatter_sample(self.df, x, y, rows=rows, priority='popularity')
+        return self.df[columns].take(drawn), total
+
+    def search_tracks(self, text, limit=50):
+        """The first `limit` tracks whose name contains `text` (any case), indexed by row."""
+        matches = np.flatnonzero(self.df['track_name'].astype(str).str.contains(text, case=False, regex=False))
+        return self.df.take(matches[:limit])
+
+    def similar_tracks(self, track, k, popularity_range, genres, features, columns):
+        """
+        The `k` matching tracks nearest to `track` (a row of `search_tracks`)
+        by standardized `features`, with their 'distance', nearest first.
+        """
+        ranges = self.filter_engine.select_ranges(popularity_range, genres)
+        rows, distances = self._neighbors_for(tuple(features)).nearest(track.name, k, ranges, workers=self.workers)
+        return self.df[columns].take(rows).assign(distance=distances)
+
+    def head(self, n):
+        return self.df.head(n)
+
+    def raw_data(self):
+        return self.df
+
+    def iter_batches(self, columns, batch_size=BATCH_SIZE):
+        df = self.df[columns]
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size] # Row slices are views
+
+
+class ParquetBackend:
+    """
+    Streams a Parquet file or directory (optionally hive-partitioned by
+    genre, see `data/dataset_clean.py`) with `pyarrow.dataset`. Aggregates
+    come from cubes built when the backend is opened; row-level queries are
+    filtered scans, and their results are small. Batches are aggregated on
+    `workers` threads while the scan reads ahead.
+    """
+
+    name = "parquet"
+
+    def __init__(self, dataset, features, nbins=30, batch_size=BATCH_SIZE, workers=1):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.workers = workers
+        self.columns = dataset.schema.names
+        features = [feature for feature in features if feature in self.columns]
+        self._build_cubes(features, nbins)
+
+    @classmethod
+    def open(cls, path, features, nbins=30, workers=1):
+        import pyarrow.dataset as ds
+
+        # Dictionary-encoded partition values arrive in pandas as categoricals, not strings
+        partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+        return cls(ds.dataset(path, format="parquet", partitioning=partitioning), features, nbins, workers=workers)
+
+    # --- Scans ---
+
+    def _filter(self, popularity_range=None, genres=None):
+        import pyarrow.dataset as ds
+
+        expression = ds.field('track_genre').is_valid()
+        if popularity_range is not None:
+            expression &= (ds.field('popularity') >= int(popularity_range[0])) & \
+                          (ds.field('popularity') <= int(popularity_range[1]))
+        if genres:
+            expression &= ds.field('track_genre').isin(list(genres))
+        return expression
+
+    def _scan(self, columns, expression=None, batch_size=None):
+        """
+        Matching rows as frames of about `batch_size` rows. Partitions yield
+        small record batches, so they are gathered up before conversion and
+        every consumer pays its per-batch cost per `batch_size` rows.
+        """
+        import pyarrow as pa
+
+        batch_size = batch_size or self.batch_size
+        pending, pending_rows = [], 0
+        for batch in self.dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= batch_size:
+                yield pa.Table.from_batches(pending).to_pandas()
+                pending, pending_rows = [], 0
+        if pending_rows:
+            yield pa.Table.from_batches(pending).to_pandas()
+
+    def iter_batches(self, columns, batch_size=None):
+        return self._scan(columns, batch_size=batch_size)
+
+    def _build_cubes(self, features, nbins):
+        # Pass 1: the genre list, row count and each feature's range and mean
+        genres, self.row_count = set(), 0
+        sums, counts = np.zeros(len(features)), np.zeros(len(features))
+        lows, highs = np.full(len(features), np.inf), np.full(len(features), -np.inf)
+        for batch in self.iter_batches(['track_genre'] + features):
+            self.row_count += len(batch)
+            genres.update(batch['track_genre'].dropna().unique())
+            for i, feature in enumerate(features):
+                values = batch[feature].to_numpy(dtype=np.float64)
+                finite = values[np.isfinite(values)]
+                if len(finite):
+                    sums[i] += finite.sum()
+                    counts[i] += len(finite)
+                    lows[i], highs[i] = min(lows[i], finite.min()), max(highs[i], finite.max())
+        self.genres = sorted(genres)
+        self.genre_lookup = {genre: code for code, genre in enumerate(self.genres)}
+        centers = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+        self.edges = {
+            feature: feature_bin_edges([lows[i], highs[i]] if counts[i] else [], nbins)
+            for i, feature in enumerate(features)
+        }
+
+        # Pass 2: cubes over the fixed genre list, merged batch by batch
+        columns = ['track_genre', 'popularity'] + [c for c in ['duration_ms'] if c in self.columns]
+        columns += [feature for feature in features if feature not in columns]
+        def batch_cubes(batch):
+            return (
+                GenreCube.from_frame(batch, genres=self.genres),
+                MomentCube.from_frame(batch, features, genres=self.genres, centers=centers),
+                {feature: HistogramCube.from_frame(batch, feature, edges, genres=self.genres)
+                 for feature, edges in self.edges.items()},
+            )
+
+        self.feature_centers = dict(zip(features, centers))
+        self.genre_cube, self.moment_cube, self.histograms = None, None, {}
+        for genre_cube, moment_cube, histograms in imap(batch_cubes, self.iter_batches(columns), self.workers):
+            self.genre_cube = genre_cube if self.genre_cube is None else self.genre_cube.merge(genre_cube)
+            self.moment_cube = moment_cube if self.moment_cube is None else self.moment_cube.merge(moment_cube)
+            for feature, histogram in histograms.items():
+                self.histograms[feature] = self.histograms[feature].merge(histogram) \
+                    if feature in self.histograms else histogram
+
+    # --- Aggregate queries (from the cubes) ---
+
+    def genre_codes_for(self, genres):
+        """Codes of the given genre names (unknown names are ignored); all genres when None or empty."""
+        if not genres:
+            return np.arange(len(self.genres))
+        return np.array(sorted(self.genre_lookup[g] for g in genres if g in self.genre_lookup), dtype=np.int64)
+
+    def totals(self, popularity_range, genres):
+        return self.genre_cube.totals(popularity_range, self.genre_codes_for(genres))
+
+    def genre_counts(self, popularity_range, genres):
+        return self.genre_cube.genre_counts(popularity_range, self.genre_codes_for(genres))
+
+    def histogram(self, feature, popularity_range, genres, nbins=30):
+        histogram = self.histograms[feature]
+        return histogram.edges, histogram.counts_for(popularity_range, self.genre_codes_for(genres))
+
+    def correlation(self, features, popularity_range, genres):
+        corr = self.moment_cube.correlation(popularity_range, self.genre_codes_for(genres))
+        return None if corr is None else corr.loc[list(features), list(features)]
+
+    def feature_scales(self, features):
+        """Overall means and standard deviations of `features`, from the moment cube."""
+        cube = self.moment_cube
+        codes = [cube.features.index(feature) for feature in features]
+        n = max(cube.counts.sum(), 1)
+        mean_offsets = cube.sums.sum(axis=(0, 1))[codes] / n
+        variances = cube.cross_products.sum(axis=(0, 1))[codes, codes] / n - mean_offsets ** 2
+        means = np.array([self.feature_centers[feature] for feature in features]) + mean_offsets
+        stds = np.sqrt(np.maximum(variances, 0))
+        return means, np.where(stds > 0, stds, 1.0)
+
+    # --- Row-level queries (filtered scans) ---
+
+    def preview(self, n, popularity_range, genres):
+        """The first `n` matching rows in dataset order; the scan stops once they are found."""
+        parts, found = [], 0
+        for batch in self._scan(self.columns, self._filter(popularity_range, genres), batch_size=max(n, 1024)):
+            parts.append(batch.iloc[:n - found])
+            found += len(parts[-1])
+            if found >= n:
+                break
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=self.columns)
+
+    def top_tracks(self, n, popularity_range, genres, columns):
+        """Running top-`n` by popularity over the matching rows, ties in dataset order."""
+        kept = pd.DataFrame(columns=columns)
+        for batch in self._scan(columns, self._filter(popularity_range, genres)):
+            candidates = pd.concat([kept, batch], ignore_index=True) if len(kept) else batch.reset_index(drop=True)
+            kept = candidates.take(top_k(candidates['popularity'].to_numpy(dtype=np.float64), n))
+        return kept.reset_index(drop=True)
+
+    def top_artists(self, n, popularity_range, genres):
+        """Mean popularity per artist over the matching rows, accumulated per batch; the `n` highest."""
+        def batch_totals(batch):
+            artist_index = ArtistIndex.from_series(batch['artists'])
+            counts, sums = artist_index.aggregate(batch['popularity'].to_numpy())
+            present = np.flatnonzero(counts)
+            return pd.DataFrame({'count': counts[present], 'sum': sums[present]}, index=artist_index.names[present])
+
+        partials, totals = [], pd.DataFrame(columns=['count', 'sum'], dtype=np.float64)
+        batches = self._scan(['artists', 'popularity'], self._filter(popularity_range, genres))
+        for partial in imap(batch_totals, batches, self.workers):
+            partials.append(partial)
+            if len(partials) >= 32: # Fold the partial sums so memory follows the number of artists
+                totals = pd.concat([totals] + partials).groupby(level=0).sum()
+                partials = []
+        totals = pd.concat([totals] + partials).groupby(level=0).sum()
+        artist_popularity = (totals['sum'] / totals['count']).sort_index()
+        return artist_popularity.iloc[top_k(artist_popularity.to_numpy(), n)]
+
+    def scatter_points(self, x, y, popularity_range, genres, columns, max_points=MAX_SCATTER_POINTS):
+        """
+        (points to draw with `columns`, number of matching tracks). Each batch
+        is thinned together with the points kept so far with
+        `downsample_points`, so extremes and the most popular tracks survive
+        and at most twice the drawn points plus one batch are held at once.
+        """
+        columns = list(dict.fromkeys(columns + [x, y, 'popularity']))
+        kept, total = None, 0
+        for batch in self._scan(columns, self._filter(popularity_range, genres)):
+            total += len(batch)
+            kept = batch if kept is None else pd.concat([kept, batch], ignore_index=True)
+            if len(kept) > 2 * max_points:
+                kept = kept.take(downsample_points(kept[x], kept[y], 2 * max_points, priority=kept['popularity']))
+        if kept is None:
+            return pd.DataFrame(columns=columns), 0
+        kept = kept.take(downsample_points(kept[x], kept[y], max_points, priority=kept['popularity']))
+        return kept.reset_index(drop=True), total
+
+    def search_tracks(self, text, limit=50):
+        """The first `limit` tracks whose name contains `text` (any case); the scan stops once they are found."""
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        expression = self._filter() & pc.match_substring(ds.field('track_name'), text, ignore_case=True)
+        parts, found = [], 0
+        for batch in self._scan(self.columns, expression, batch_size=max(limit, 1024)):
+            parts.append(batch.iloc[:limit - found])
+            found += len(parts[-1])
+            if found >= limit:
+                break
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=self.columns)
+
+    def similar_tracks(self, track, k, popularity_range, genres, features, columns):
+        """
+        The `k` matching tracks nearest to `track` (a row of `search_tracks`)
+        by standardized `features`, with their 'distance', nearest first: a
+        streamed brute force keeping each batch's `k` nearest.
+        """
+        means, scales = self.feature_scales(features)
+        query = standardize(track[features].to_numpy(dtype=np.float64)[None, :], means, scales)[0]
+        columns = list(dict.fromkeys(columns + ['track_name', 'artists']))
+
+        def batch_nearest(batch):
+            # The track itself, identified by name and artists, is not its own neighbour
+            batch = batch[~((batch['track_name'] == track['track_name']) & (batch['artists'] == track['artists']))]
+            vectors = standardize(batch[features].to_numpy(dtype=np.float64), means, scales)
+            positions, distances = nearest_in_block(vectors, np.einsum('ij,ij->i', vectors, vectors), query, k)
+            return batch[columns].take(positions).assign(distance=np.sqrt(distances))
+
+        batches = self._scan(list(dict.fromkeys(columns + features)), self._filter(popularity_range, genres))
+        kept = pd.DataFrame(columns=columns + ['distance'])
+        for nearest in imap(batch_nearest, batches, self.workers):
+            candidates = pd.concat([kept, nearest], ignore_index=True) if len(kept) else nearest.reset_index(drop=True)
+            kept = candidates.take(top_k(-candidates['distance'].to_numpy(dtype=np.float64), k))
+        return kept.reset_index(drop=True)
+
+    def head(self, n):
+        return self.preview(n, None, None)
+
+    def raw_data(self):
+        """The first `RAW_PREVIEW_ROWS` rows; the whole dataset is never loaded."""
+        return self.head(RAW_PREVIEW_ROWS)
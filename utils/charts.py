@@ -0,0 +1,244 @@
+"""
+Chart helpers that aggregate on the server, so a figure's payload depends on
+the number of bins or points drawn rather than on the number of rows.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+SVG_POINT_LIMIT = 5_000 # Above this many points scatters are drawn with WebGL
+MAX_SCATTER_POINTS = 20_000 # Above this many points scatters are downsampled
+MAX_COLOR_GROUPS = 10 # Colour groups beyond the largest ones are drawn as one "Other" trace
+OTHER_GROUP = "Other"
+
+
+def feature_bin_edges(values, nbins=30):
+    """`nbins` equal-width bins spanning the finite range of `values`."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return np.linspace(0, 1, nbins + 1)
+    lo, hi = finite.min(), finite.max()
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, nbins + 1)
+
+
+def feature_bin_ids(values, edges):
+    """Bin number of each value; the last bin's right edge is inclusive, as in np.histogram, and NaNs get bin `nbins`."""
+    values = np.asarray(values, dtype=np.float64)
+    nbins = len(edges) - 1
+    bin_ids = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, nbins - 1)
+    return np.where(np.isfinite(values), bin_ids, nbins)
+
+
+class FeatureBins:
+    """
+    Fixed bin edges for one feature together with every row's bin number, so
+    the histogram of any row selection is a single bincount.
+    """
+
+    def __init__(self, edges, bin_ids):
+        self.edges = edges
+        self.bin_ids = bin_ids
+
+    @classmethod
+    def from_values(cls, values, nbins=30):
+        values = np.asarray(values, dtype=np.float64)
+        edges = feature_bin_edges(values, nbins)
+        bin_ids = feature_bin_ids(values, edges) # NaNs go to bin `nbins`, which counts() drops
+        return cls(edges, bin_ids.astype(np.uint8 if nbins < 255 else np.uint16))
+
+    @property
+    def nbins(self):
+        return len(self.edges) - 1
+
+    def counts(self, rows=None):
+        bin_ids = self.bin_ids if rows is None else self.bin_ids[rows]
+        return np.bincount(bin_ids, minlength=self.nbins + 1)[:self.nbins]
+
+
+def histogram_counts(values, edges):
+    """Counts of the finite `values` in the given bins."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.histogram(values[np.isfinite(values)], bins=edges)[0]
+
+
+def histogram_figure(edges, counts, title=None, xaxis_title=None, yaxis_title="Count",
+                     template="plotly_white", color=None):
+    """A histogram drawn as a bar trace of precomputed bin counts."""
+    edges = np.asarray(edges, dtype=np.float64)
+    centers = (edges[:-1] + edges[1:]) / 2
+    fig = go.Figure(go.Bar(
+        x=centers,
+        y=counts,
+        width=np.diff(edges),
+        marker_color=color,
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="%{customdata[0]:.3g} – %{customdata[1]:.3g}<br>%{y:,}<extra></extra>",
+    ))
+    fig.update_layout(title=title, template=template, bargap=0,
+                      xaxis_title=xaxis_title, yaxis_title=yaxis_title)
+    return fig
+
+
+def box_figure(summaries, title=None, yaxis_title=None, template="plotly_white"):
+    """
+    Box plot drawn from precomputed statistics (see
+    `QuantileSketch.box_summary`), one box per entry of `summaries`
+    ({name: summary}), with the outlier sample as separate markers.
+    """
+    fig = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, (name, summary) in enumerate(summaries.items()):
+        if summary is None:
+            continue
+        color = colors[i % len(colors)]
+        fig.add_trace(go.Box(
+            x=[name], name=name, marker_color=color, boxpoints=False,
+            q1=[summary['q1']], median=[summary['median']], q3=[summary['q3']],
+            lowerfence=[summary['lowerfence']], upperfence=[summary['upperfence']],
+        ))
+        if len(summary['outliers']):
+            fig.add_trace(go.Scatter(
+                x=[name] * len(summary['outliers']), y=summary['outliers'], mode="markers",
+                marker=dict(color=color, size=4), name=name, showlegend=False,
+                hovertemplate="%{y}<extra>outlier</extra>",
+            ))
+    fig.update_layout(title=title, template=template, yaxis_title=yaxis_title, showlegend=False)
+    return fig
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype('datetime64[ns]').astype(np.int64)
+    return values.astype(np.float64)
+
+
+def downsample_points(x, y, max_points, priority=None, grid=64, seed=0):
+    """
+    Picks at most `max_points` of the given points to draw, returned as sorted
+    positions. Always kept: the points with the highest `priority` (5% of the
+    budget) and the most extreme points on each side of both axes (10% of the
+    budget). The rest of the budget is spread over a `grid` x `grid` binning
+    of the plane with a common per-cell cap, so dense regions are thinned
+    while sparse regions keep every point.
+    """
+    x, y = _as_float(x), _as_float(y)
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    keep = np.zeros(n, dtype=bool)
+
+    if priority is not None:
+        top = max(1, max_points // 20)
+        keep[np.argpartition(-_as_float(priority), top - 1)[:top]] = True
+
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    extreme = max(1, max_points // 40)
+    bounds = []
+    for values in (x[finite], y[finite]):
+        if len(values) > 2 * extreme:
+            keep[finite[np.argpartition(values, extreme)[:extreme]]] = True
+            keep[finite[np.argpartition(values, -extreme)[-extreme:]]] = True
+        # The grid spans the bulk of the data, so outliers do not squash it
+        bounds.append(np.quantile(values, [0.005, 0.995]) if len(values) else (0.0, 1.0))
+    budget = max_points - int(keep.sum())
+
+    # Stratified sample of the rest by 2D grid cell
+    rest = finite[~keep[finite]]
+    if budget > 0 and len(rest):
+        def cell_of(values, lo, hi):
+            span = hi - lo if hi > lo else 1.0
+            return np.clip(((values - lo) / span * grid).astype(np.int64), 0, grid - 1)
+        cells = cell_of(x[rest], *bounds[0]) * grid + cell_of(y[rest], *bounds[1])
+        cell_counts = np.bincount(cells, minlength=grid * grid)
+
+        # Largest per-cell cap whose total fits the budget
+        sorted_counts = np.sort(cell_counts[cell_counts > 0])
+        taken_below = np.concatenate([[0], np.cumsum(sorted_counts)[:-1]])
+        totals = taken_below + sorted_counts * np.arange(len(sorted_counts), 0, -1)
+        i = int(np.searchsorted(totals, budget, side='right')) # Cells below i are kept whole
+        if i == len(sorted_counts):
+            cap, extra = sorted_counts[-1], 0
+        else:
+            cap, extra = divmod(budget - taken_below[i], len(sorted_counts) - i)
+
+        # Random rank of each point within its cell; keep ranks below the cap
+        shuffled = rng.permutation(len(rest))
+        by_cell = shuffled[np.argsort(cells[shuffled], kind='stable')]
+        starts = np.concatenate([[0], np.cumsum(cell_counts)[:-1]])
+        rank = np.arange(len(rest)) - starts[cells[by_cell]]
+        keep[rest[by_cell[rank < cap]]] = True
+        if extra:
+            # The rounding remainder goes to randomly chosen capped cells
+            next_in_line = by_cell[rank == cap]
+            keep[rest[rng.choice(next_in_line, min(extra, len(next_in_line)), replace=False)]] = True
+
+    return np.flatnonzero(keep)
+
+
+def scatter_sample(df, x, y, rows=None, priority=None, max_points=MAX_SCATTER_POINTS):
+    """
+    (row positions to draw, total number of points) for a scatter of `df`
+    restricted to the row positions `rows`: all of them up to `max_points`,
+    the `downsample_points` sample above it.
+    """
+    rows = np.arange(len(df)) if rows is None else np.asarray(rows)
+    total = len(rows)
+    if total > max_points:
+        keep = downsample_points(
+            df[x].to_numpy()[rows], df[y].to_numpy()[rows], max_points,
+            priority=df[priority].to_numpy()[rows] if priority else None
+        )
+        rows = rows[keep]
+    return rows, total
+
+
+def color_groups(values, max_groups=MAX_COLOR_GROUPS, other=OTHER_GROUP):
+    """
+    `values` (a Series) with everything outside its `max_groups` most
+    frequent values replaced by `other`, so a chart coloured by it has at
+    most `max_groups` + 1 traces. Returns (values, the kept values largest
+    first), or (values, None) when there are no more than `max_groups`.
+    """
+    counts = values.value_counts()
+    if len(counts) <= max_groups:
+        return values, None
+    kept = counts.index[:max_groups]
+    return values.where(values.isin(kept) | values.isna(), other), list(kept)
+
+
+def lod_scatter(df, x, y, rows=None, priority=None, svg_limit=SVG_POINT_LIMIT, max_points=MAX_SCATTER_POINTS,
+                sample=None, max_colors=MAX_COLOR_GROUPS, **px_kwargs):
+    """
+    Level-of-detail scatter over `df` (optionally restricted to the row
+    positions `rows`): drawn as SVG for small inputs, with WebGL above
+    `svg_limit` points, and from `downsample_points` above `max_points`.
+    `sample` is a precomputed `scatter_sample` result, e.g. from a cache.
+    Plotly draws one trace per colour, so when `color` names a column only
+    its `max_colors` most frequent values among the drawn points get their
+    own colour and the rest are grouped as "Other".
+    Returns (figure, total points, drawn points).
+    """
+    rows, total = sample if sample is not None else scatter_sample(df, x, y, rows, priority, max_points)
+    points = df.take(rows)
+    color = px_kwargs.get('color')
+    if isinstance(color, str) and color in points.columns:
+        grouped, kept = color_groups(points[color], max_colors)
+        if kept is not None:
+            points = points.assign(**{color: grouped})
+            px_kwargs['category_orders'] = {color: kept + [OTHER_GROUP], **px_kwargs.get('category_orders', {})}
+            px_kwargs['color_discrete_map'] = {OTHER_GROUP: "lightgray", **px_kwargs.get('color_discrete_map', {})}
+    fig = px.scatter(points, x=x, y=y, render_mode="webgl" if total > svg_limit else "svg", **px_kwargs)
+    return fig, total, len(rows)
+
+
+def scatter_caption(total, drawn, unit="tracks"):
+    if drawn < total:
+        return (f"Showing {drawn:,} of {total:,} {unit} (WebGL; density-stratified sample that keeps "
+                f"outliers and the most popular {unit}).")
+    return f"Showing all {total:,} {unit}" + (" (WebGL)." if total > SVG_POINT_LIMIT else ".")
@@ -0,0 +1,106 @@
+"""
+Per-source summaries for the comparison page. Each source is read once, in
+chunks of row views, and reduced to the few numbers and counts the page
+shows, so comparing sources never concatenates or copies them.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.parallel import map_reduce
+from utils.sketch import DistinctSketch, QuantileSketch
+
+
+class SourceSummary:
+    """
+    Track count, distinct artists (a distinct-count sketch, so approximate
+    for large sources), popularity mean and quantile sketch, genre counts
+    and per-feature quantile sketches for one source, accumulated chunk by
+    chunk. Expects the Kaggle column names ('artists', 'popularity',
+    'track_genre').
+    """
+
+    def __init__(self, name, features=()):
+        self.name = name
+        self.count = 0
+        self.popularity = QuantileSketch()
+        self.features = {feature: QuantileSketch() for feature in features}
+        self.genre_counts = pd.Series(dtype=np.int64)
+        self.artists = DistinctSketch()
+        self._popularity_sum = 0.0
+
+    @classmethod
+    def from_frame(cls, name, df, features=(), chunk_size=1 << 16, workers=1):
+        """Summary of `df` (features it does not have are skipped), in one pass."""
+        chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size)) # Row slices are views
+        return cls.from_batches(name, chunks, [feature for feature in features if feature in df.columns], workers)
+
+    @classmethod
+    def from_batches(cls, name, batches, features=(), workers=1):
+        """
+        Summary of a stream of frames, e.g. a backend's `iter_batches` (see
+        utils/backend.py). With several `workers`, batches are summarized in
+        parallel and the partial summaries merged in batch order.
+        """
+        if workers == 1:
+            summary = cls(name, features)
+            for batch in batches:
+                summary.update(batch)
+            return summary
+        return map_reduce(lambda batch: cls(name, features).update(batch), cls.merge, batches, workers,
+                          initial=cls(name, features))
+
+    def update(self, chunk):
+        self.count += len(chunk)
+        self.artists.update(chunk['artists'].unique())
+
+        popularity = pd.to_numeric(chunk['popularity'], errors='coerce').to_numpy(dtype=np.float64)
+        self._popularity_sum += np.nansum(popularity)
+        self.popularity.update(popularity)
+
+        genre_counts = chunk['track_genre'].value_counts()
+        genre_counts = genre_counts[genre_counts > 0] # Categoricals also list absent categories
+        genre_counts.index = genre_counts.index.astype(object)
+        self.genre_counts = self.genre_counts.add(genre_counts, fill_value=0).astype(np.int64)
+
+        for feature, sketch in self.features.items():
+            sketch.update(pd.to_numeric(chunk[feature], errors='coerce').to_numpy(dtype=np.float64))
+        return self
+
+    def merge(self, other):
+        """Folds the summary of other rows of the same source into this one and returns it."""
+        self.count += other.count
+        self.artists.merge(other.artists)
+        self._popularity_sum += other._popularity_sum
+        self.popularity.merge(other.popularity)
+        self.genre_counts = self.genre_counts.add(other.genre_counts, fill_value=0).astype(np.int64)
+        for feature, sketch in self.features.items():
+            sketch.merge(other.features[feature])
+        return self
+
+    @property
+    def unique_artists(self):
+        return int(round(self.artists.count()))
+
+    @property
+    def mean_popularity(self):
+        return self._popularity_sum / self.popularity.count if self.popularity.count else np.nan
+
+    def top_genres(self, n=None):
+        """Genre counts, largest first with ties by name (so the first is the mode)."""
+        counts = self.genre_counts.sort_index().sort_values(ascending=False, kind='stable')
+        return counts if n is None else counts.head(n)
+
+    def genre_shares(self, n=10):
+        """Percentage of tracks with a genre in each of the `n` largest genres."""
+        total = self.genre_counts.sum()
+        return self.top_genres(n) / total * 100 if total else self.top_genres(n).astype(float)
+
+
+def summary_table(summaries):
+    """The page's summary table, one row per source."""
+    return pd.DataFrame({
+        "Total Tracks": [s.count for s in summaries],
+        "Unique Artists": [s.unique_artists for s in summaries],
+        "Avg Popularity": [s.mean_popularity for s in summaries],
+        "Top Genre": [s.top_genres(1).index[0] if len(s.genre_counts) else "N/A" for s in summaries],
+    }, index=[s.name for s in summaries])
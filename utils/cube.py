@@ -0,0 +1,211 @@
+"""
+Pre-aggregated (genre, popularity) cubes. Both Insights filters work on just
+these two dimensions, so any filter is a set of cube cells and the filtered
+aggregates are sums over those cells, independent of the number of rows.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.charts import feature_bin_ids
+from utils.parallel import map_reduce_rows
+
+N_POPULARITY = 101 # Integer popularity 0-100
+
+
+def popularity_cells(genre_codes, popularity, n_genres):
+    """Flat cell id (genre * 101 + popularity) per row; rows without a genre get id n_genres * 101."""
+    genre_codes = np.asarray(genre_codes, dtype=np.int64)
+    cells = genre_codes * N_POPULARITY + np.clip(np.asarray(popularity, dtype=np.int64), 0, N_POPULARITY - 1)
+    return np.where(genre_codes >= 0, cells, n_genres * N_POPULARITY)
+
+
+def _genre_categories(values, genres=None):
+    """Genre column as a categorical; with `genres` given, its codes follow that fixed list (e.g. across batches)."""
+    if genres is None:
+        return values.astype('category')
+    return pd.Series(pd.Categorical(values, categories=genres), index=values.index)
+
+
+class GenreCube:
+    """Track counts, popularity sums and duration sums per (genre, popularity) cell."""
+
+    def __init__(self, genres, counts, popularity_sums, duration_sums):
+        self.genres = list(genres)
+        self.counts = counts
+        self.popularity_sums = popularity_sums
+        self.duration_sums = duration_sums
+
+    @classmethod
+    def from_frame(cls, df, genre_col='track_genre', popularity_col='popularity', duration_col='duration_ms',
+                   genres=None, workers=1):
+        if workers != 1: # Cubes over row ranges, merged
+            genres = _genre_categories(df[genre_col], genres).cat.categories
+            return map_reduce_rows(
+                lambda start, stop: cls.from_frame(df.iloc[start:stop], genre_col, popularity_col, duration_col, genres),
+                cls.merge, len(df), workers
+            )
+        genres = _genre_categories(df[genre_col], genres)
+        n_genres = len(genres.cat.categories)
+        n_cells = n_genres * N_POPULARITY
+        cells = popularity_cells(genres.cat.codes.to_numpy(), df[popularity_col].to_numpy(), n_genres)
+
+        def cell_sums(weights=None):
+            return np.bincount(cells, weights=weights, minlength=n_cells + 1)[:n_cells].reshape(n_genres, N_POPULARITY)
+
+        counts = cell_sums().astype(np.int64)
+        # Every row in a cell has the same popularity
+        popularity_sums = counts * np.arange(N_POPULARITY)
+        if duration_col in df.columns:
+            duration_sums = cell_sums(np.nan_to_num(df[duration_col].to_numpy(dtype=np.float64)))
+        else:
+            duration_sums = None
+        return cls(genres.cat.categories, counts, popularity_sums, duration_sums)
+
+    def merge(self, other):
+        """Adds the cells of `other`, built over the same genre list, into this cube and returns it."""
+        self.counts = self.counts + other.counts
+        self.popularity_sums = self.popularity_sums + other.popularity_sums
+        if self.duration_sums is not None and other.duration_sums is not None:
+            self.duration_sums = self.duration_sums + other.duration_sums
+        return self
+
+    def _block(self, array, popularity_range, genre_codes):
+        lo, hi = int(popularity_range[0]), int(popularity_range[1])
+        return array[genre_codes, max(lo, 0):min(hi, N_POPULARITY - 1) + 1]
+
+    def totals(self, popularity_range, genre_codes):
+        """(track count, mean popularity, mean duration in ms) over the selected cells; means are NaN when empty."""
+        count = int(self._block(self.counts, popularity_range, genre_codes).sum())
+        if count == 0:
+            return 0, float('nan'), float('nan')
+        mean_popularity = self._block(self.popularity_sums, popularity_range, genre_codes).sum() / count
+        mean_duration = float('nan')
+        if self.duration_sums is not None:
+            mean_duration = self._block(self.duration_sums, popularity_range, genre_codes).sum() / count
+        return count, mean_popularity, mean_duration
+
+    def genre_counts(self, popularity_range, genre_codes):
+        """Track count per selected genre, largest first, as a Series indexed by genre name."""
+        counts = self._block(self.counts, popularity_range, genre_codes).sum(axis=1)
+        series = pd.Series(counts, index=[self.genres[code] for code in genre_codes])
+        return series[series > 0].sort_values(ascending=False)
+
+
+class MomentCube:
+    """
+    Sufficient statistics of a set of numeric features per (genre, popularity)
+    cell: row count, per-feature sums and the feature cross-product matrix.
+    The covariance and correlation of any cell selection follow from these
+    partial sums, without touching the rows.
+
+    Features are centred on their overall mean before accumulating, which
+    keeps the subtraction in the covariance formula numerically stable;
+    missing values count as that mean. Cubes built batch by batch must share
+    their `centers` (any fixed values close to the means) to be merged.
+    """
+
+    def __init__(self, features, counts, sums, cross_products):
+        self.features = list(features)
+        self.counts = counts
+        self.sums = sums
+        self.cross_products = cross_products
+
+    @classmethod
+    def from_frame(cls, df, features, genre_col='track_genre', popularity_col='popularity', genres=None,
+                   centers=None, workers=1):
+        if workers != 1: # Cubes over row ranges with common genres and centers, merged
+            genres = _genre_categories(df[genre_col], genres).cat.categories
+            if centers is None:
+                centers = [np.nanmean(df[feature].to_numpy(dtype=np.float64)) for feature in features]
+            return map_reduce_rows(
+                lambda start, stop: cls.from_frame(df.iloc[start:stop], features, genre_col, popularity_col,
+                                                   genres, centers),
+                cls.merge, len(df), workers
+            )
+        genres = _genre_categories(df[genre_col], genres)
+        n_genres = len(genres.cat.categories)
+        n_cells = n_genres * N_POPULARITY
+        cells = popularity_cells(genres.cat.codes.to_numpy(), df[popularity_col].to_numpy(), n_genres)
+        k = len(features)
+
+        def cell_sums(weights=None):
+            return np.bincount(cells, weights=weights, minlength=n_cells + 1)[:n_cells]
+
+        columns = []
+        for i, feature in enumerate(features):
+            values = df[feature].to_numpy(dtype=np.float64)
+            center = np.nanmean(values) if centers is None else centers[i]
+            columns.append(np.nan_to_num(values - center))
+
+        counts = cell_sums().astype(np.int64).reshape(n_genres, N_POPULARITY)
+        sums = np.empty((n_genres, N_POPULARITY, k))
+        cross_products = np.empty((n_genres, N_POPULARITY, k, k))
+        for i in range(k):
+            sums[..., i] = cell_sums(columns[i]).reshape(n_genres, N_POPULARITY)
+            for j in range(i, k):
+                # One weighted bincount per feature pair; the matrix is symmetric
+                products = cell_sums(columns[i] * columns[j]).reshape(n_genres, N_POPULARITY)
+                cross_products[..., i, j] = products
+                cross_products[..., j, i] = products
+        return cls(features, counts, sums, cross_products)
+
+    def merge(self, other):
+        """Adds the cells of `other` (same genres, features and centers) into this cube and returns it."""
+        self.counts = self.counts + other.counts
+        self.sums = self.sums + other.sums
+        self.cross_products = self.cross_products + other.cross_products
+        return self
+
+    def correlation(self, popularity_range, genre_codes):
+        """
+        Pearson correlation matrix of the features over the selected cells, as
+        a DataFrame; None when no rows are selected.
+        """
+        lo = max(int(popularity_range[0]), 0)
+        hi = min(int(popularity_range[1]), N_POPULARITY - 1)
+        n = self.counts[genre_codes, lo:hi + 1].sum()
+        if n == 0:
+            return None
+        s = self.sums[genre_codes, lo:hi + 1].sum(axis=(0, 1))
+        q = self.cross_products[genre_codes, lo:hi + 1].sum(axis=(0, 1))
+
+        covariance = (q - np.outer(s, s) / n) / max(n - 1, 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(np.diag(covariance))
+            corr = covariance / np.outer(std, std)
+        return pd.DataFrame(corr, index=self.features, columns=self.features)
+
+
+class HistogramCube:
+    """
+    Histogram counts of one feature per (genre, popularity) cell over fixed
+    bin edges. The counterpart of `FeatureBins` for data that is not kept in
+    memory: it needs no per-row bin numbers and can be built batch by batch.
+    """
+
+    def __init__(self, edges, counts):
+        self.edges = edges
+        self.counts = counts # (genre, popularity, bin)
+
+    @classmethod
+    def from_frame(cls, df, feature, edges, genre_col='track_genre', popularity_col='popularity', genres=None):
+        genres = _genre_categories(df[genre_col], genres)
+        n_genres = len(genres.cat.categories)
+        nbins = len(edges) - 1
+        cells = popularity_cells(genres.cat.codes.to_numpy(), df[popularity_col].to_numpy(), n_genres)
+        # Rows without a genre and NaN values (bin `nbins`) fall into the dropped last slot
+        slots = cells * (nbins + 1) + feature_bin_ids(df[feature].to_numpy(dtype=np.float64), edges)
+        n_slots = n_genres * N_POPULARITY * (nbins + 1)
+        counts = np.bincount(slots, minlength=n_slots + nbins + 1)[:n_slots]
+        return cls(edges, counts.reshape(n_genres, N_POPULARITY, nbins + 1)[..., :nbins])
+
+    def merge(self, other):
+        """Adds the counts of `other` (same genres and edges) into this cube and returns it."""
+        self.counts = self.counts + other.counts
+        return self
+
+    def counts_for(self, popularity_range, genre_codes):
+        """Bin counts over the selected cells."""
+        lo = max(int(popularity_range[0]), 0)
+        hi = min(int(popularity_range[1]), N_POPULARITY - 1)
+        return self.counts[genre_codes, lo:hi + 1].sum(axis=(0, 1))
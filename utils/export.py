@@ -0,0 +1,168 @@
+import abc
+import csv
+import datetime
+import os
+
+# Named like the Kaggle dataset's columns so the dashboards can compare them directly
+AUDIO_FEATURE_COLUMNS = [
+    'danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms'
+]
+
+EXPORT_COLUMNS = [
+    "Song Number", "Song Name", "Artist Name", "Album Name", "Release Date",
+    "Release Date Precision", "Popularity", "Track ID"
+] + AUDIO_FEATURE_COLUMNS
+
+
+def flatten_track(song, number):
+    """Flattens a Spotify track object into one export row."""
+    album = song.get("album") or {}
+    artists = song.get("artists") or []
+    features = song.get("audio_features") or {}
+    row = {
+        "Song Number": number,
+        "Song Name": song.get("name"),
+        # Safely access artist name
+        "Artist Name": artists[0]["name"] if artists else None,
+        "Album Name": album.get("name"),
+        "Release Date": album.get("release_date"),
+        "Release Date Precision": album.get("release_date_precision"),
+        "Popularity": song.get("popularity"),
+        "Track ID": song.get("id"),
+    }
+    for name in AUDIO_FEATURE_COLUMNS:
+        row[name] = features.get(name)
+    row["duration_ms"] = song.get("duration_ms", row["duration_ms"])
+    return row
+
+
+def parse_release_date(value):
+    # Spotify release dates come as "YYYY", "YYYY-MM" or "YYYY-MM-DD"
+    # depending on their precision; missing parts default to the first.
+    if not value:
+        return None
+    parts = value.split("-")
+    try:
+        return datetime.date(int(parts[0]), int(parts[1]) if len(parts) > 1 else 1,
+                             int(parts[2]) if len(parts) > 2 else 1)
+    except ValueError:
+        return None
+
+
+class TrackWriter(abc.ABC):
+    """Base class for streaming exporters: tracks are flattened and numbered as they are written."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    def write(self, song):
+        self.count += 1
+        self._write_row(flatten_track(song, self.count))
+
+    def write_many(self, songs):
+        for song in songs:
+            self.write(song)
+
+    @abc.abstractmethod
+    def _write_row(self, row):
+        """Writes one flattened row."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvTrackWriter(TrackWriter):
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=EXPORT_COLUMNS)
+        self._writer.writeheader()
+
+    def _write_row(self, row):
+        self._writer.writerow({key: "N/A" if value is None else value for key, value in row.items()})
+
+    def close(self):
+        self._file.close()
+
+
+class ArrowTrackWriter(TrackWriter):
+    """
+    Buffers up to `row_group_size` rows, then writes them as one typed record
+    batch, so memory stays constant however many tracks are exported.
+    Writes Parquet by default, or Arrow IPC (Feather) with `ipc=True`.
+    An IPC file allows one dictionary per column for the whole file, while
+    every batch builds its own, so it stores the dictionary columns as plain
+    strings.
+    """
+
+    def __init__(self, path, row_group_size=10_000, ipc=False):
+        import pyarrow as pa
+
+        super().__init__(path)
+        self._pa = pa
+        self.row_group_size = row_group_size
+        self.schema = pa.schema([
+            ("Song Number", pa.int32()),
+            ("Song Name", pa.string()),
+            ("Artist Name", pa.string() if ipc else pa.dictionary(pa.int32(), pa.string())),
+            ("Album Name", pa.string()),
+            ("Release Date", pa.date32()),
+            ("Release Date Precision", pa.string() if ipc else pa.dictionary(pa.int8(), pa.string())),
+            ("Popularity", pa.int8()),
+            ("Track ID", pa.string()),
+        ] + [
+            (name, pa.int32() if name == "duration_ms" else pa.float32()) for name in AUDIO_FEATURE_COLUMNS
+        ])
+        self._buffer = {name: [] for name in EXPORT_COLUMNS}
+        if ipc:
+            self._writer = pa.ipc.new_file(path, self.schema)
+        else:
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self.schema)
+
+    def _write_row(self, row):
+        row["Release Date"] = parse_release_date(row["Release Date"])
+        for name in EXPORT_COLUMNS:
+            self._buffer[name].append(row[name])
+        if len(self._buffer["Song Number"]) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer["Song Number"]:
+            return
+        batch = self._pa.RecordBatch.from_pydict(self._buffer, schema=self.schema)
+        self._writer.write_batch(batch)
+        self._buffer = {name: [] for name in EXPORT_COLUMNS}
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def export_format(path, format=None):
+    """'csv', 'parquet' or 'arrow' (Arrow IPC / Feather), from `format` or the file extension."""
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip(".").lower()
+    if format in ("arrow", "feather", "ipc"):
+        return "arrow"
+    if format in ("csv", "parquet"):
+        return format
+    raise ValueError(f"Unsupported export format: '{format}'")
+
+
+def open_writer(path, format=None, row_group_size=10_000):
+    """Opens a streaming track writer, picking the format from `format` or the file extension."""
+    format = export_format(path, format)
+    if format == "csv":
+        return CsvTrackWriter(path)
+    if format == "parquet":
+        return ArrowTrackWriter(path, row_group_size)
+    return ArrowTrackWriter(path, row_group_size, ipc=True)
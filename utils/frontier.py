@@ -0,0 +1,52 @@
+from collections import deque
+
+# Broad genre/keyword queries used to seed a crawl when none are given
+DEFAULT_SEED_QUERIES = [
+    "pop", "rock", "hip hop", "rap", "r&b", "indie", "electronic", "dance", "house", "techno",
+    "jazz", "blues", "soul", "funk", "country", "folk", "classical", "metal", "punk", "reggae",
+    "latin", "reggaeton", "k-pop", "j-pop", "afrobeats", "bollywood", "gospel", "ambient",
+    "lo-fi", "edm", "trap", "drill", "grunge", "disco", "opera", "soundtrack", "acoustic",
+    "alternative", "emo", "ska", "salsa", "samba", "tango", "flamenco", "bluegrass", "synthwave",
+]
+
+
+class CrawlFrontier:
+    """
+    Work queue for the scraper. It holds search pages still to request (one
+    per seed query, re-queued with the next offset until the query is
+    exhausted) and artists still to fetch. Artists are deduplicated against a
+    seen set, so an artist reached through several queries or related-artist
+    links is fetched only once. Discovered artists are served before new
+    search pages so the queue stays small.
+    """
+
+    def __init__(self, queries=(), seen_artist_ids=()):
+        self.searches = deque((query, 0) for query in queries)
+        self.artists = deque()
+        self.seen = set(seen_artist_ids)
+
+    def add_search(self, query, offset):
+        self.searches.append((query, offset))
+
+    def add_artists(self, artists, found_via=None):
+        """Queues the artists that have not been seen yet, tagged with where they were found, and returns them."""
+        new = []
+        for artist in artists:
+            if artist["id"] not in self.seen:
+                self.seen.add(artist["id"])
+                # Only keep what the crawl needs, not the full artist object
+                artist = {"id": artist["id"], "name": artist.get("name"), "found_via": found_via or artist.get("found_via")}
+                self.artists.append(artist)
+                new.append(artist)
+        return new
+
+    def next_task(self):
+        """Returns ("artist", artist), ("search", (query, offset)) or None when empty."""
+        if self.artists:
+            return "artist", self.artists.popleft()
+        if self.searches:
+            return "search", self.searches.popleft()
+        return None
+
+    def __len__(self):
+        return len(self.artists) + len(self.searches)
@@ -0,0 +1,244 @@
+"""
+Index structures built once over a loaded dataset so that page interactions
+do not have to rescan or copy the underlying frame.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.cube import popularity_cells
+from utils.parallel import map_reduce_rows
+
+# Kaggle stores several artists as "A;B"; older exports used "['A', 'B']"
+ARTIST_SEPARATOR = r";|, "
+
+
+def expand_ranges(starts, lengths):
+    """Concatenation of arange(s, s + n) for every (s, n) pair, without a Python loop."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    # Offset of each output element from the start of its range
+    within = np.arange(total, dtype=np.int64) - np.repeat(ends - lengths, lengths)
+    return np.repeat(np.asarray(starts, dtype=np.int64), lengths) + within
+
+
+def top_k(values, k, rows=None):
+    """
+    Positions of the `k` largest `values` (restricted to the positions `rows`
+    when given), largest first with ties in position order, as `nlargest`
+    would return them. Uses a partial selection, so the cost is linear in
+    the number of candidates instead of a full sort. NaNs are never selected.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rows = np.arange(len(values)) if rows is None else np.asarray(rows, dtype=np.int64)
+    candidates = values[rows]
+    finite = ~np.isnan(candidates)
+    if not finite.all():
+        rows, candidates = rows[finite], candidates[finite]
+    if k <= 0 or len(rows) == 0:
+        return np.empty(0, dtype=np.int64)
+    if len(rows) > k:
+        # Everything above the k-th largest value, then the earliest rows tied with it
+        threshold = -np.partition(-candidates, k - 1)[k - 1]
+        above = candidates > threshold
+        tied = np.flatnonzero(candidates == threshold)
+        needed = k - int(above.sum())
+        tied_rows = rows[tied]
+        if len(tied_rows) > needed:
+            tied_rows = np.partition(tied_rows, needed - 1)[:needed]
+        rows = np.concatenate([rows[above], tied_rows])
+        candidates = values[rows]
+    return rows[np.lexsort((rows, -candidates))]
+
+
+class ArtistIndex:
+    """
+    Compressed (CSR) mapping from track rows to artists, replacing a frame
+    exploded by artist: the artists of row `i` are
+    `names[codes[offsets[i]:offsets[i + 1]]]`.
+    """
+
+    def __init__(self, names, codes, offsets):
+        self.names = names
+        self.codes = codes
+        self.offsets = offsets
+
+    @classmethod
+    def from_series(cls, artists):
+        """
+        Builds the index from a column of artist strings. Each distinct string
+        is parsed once (vectorized), so the cost grows with the number of
+        distinct artist combinations rather than with the number of rows.
+        """
+        artists = artists.astype('category')
+        row_combo = artists.cat.codes.to_numpy()
+
+        # Split every distinct combination string into its artists
+        parsed = (
+            pd.Series(artists.cat.categories.astype(str))
+            .str.strip("[]").str.replace("'", "", regex=False)
+            .str.split(ARTIST_SEPARATOR, regex=True)
+            .explode().str.strip()
+        )
+        parsed = parsed[parsed.notna() & (parsed != "")]
+        combo_codes, names = pd.factorize(parsed, sort=True)
+        combo_lengths = np.bincount(parsed.index.to_numpy(), minlength=len(artists.cat.categories))
+        combo_offsets = np.concatenate([[0], np.cumsum(combo_lengths)])
+
+        # Rows with a missing artist (code -1) get no entries
+        valid = row_combo >= 0
+        safe_combo = np.where(valid, row_combo, 0)
+        row_lengths = np.where(valid, combo_lengths[safe_combo], 0)
+        offsets = np.concatenate([[0], np.cumsum(row_lengths)]).astype(np.int64)
+        codes = combo_codes[expand_ranges(combo_offsets[safe_combo], row_lengths)].astype(np.int32)
+        return cls(np.asarray(names, dtype=object), codes, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def pairs(self, rows=None):
+        """(artist code, row) for every artist of the given rows (all rows when None)."""
+        if rows is None:
+            rows = np.arange(len(self))
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.offsets[rows + 1] - self.offsets[rows]
+        return self.codes[expand_ranges(self.offsets[rows], lengths)], np.repeat(rows, lengths)
+
+    def _aggregate(self, values, rows):
+        codes, pair_rows = self.pairs(rows)
+        counts = np.bincount(codes, minlength=len(self.names))
+        sums = np.bincount(codes, weights=np.asarray(values, dtype=np.float64)[pair_rows], minlength=len(self.names))
+        return counts, sums
+
+    def aggregate(self, values, rows=None, workers=1):
+        """
+        Per-artist (count, sum) of `values` over the given rows, as two arrays
+        indexed by artist code. With several `workers` the rows are split into
+        ranges whose partial counts and sums are added up (utils/parallel.py).
+        """
+        if workers == 1:
+            return self._aggregate(values, rows)
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        return map_reduce_rows(
+            lambda start, stop: self._aggregate(values, rows[start:stop]),
+            lambda a, b: (a[0] + b[0], a[1] + b[1]),
+            len(rows), workers
+        )
+
+    def mean_by_artist(self, values, rows=None, workers=1):
+        """Mean of `values` per artist over the given rows, as a Series indexed by artist name (artists with no rows omitted)."""
+        counts, sums = self.aggregate(values, rows, workers)
+        present = np.flatnonzero(counts)
+        return pd.Series(sums[present] / counts[present], index=self.names[present])
+
+
+class RowSelection:
+    """
+    Result of a `FilterEngine` query: a list of slices of the engine's sorted
+    row order, each holding the rows of one genre in ascending popularity.
+    The slices are views, so building a selection copies nothing.
+    """
+
+    def __init__(self, slices):
+        self.slices = [part for part in slices if len(part)]
+        self._rows = None
+
+    def __len__(self):
+        return sum(len(part) for part in self.slices)
+
+    @property
+    def rows(self):
+        """All selected row positions as one array (grouped by genre, not in frame order)."""
+        if self._rows is None:
+            if len(self.slices) == 1:
+                self._rows = self.slices[0]
+            elif self.slices:
+                self._rows = np.concatenate(self.slices)
+            else:
+                self._rows = np.empty(0, dtype=np.int64)
+        return self._rows
+
+    def first_rows(self, n):
+        """The `n` selected rows that come first in frame order, in frame order."""
+        rows = self.rows
+        if len(rows) > n:
+            rows = np.partition(rows, n - 1)[:n]
+        return np.sort(rows)
+
+
+class FilterEngine:
+    """
+    Answers "popularity in [lo, hi] and genre in G" in time proportional to
+    the result. Rows are sorted once by (genre, popularity) and the start of
+    every (genre, popularity) cell is recorded, so a query is one contiguous
+    slice per selected genre instead of boolean masks over the whole frame.
+    """
+
+    MAX_POPULARITY = 100
+
+    def __init__(self, genre_codes, genres, popularity):
+        self.genres = list(genres)
+        self.genre_lookup = {genre: code for code, genre in enumerate(self.genres)}
+        n_cells = len(self.genres) * (self.MAX_POPULARITY + 1)
+
+        # Rows without a genre sort after every cell and are never selected
+        cells = popularity_cells(genre_codes, popularity, len(self.genres))
+
+        self.popularity = np.clip(np.asarray(popularity), 0, self.MAX_POPULARITY).astype(np.uint8)
+        order = np.argsort(cells, kind='stable')
+        self.order = order.astype(np.int32) if len(order) < 2 ** 31 else order
+        self.cell_offsets = np.concatenate([[0], np.cumsum(np.bincount(cells, minlength=n_cells)[:n_cells])])
+
+    @classmethod
+    def from_frame(cls, df, genre_col='track_genre', popularity_col='popularity'):
+        genres = df[genre_col].astype('category')
+        return cls(genres.cat.codes.to_numpy(), genres.cat.categories, df[popularity_col].to_numpy())
+
+    def genre_codes_for(self, genres=None):
+        """Codes of the given genre names (unknown names are ignored); all genres when None or empty."""
+        if not genres:
+            return np.arange(len(self.genres))
+        return np.array(sorted(self.genre_lookup[g] for g in genres if g in self.genre_lookup), dtype=np.int64)
+
+    def select_ranges(self, popularity_range=(0, 100), genres=None):
+        """(start, stop) positions in the sorted row order `order` of the selected rows, one range per genre."""
+        lo = max(int(popularity_range[0]), 0)
+        hi = min(int(popularity_range[1]), self.MAX_POPULARITY)
+        if lo > hi:
+            return []
+        width = self.MAX_POPULARITY + 1
+        return [
+            (int(self.cell_offsets[code * width + lo]), int(self.cell_offsets[code * width + hi + 1]))
+            for code in self.genre_codes_for(genres)
+        ]
+
+    def select(self, popularity_range=(0, 100), genres=None):
+        return RowSelection([self.order[start:stop] for start, stop in self.select_ranges(popularity_range, genres)])
+
+    def top_rows(self, n, popularity_range=(0, 100), genres=None):
+        """
+        The `n` most popular selected rows, most popular first (ties in frame
+        order). Scans popularity levels downwards from the top of the range
+        and stops at the first level that fills `n`, so only that level and
+        the ones above it are looked at.
+        """
+        lo = max(int(popularity_range[0]), 0)
+        hi = min(int(popularity_range[1]), self.MAX_POPULARITY)
+        if lo > hi or n <= 0:
+            return np.empty(0, dtype=np.int64)
+        width = self.MAX_POPULARITY + 1
+        codes = self.genre_codes_for(genres)
+        cell_counts = np.diff(self.cell_offsets).reshape(len(self.genres), width)
+        # Rows per popularity level over the selected genres, from `hi` down to `lo`
+        level_counts = cell_counts[codes, lo:hi + 1].sum(axis=0)[::-1]
+        filled = np.searchsorted(np.cumsum(level_counts), n) # Levels needed, minus one
+        threshold = hi - min(int(filled), hi - lo)
+        # Within a genre, the cells from `threshold` to `hi` are one contiguous slice
+        candidates = [
+            self.order[self.cell_offsets[code * width + threshold]:self.cell_offsets[code * width + hi + 1]]
+            for code in codes
+        ]
+        candidates = np.concatenate(candidates) if len(candidates) else np.empty(0, dtype=np.int64)
+        return top_k(self.popularity, n, candidates)
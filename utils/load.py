@@ -0,0 +1,201 @@
+"""
+Shared data-access layer for the dashboard pages.
+
+Every dataset is loaded once per server process with `st.cache_resource` and
+the same frame object is handed to every page and session. Pages must treat
+these frames as read-only: derive new frames (`assign`, filtering, `rename`)
+instead of assigning columns or using `inplace=True`. With pandas
+copy-on-write, derived frames share the underlying column data until one of
+them is written to, so no page pays for its own copy.
+
+Paths come from environment variables or `.streamlit/secrets.toml`, falling
+back to the files in `data/`:
+
+    SPOTIFY_KAGGLE_CSV    Kaggle dataset CSV (default: data/dataset.csv)
+    SPOTIFY_KAGGLE_CACHE  Cleaned Feather cache (default: data/dataset.feather)
+    SPOTIFY_KAGGLE_BACKEND  "pandas" (in memory, default) or "parquet" (streamed, see utils/backend.py)
+    SPOTIFY_KAGGLE_PARQUET  Parquet file or genre-partitioned directory for the parquet backend
+                            (default: data/dataset_parquet, built by `python data/dataset_clean.py --parquet`)
+    SPOTIFY_SCRAPED_PATH  Scraped tracks, CSV, Parquet or Arrow IPC (default: data/spotify_scrap.csv); rows
+                          appended to a CSV are picked up on the next page run
+    SPOTIFY_RESULT_CACHE_MB  Memory budget of the shared filter-result cache (default: 256)
+    SPOTIFY_WORKERS       Threads for parallel aggregation (default: one per CPU core)
+"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+from data.dataset_clean import DATA_DIR, FLOAT_COLUMNS, KAGGLE_CACHE, KAGGLE_CSV, KAGGLE_PARQUET, load_clean_kaggle
+from utils.backend import PandasBackend, ParquetBackend
+from utils.charts import FeatureBins
+from utils.compare import SourceSummary
+from utils.cube import GenreCube, MomentCube
+from utils.index import ArtistIndex, FilterEngine
+from utils.matching import KaggleArtistBlocks
+from utils.memo import DEFAULT_BUDGET_MB, ResultCache
+from utils.neighbors import FeatureNeighbors
+from utils.parallel import default_workers
+from utils.refresh import ScrapedData
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # Default from pandas 3 onwards
+    pd.set_option("mode.copy_on_write", True)
+
+
+def get_config(name, default=None):
+    """Reads a setting from the environment, then from Streamlit secrets, then falls back to `default`."""
+    value = os.getenv(name)
+    if value:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError: # No secrets.toml
+        return default
+
+
+def kaggle_paths():
+    return get_config("SPOTIFY_KAGGLE_CSV", KAGGLE_CSV), get_config("SPOTIFY_KAGGLE_CACHE", KAGGLE_CACHE)
+
+
+def scraped_path():
+    return get_config("SPOTIFY_SCRAPED_PATH", os.path.join(DATA_DIR, "spotify_scrap.csv"))
+
+
+def aggregation_workers():
+    """Threads the loaders and backends split large aggregations over (see utils/parallel.py)."""
+    return max(int(get_config("SPOTIFY_WORKERS", default_workers())), 1)
+
+
+@st.cache_resource
+def result_cache():
+    """
+    The process-wide cache of filter-dependent results (see utils/memo.py),
+    shared by every page and session. Keys start with the page name.
+    """
+    return ResultCache(int(float(get_config("SPOTIFY_RESULT_CACHE_MB", DEFAULT_BUDGET_MB)) * (1 << 20)))
+
+
+def result_cache_sidebar():
+    """Sidebar expander with the shared result cache's usage and a button that empties it."""
+    cache = result_cache()
+    with st.sidebar.expander("Result cache"):
+        if st.button("Clear for all sessions"):
+            cache.clear()
+        stats = cache.stats()
+        st.caption(f"{stats['entries']} results, {stats['bytes'] / (1 << 20):.1f} of "
+                   f"{stats['max_bytes'] / (1 << 20):.0f} MB")
+        st.caption(f"Hit rate {stats['hit_rate']:.0%} ({stats['hits']} hits, {stats['misses']} misses), "
+                   f"{stats['evictions']} evicted")
+
+
+# --- Kaggle dataset ---
+
+@st.cache_resource(show_spinner="Loading Kaggle dataset...")
+def load_kaggle():
+    """The cleaned Kaggle dataset (see data/dataset_clean.py). Raises FileNotFoundError if it is missing."""
+    csv_path, cache_path = kaggle_paths()
+    return load_clean_kaggle(csv_path, cache_path)
+
+
+@st.cache_resource(show_spinner="Indexing artists...")
+def load_kaggle_artist_index():
+    """Track-to-artist index over `load_kaggle()` rows, used instead of a frame exploded by artist."""
+    return ArtistIndex.from_series(load_kaggle()['artists'])
+
+
+@st.cache_resource(show_spinner="Indexing genres and popularity...")
+def load_kaggle_filter_engine():
+    """Popularity/genre filter index over `load_kaggle()` rows."""
+    return FilterEngine.from_frame(load_kaggle())
+
+
+@st.cache_resource(show_spinner="Aggregating genres...")
+def load_kaggle_genre_cube():
+    """(genre, popularity) counts and sums over `load_kaggle()`, with the same genre codes as the filter engine."""
+    return GenreCube.from_frame(load_kaggle(), workers=aggregation_workers())
+
+
+@st.cache_resource(show_spinner="Aggregating audio features...")
+def load_kaggle_moment_cube(features):
+    """Per-(genre, popularity) count, sums and cross-products of `features` over `load_kaggle()`."""
+    return MomentCube.from_frame(load_kaggle(), list(features), workers=aggregation_workers())
+
+
+@st.cache_resource
+def load_kaggle_feature_bins(feature, nbins=30):
+    """Histogram bin edges for one `load_kaggle()` column plus each row's bin number."""
+    return FeatureBins.from_values(load_kaggle()[feature].to_numpy(), nbins)
+
+
+@st.cache_resource(show_spinner="Indexing audio features...")
+def load_kaggle_neighbors(features):
+    """Standardized `features` of `load_kaggle()` rows in the filter engine's order, for similarity search."""
+    return FeatureNeighbors.from_frame(load_kaggle(), list(features), load_kaggle_filter_engine().order)
+
+
+@st.cache_resource(show_spinner="Opening Kaggle dataset...")
+def load_kaggle_backend():
+    """
+    The query backend for the Kaggle dataset chosen by SPOTIFY_KAGGLE_BACKEND:
+    the in-memory frame with its indexes, or a streamed Parquet dataset whose
+    cubes are built when it is opened. Raises FileNotFoundError if the data is missing.
+    """
+    if get_config("SPOTIFY_KAGGLE_BACKEND", "pandas") == "parquet":
+        path = get_config("SPOTIFY_KAGGLE_PARQUET", KAGGLE_PARQUET)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return ParquetBackend.open(path, FLOAT_COLUMNS + ['duration_ms'], workers=aggregation_workers())
+
+    df = load_kaggle()
+    artist_index = load_kaggle_artist_index() if 'artists' in df.columns else None
+    return PandasBackend(df, load_kaggle_filter_engine(), load_kaggle_genre_cube(), artist_index,
+                         load_kaggle_moment_cube, load_kaggle_feature_bins, load_kaggle_neighbors, aggregation_workers())
+
+
+@st.cache_resource(show_spinner="Indexing Kaggle tracks for matching...")
+def load_kaggle_tracks():
+    """
+    Kaggle tracks that scraped tracks are matched against as they arrive,
+    spilled to disk by primary artist in one pass. Only the rows of artists
+    that were scraped are held in memory (see utils/matching.py).
+    """
+    backend = load_kaggle_backend()
+    return KaggleArtistBlocks.from_batches(backend.iter_batches(['track_name', 'artists', 'popularity']),
+                                           backend.row_count)
+
+
+# --- Scraped dataset ---
+
+@st.cache_resource(show_spinner="Loading scraped dataset...")
+def scraped_data():
+    """
+    The scraped tracks and their derived results, shared by every session
+    and refreshed incrementally as the scraper appends to the file (see
+    utils/refresh.py).
+    """
+    return ScrapedData(scraped_path(), load_kaggle_tracks, aggregation_workers())
+
+
+def refresh_scraped():
+    """
+    The current `ScrapedSnapshot` (see utils/refresh.py), with any rows
+    appended since the last call folded in. Checking costs one `os.stat`.
+    A page calls it once per run and reads everything it shows from the
+    returned snapshot (`version`, `timeline`, `rollup`, `words`,
+    `bin_edges`, `summary`, `matches`, ...), so one run never mixes two
+    versions of the data. Raises FileNotFoundError if the file is missing
+    or still being written with nothing complete to read yet.
+    """
+    return scraped_data().refresh()
+
+
+# --- Both datasets ---
+
+@st.cache_resource(show_spinner="Summarizing dataset...")
+def load_kaggle_summary(features=()):
+    """One-pass `SourceSummary` of the Kaggle dataset, with quantile sketches of the `features` it has."""
+    backend = load_kaggle_backend()
+    features = [feature for feature in features if feature in backend.columns]
+    batches = backend.iter_batches(['artists', 'popularity', 'track_genre'] + features)
+    return SourceSummary.from_batches('Kaggle', batches, features, aggregation_workers())
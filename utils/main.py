@@ -1,134 +1,312 @@
 from dotenv import load_dotenv
 import os
 import base64
-from requests import post,get
+import argparse
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import json
-import csv
+import threading
+
+import requests
+
+from utils.scheduler import RequestScheduler, TokenCache, make_session
+from utils.export import open_writer
+from utils.frontier import DEFAULT_SEED_QUERIES, CrawlFrontier
+from utils.store import CrawlStore
 
 load_dotenv()
 
 client_id = os.getenv("CLIENT_ID")
 client_secret = os.getenv("CLIENT_SECRET")
 
-def get_token():
+SONG_LIMIT = 1000 # Stop collecting once this many songs are found
+DEFAULT_CONCURRENCY = 8 # API requests in flight at the same time
+DEFAULT_RATE = 10.0 # Requests per second allowed across all workers
+MAX_SEARCH_OFFSET = 1000 # The search endpoint does not page past this offset
+TRACKS_BATCH_SIZE = 50 # Maximum ids per several-tracks request
+AUDIO_FEATURES_BATCH_SIZE = 100 # Maximum ids per audio-features request
+
+# Overridable so the scraper can be pointed at a local fake API server
+ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com")
+# Where the dashboards read scraped tracks from (see utils/load.py)
+SCRAPED_PATH = os.getenv("SPOTIFY_SCRAPED_PATH", os.path.join("data", "spotify_scrap.csv"))
+
+
+def request_token():
     auth_string = client_id + ":"+ client_secret
     auth_bytes= auth_string.encode("utf-8")
     auth_base64=str(base64.b64encode(auth_bytes),"utf8")
-    
-    url = "https://accounts.spotify.com/api/token"
+
+    url = f"{ACCOUNTS_URL}/api/token"
     headers = {
         "Authorization": "Basic "+ auth_base64,
         "Content-Type": "application/x-www-form-urlencoded"
     }
-    
+
     data = {"grant_type": "client_credentials"}
-    result=post(url,headers=headers,data=data)
+    result=scheduler.post(url,headers=headers,data=data,auth=False)
     json_result=json.loads(result.content)
-    token=json_result["access_token"]
-    return token
+    return json_result["access_token"], json_result.get("expires_in", 3600)
+
+
+def make_scheduler(concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+    return RequestScheduler(make_session(concurrency), TokenCache(request_token), rate=rate)
 
-def get_auth_header(token):
-    return {"Authorization": "Bearer " + token}
 
+scheduler = make_scheduler()
 
-def search_for_artist(token, artist_name, limit=1): # Add limit parameter with default
-    url="https://api.spotify.com/v1/search"
-    headers= get_auth_header(token)
-    query=f"?q={artist_name}&type=artist&limit={limit}" # Use the limit parameter
 
-    query_url= url + query
-    result=get(query_url, headers=headers)
-    result.raise_for_status() # Add this for better error handling
+def search_for_artist(artist_name, limit=1, offset=0): # Add limit parameter with default
+    url=f"{API_URL}/v1/search"
+    params = {"q": artist_name, "type": "artist", "limit": limit, "offset": offset} # Use the limit parameter
+
+    result=scheduler.get(url, params=params) # Raises once retries are exhausted
     json_result = json.loads(result.content)["artists"]["items"]
     if len(json_result) == 0:
         print(f"No artist with name '{artist_name}' exists...")
         return [] # Return an empty list if no artists found
     return json_result # Return the list of artists, not just the first one
-    
-    
 
-def get_songs_by_artist(token,artist_id):
-    url=f"https://api.spotify.com/v1/artists/{artist_id}/top-tracks?country=US"
-    headers=get_auth_header(token)
-    result=get(url,headers=headers)
+
+
+def get_songs_by_artist(artist_id):
+    url=f"{API_URL}/v1/artists/{artist_id}/top-tracks"
+    result=scheduler.get(url, params={"country": "US"})
     json_result= json.loads(result.content)["tracks"]
     return json_result
 
 
-token = get_token()
-all_songs = []
-artist_search_query = "pop" # Example: search for "pop" artists
-artist_limit_per_search = 50 # Max limit for artist search in one query
-current_offset = 0 # For potential future pagination of artist search if needed
+def get_related_artists(artist_id):
+    url=f"{API_URL}/v1/artists/{artist_id}/related-artists"
+    result=scheduler.get(url)
+    return json.loads(result.content)["artists"]
+
+
+related_artists_available = True
+related_artists_lock = threading.Lock() # Workers fail concurrently; report it once
+
+
+def fetch_artist(artist, expand_related=True):
+    """Worker task: an artist's top tracks plus, optionally, their related artists."""
+    global related_artists_available
+
+    songs = get_songs_by_artist(artist["id"])
+    related = []
+    if expand_related and related_artists_available:
+        try:
+            related = get_related_artists(artist["id"])
+        except requests.HTTPError as error:
+            # Not available to apps registered after Nov 2024; rely on search queries alone
+            with related_artists_lock:
+                if related_artists_available:
+                    print(f"Related artists unavailable ({error}); expanding through search only.")
+                    related_artists_available = False
+    return songs, related
 
-print(f"Attempting to collect up to 1000 songs...")
 
-# Loop to continuously search for artists and collect songs until 1000 are found
-while len(all_songs) < 1000:
-    # Search for a batch of artists
-    # Note: You might need a more sophisticated way to get unique artists
-    # across multiple searches (e.g., changing 'artist_search_query' or using offsets).
-    # For simplicity, this example just uses one broad query.
-    artists = search_for_artist(token, artist_search_query, limit=artist_limit_per_search)
+def get_several_tracks(track_ids):
+    # One request for up to TRACKS_BATCH_SIZE ids instead of one per track
+    url=f"{API_URL}/v1/tracks"
+    result=scheduler.get(url, params={"ids": ",".join(track_ids), "market": "US"})
+    return [track for track in json.loads(result.content)["tracks"] if track]
 
-    if not artists:
-        print("No more artists found or initial search failed. Breaking loop.")
-        break # Exit if no artists are found
 
-    for artist in artists:
-        artist_id = artist["id"]
-        artist_name = artist["name"]
-        print(f"Fetching top tracks for: {artist_name} (Current songs: {len(all_songs)})")
+def get_audio_features(track_ids):
+    url=f"{API_URL}/v1/audio-features"
+    result=scheduler.get(url, params={"ids": ",".join(track_ids)})
+    return [features for features in json.loads(result.content)["audio_features"] if features]
 
-        songs_from_artist = get_songs_by_artist(token, artist_id)
 
-        for song in songs_from_artist:
-            if len(all_songs) < 1000:
-                all_songs.append(song)
+class TrackEnricher:
+    """
+    Buffers tracks and enriches them in batches before passing them on: tracks
+    missing their full details (album, popularity) are re-fetched through the
+    several-tracks endpoint, and audio features are attached under
+    "audio_features" using one audio-features request per 100 tracks.
+    Enriched tracks are saved back to `store` so a resumed crawl reuses them.
+    """
+
+    def __init__(self, on_tracks, store=None, audio_features=True, batch_size=AUDIO_FEATURES_BATCH_SIZE):
+        self.on_tracks = on_tracks
+        self.store = store
+        self.audio_features = audio_features
+        self.batch_size = batch_size
+        self._buffer = []
+
+    def add(self, songs):
+        for song in songs:
+            self._buffer.append(song)
+            if len(self._buffer) >= self.batch_size:
+                batch, self._buffer = self._buffer, []
+                self._emit(batch)
+
+    def flush(self):
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._emit(batch)
+
+    def _emit(self, batch):
+        enriched = self.enrich(batch)
+        if self.store is not None and enriched is not batch:
+            self.store.update_tracks(enriched)
+        self.on_tracks(enriched)
+
+    def enrich(self, songs):
+        incomplete = [song["id"] for song in songs if "album" not in song or "popularity" not in song]
+        if incomplete:
+            full = {}
+            for start in range(0, len(incomplete), TRACKS_BATCH_SIZE):
+                for track in get_several_tracks(incomplete[start:start + TRACKS_BATCH_SIZE]):
+                    full[track["id"]] = track
+            songs = [{**song, **full.get(song["id"], {})} for song in songs]
+
+        missing = [song["id"] for song in songs if "audio_features" not in song] if self.audio_features else []
+        if missing:
+            try:
+                features = {}
+                for start in range(0, len(missing), AUDIO_FEATURES_BATCH_SIZE):
+                    for item in get_audio_features(missing[start:start + AUDIO_FEATURES_BATCH_SIZE]):
+                        features[item["id"]] = item
+            except requests.HTTPError as error:
+                # Apps registered after Nov 2024 get 403 here; keep scraping without features
+                print(f"Audio features unavailable ({error}); continuing without them.")
+                self.audio_features = False
             else:
-                break # Stop adding songs if 1000 is reached
+                songs = [{**song, "audio_features": features[song["id"]]} if song["id"] in features else song
+                         for song in songs]
+        return songs
+
+
+def collect_songs(store, queries, song_limit=SONG_LIMIT, concurrency=DEFAULT_CONCURRENCY,
+                  artist_limit_per_search=50, expand_related=True, on_tracks=None):
+    """
+    Drains a crawl frontier seeded with `queries` on a pool of `concurrency`
+    workers until `store` holds `song_limit` songs. Search pages queue their
+    artists, and each fetched artist queues its related artists; artists are
+    fetched only once across all queries. Newly stored tracks are passed to
+    `on_tracks` as they arrive.
+
+    Search offsets and discovered-but-unfetched artists are kept in the
+    store, so a restarted crawl resumes the same frontier.
+    """
+    frontier = CrawlFrontier(seen_artist_ids=store.fetched_artist_ids())
+    for query in queries:
+        current_offset = store.next_offset(query)
+        if current_offset is not None:
+            frontier.add_search(query, current_offset)
+    frontier.add_artists(store.pending_artists())
+
+    started = time.perf_counter()
+    initial_count = store.track_count()
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while store.track_count() < song_limit:
+            # Keep every worker busy while there is queued work
+            while len(in_flight) < concurrency:
+                task = frontier.next_task()
+                if task is None:
+                    break
+                kind, item = task
+                if kind == "search":
+                    query, current_offset = item
+                    future = executor.submit(search_for_artist, query, artist_limit_per_search, current_offset)
+                else:
+                    future = executor.submit(fetch_artist, item, expand_related)
+                in_flight[future] = task
+
+            if not in_flight:
+                print("Crawl frontier is empty: no more queries or artists to fetch.")
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, item = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except requests.RequestException as error:
+                    # Unfetched artists stay pending in the store and are retried on the next run
+                    print(f"Skipping {kind} {item.get('name') if kind == 'artist' else item}: {error}")
+                    continue
+
+                if kind == "search":
+                    query, current_offset = item
+                    next_offset = current_offset + len(result)
+                    exhausted = len(result) < artist_limit_per_search or next_offset >= MAX_SEARCH_OFFSET
+                    if not exhausted:
+                        frontier.add_search(query, next_offset)
+                    store.add_pending_artists(frontier.add_artists(result, found_via=query))
+                    store.advance_offset(query, next_offset, exhausted)
+                    continue
+
+                songs_from_artist, related = result
+                remaining = song_limit - store.track_count()
+                if remaining <= 0:
+                    continue
+                added = store.save_artist_tracks(item, songs_from_artist[:remaining])
+                store.add_pending_artists(frontier.add_artists(related, found_via=f"related:{item['id']}"))
+                if on_tracks is not None:
+                    on_tracks(added)
+
+                current = store.track_count()
+                elapsed = time.perf_counter() - started
+                rate = (current - initial_count) / elapsed if elapsed > 0 else 0.0
+                eta = f"{(song_limit - current) / rate:.0f}s" if rate > 0 else "?"
+                print(f"Fetched top tracks for: {item['name']} (+{len(added)}, current songs: {current}, "
+                      f"{rate:.1f} songs/s, ETA {eta}, frontier: {len(frontier)})")
 
-        if len(all_songs) >= 1000:
-            break # Stop processing artists if 1000 songs are collected
+        for future in in_flight:
+            future.cancel() # Drop the requests we no longer need
 
-    # If after processing a batch of artists, we still don't have 1000 songs,
-    # you might need to adjust the 'artist_search_query' or implement
-    # more advanced pagination for artist search (e.g., by increasing 'current_offset').
-    # For this example, we'll break if we can't easily hit 1000 from one broad search.
-    if len(all_songs) < 1000:
-        print(f"Collected {len(all_songs)} songs so far. Trying next batch or adjusting query.")
-        # To get more, you would typically change artist_search_query (e.g., "rock", "jazz")
-        break 
+    return store.track_count()
 
-# Replace the 'songs' variable with 'all_songs' for CSV writing
-songs_to_write = all_songs
 
-# Define the CSV file name
-csv_file_name = "spotify_songs_1000_entries.csv"
+def main():
+    global scheduler
 
-# Open the CSV file in write mode
-with open(csv_file_name, 'w', newline='', encoding='utf-8') as file:
-    writer = csv.writer(file)
+    parser = argparse.ArgumentParser(description="Scrape top tracks for Spotify artists into a Parquet, Arrow or CSV file.")
+    parser.add_argument("--query", action="append", dest="queries",
+                        help="Artist search query to seed the crawl with; repeatable (default: a broad genre list)")
+    parser.add_argument("--limit", type=int, default=SONG_LIMIT, help="Maximum number of songs to collect")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="API requests to run in parallel")
+    parser.add_argument("--no-related", action="store_true",
+                        help="Do not expand the crawl through related artists")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="Maximum Spotify API requests per second")
+    parser.add_argument("--output", default=SCRAPED_PATH,
+                        help="File to write; the format follows the extension (.parquet, .arrow/.feather or .csv). "
+                             "Defaults to $SPOTIFY_SCRAPED_PATH or data/spotify_scrap.csv, where the dashboards look")
+    parser.add_argument("--format", choices=["parquet", "arrow", "csv"], help="Override the output format")
+    parser.add_argument("--row-group-size", type=int, default=10_000,
+                        help="Tracks buffered per Parquet row group / Arrow record batch")
+    parser.add_argument("--store", default="crawl.sqlite",
+                        help="SQLite file holding crawl progress; re-running resumes from it")
+    parser.add_argument("--no-audio-features", action="store_true",
+                        help="Skip enriching tracks with batched audio-feature requests")
+    args = parser.parse_args()
 
-    # Write the header row
-    writer.writerow(["Song Number", "Song Name", "Artist Name", "Album Name", "Release Date", "Popularity"])
+    scheduler = make_scheduler(args.concurrency, args.rate)
 
-    # Write each song's data to the CSV
-    for idx, song in enumerate(songs_to_write): # Use songs_to_write (all_songs) here
-        song_name = song.get("name", "N/A")
-        # Safely access artist name
-        artist_name = song["artists"][0]["name"] if song.get("artists") and song["artists"] else "N/A"
-        # Safely access album name and release date
-        album_name = song["album"]["name"] if song.get("album") else "N/A"
-        release_date = song["album"]["release_date"] if song.get("album") else "N/A"
-        popularity = song.get("popularity", "N/A")
+    with CrawlStore(args.store) as store, \
+            open_writer(args.output, args.format, args.row_group_size) as writer:
+        enricher = TrackEnricher(writer.write_many, store, audio_features=not args.no_audio_features)
 
-        writer.writerow([idx + 1, song_name, artist_name, album_name, release_date, popularity])
+        # Tracks from an earlier, interrupted run are streamed out first
+        enricher.add(store.iter_tracks(limit=args.limit))
+        print(f"Attempting to collect up to {args.limit} songs ({store.track_count()} already stored)...")
 
-print(f"\nSuccessfully saved {len(songs_to_write)} songs to {csv_file_name}")
-if len(songs_to_write) < 1000:
-    print(f"Note: Could only find {len(songs_to_write)} unique songs with the current search strategy.")
-    
+        collect_songs(store, args.queries or DEFAULT_SEED_QUERIES, song_limit=args.limit,
+                      concurrency=args.concurrency, expand_related=not args.no_related, on_tracks=enricher.add)
+        enricher.flush()
+        song_count = writer.count
 
+    print(f"\nSuccessfully saved {song_count} songs to {args.output}")
+    print(f"Spotify API: {scheduler.stats.summary()}")
+    if song_count < args.limit:
+        print(f"Note: Could only find {song_count} unique songs; try adding more --query seeds.")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Links scraped tracks to Kaggle rows so the two sources can be compared
+track by track. Both passes are blocked on the normalized primary artist:
+an exact hash join on (title, artist) first, then a fuzzy title match
+within each artist for the scraped tracks still unmatched. No pair of
+tracks by different artists is ever compared.
+"""
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.index import ARTIST_SEPARATOR, expand_ranges
+
+KEY_SEPARATOR = "\x1f"
+# Spelled out rather than \W, which is ASCII-only in the regex engine pandas
+# uses for Arrow-backed strings and would drop letters such as "é" or "東"
+PUNCTUATION = r"[\s!-/:-@\[-`{-~]+"
+TYPOGRAPHIC_PUNCTUATION = "[‘’“”–—¿¡]"
+MIN_TITLE_SIMILARITY = 0.75 # Trigram Jaccard similarity for a fuzzy match
+MAX_PAIRS_PER_PASS = 1 << 23 # Bounds the memory of the fuzzy pass's (scraped, Kaggle) trigram pairs
+ROWS_PER_BUCKET = 1 << 16 # Kaggle rows per on-disk artist bucket, up to MAX_BUCKETS files
+MAX_BUCKETS = 256
+
+
+def normalize_names(names):
+    """
+    Comparable form of track or artist names: lower-cased, accents
+    stripped, bracketed and " - " suffixes ("(feat. X)", "- Remastered
+    2011") dropped, punctuation collapsed to single spaces.
+    """
+    names = pd.Series(names, dtype=object).fillna("").astype(str)
+    # Only non-ASCII names can carry accents or typographic punctuation, and
+    # decomposing is the slow step
+    accented = ~names.str.isascii()
+    if accented.any():
+        decomposed = (
+            names[accented].str.normalize("NFKD")
+            .str.replace("[\u0300-\u036f]", "", regex=True)
+            .str.replace(TYPOGRAPHIC_PUNCTUATION, " ", regex=True)
+        )
+        names = names.mask(accented, decomposed)
+    base = names.str.lower()
+    stripped = base.str.replace(r"\s+-\s+.*$|[\(\[].*?[\)\]]", " ", regex=True)
+    # A name that is nothing but a suffix, such as "(Intro)", keeps it
+    stripped = stripped.where(stripped.str.strip() != "", base)
+    return stripped.str.replace(PUNCTUATION, " ", regex=True).str.strip().to_numpy(dtype=object)
+
+
+def primary_artists(artists):
+    """First artist of each artist string ("A;B", "A, B" or "['A', 'B']"), normalized."""
+    first = (
+        pd.Series(artists, dtype=object).fillna("").astype(str)
+        .str.strip("[]").str.replace("'", "", regex=False)
+        .str.split(ARTIST_SEPARATOR, n=1, regex=True).str[0]
+    )
+    return normalize_names(first)
+
+
+def _hash(strings):
+    return pd.util.hash_array(np.asarray(strings, dtype=object))
+
+
+def _primary_artists_by_row(artists, parsed=None):
+    """
+    Normalized primary artist and its hash per row, parsing each distinct
+    artist string once ("" for missing). Batches sliced from one categorical
+    column share its categories, which are then parsed only for the first
+    when the same `parsed` dict is passed along.
+    """
+    if isinstance(artists.dtype, pd.CategoricalDtype):
+        codes, uniques = artists.cat.codes.to_numpy(), artists.cat.categories
+    else:
+        codes, uniques = pd.factorize(artists)
+    if parsed is not None and parsed.get('uniques') is uniques:
+        names, hashes = parsed['names'], parsed['hashes']
+    else:
+        names = np.append(primary_artists(np.asarray(uniques, dtype=object)), "") # Code -1 picks the ""
+        hashes = _hash(names)
+        if parsed is not None:
+            parsed.update(uniques=uniques, names=names, hashes=hashes)
+    return names[codes], hashes[codes]
+
+
+def _trigrams(titles):
+    """
+    Trigrams of each title, padded as "  title ", as (owner, trigram) pairs
+    in owner order, the owner being the title's position in `titles`. A
+    trigram packs its three code points into one integer.
+    """
+    padded = "  " + pd.Series(titles, dtype=object) + " "
+    lengths = padded.str.len().to_numpy(dtype=np.int64)
+    chars = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    starts = expand_ranges(np.cumsum(lengths) - lengths, lengths - 2)
+    trigrams = chars[starts] << np.uint64(42) | chars[starts + 1] << np.uint64(21) | chars[starts + 2]
+    return np.repeat(np.arange(len(lengths), dtype=np.int64), lengths - 2), trigrams
+
+
+def _trigram_sets(owners, ids, id_count):
+    """The (owner, trigram id) pairs from `_trigrams`, each distinct pair once, sorted."""
+    keys = np.sort(owners * id_count + ids) # Already in owner order, so mostly sorted
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+    return np.divmod(keys, id_count)
+
+
+def _artist_rows(kaggle_batches):
+    """
+    Frames of the Kaggle rows that have a primary artist, one per batch of
+    `kaggle_batches` (frames with 'track_name', 'artists' and 'popularity'
+    in row order): 'row', 'track_name', the normalized primary 'artist', its
+    'artist_hash' and 'popularity'.
+    """
+    offset, parsed = 0, {}
+    for batch in kaggle_batches:
+        artist, artist_hash = _primary_artists_by_row(batch['artists'], parsed)
+        local = np.flatnonzero(artist != "")
+        yield pd.DataFrame({
+            'row': offset + local,
+            'track_name': batch['track_name'].to_numpy()[local],
+            'artist': artist[local],
+            'artist_hash': artist_hash[local],
+            'popularity': batch['popularity'].to_numpy(dtype=np.float64)[local],
+        })
+        offset += len(batch)
+
+
+class KaggleTracks:
+    """
+    Normalized titles and primary artists of Kaggle rows, sorted by artist
+    hash so each artist's rows form one contiguous block (rows ascending
+    within it), with the first Kaggle row of every (title, artist) key.
+    Built in one pass over a stream of batches; scraped tracks can then be
+    matched against it any number of times without reading Kaggle again.
+    Rows without an artist are left out, as they can never match.
+    """
+
+    def __init__(self, rows, titles, artist_hashes, names, popularity, row_keys):
+        order = np.lexsort((rows, artist_hashes))
+        self.rows = rows[order]
+        self.titles = titles[order]
+        self.artist_hashes = artist_hashes[order]
+        self.names = names[order]
+        self.popularity = popularity[order]
+        self.row_keys = row_keys[order]
+        # A title with n characters has at most n + 1 trigrams
+        self.title_lengths = pd.Series(self.titles, dtype=object).str.len().to_numpy() + 1
+        by_key = np.lexsort((self.rows, self.row_keys))
+        self.keys, first = np.unique(self.row_keys[by_key], return_index=True)
+        self.position_of_key = by_key[first] # First Kaggle row wins
+
+    @classmethod
+    def from_batches(cls, kaggle_batches):
+        """
+        Index of `kaggle_batches`, frames with 'track_name', 'artists' and
+        'popularity' in row order (e.g. `iter_batches` of a backend in
+        utils/backend.py).
+        """
+        return cls.from_artist_rows(_artist_rows(kaggle_batches))
+
+    @classmethod
+    def from_artist_rows(cls, frames, artist_hashes=None):
+        """
+        Index of the `_artist_rows` frames; with `artist_hashes`, only rows
+        by those primary artists are normalized and kept.
+        """
+        parts = {'rows': [], 'titles': [], 'hashes': [], 'names': [], 'popularity': [], 'keys': []}
+        for frame in frames:
+            if artist_hashes is not None:
+                frame = frame[np.isin(frame['artist_hash'].to_numpy(), artist_hashes)]
+            if len(frame) == 0:
+                continue
+            names = frame['track_name'].to_numpy()
+            titles = normalize_names(names)
+            keys = _hash(titles + KEY_SEPARATOR + frame['artist'].to_numpy(dtype=object))
+            for name, values in [('rows', frame['row'].to_numpy()), ('titles', titles),
+                                 ('hashes', frame['artist_hash'].to_numpy()), ('names', names),
+                                 ('popularity', frame['popularity'].to_numpy()), ('keys', keys)]:
+                parts[name].append(values)
+
+        empty = {'rows': np.int64, 'titles': object, 'hashes': np.uint64, 'names': object, 'popularity': np.float64,
+                 'keys': np.uint64}
+        parts = {name: np.concatenate(values) if values else np.empty(0, dtype=empty[name])
+                 for name, values in parts.items()}
+        return cls(parts['rows'], parts['titles'], parts['hashes'], parts['names'], parts['popularity'], parts['keys'])
+
+    def merge(self, other):
+        """A new index of the rows of both, which must not share any."""
+        return KaggleTracks(*(np.concatenate([getattr(self, name), getattr(other, name)])
+                              for name in ['rows', 'titles', 'artist_hashes', 'names', 'popularity', 'row_keys']))
+
+    def _most_similar(self, titles, artist_hashes, min_similarity):
+        """
+        The most similar title in the block of each title's artist, by
+        trigram Jaccard similarity (ties go to the first Kaggle row), where
+        it reaches `min_similarity`; titles whose lengths differ by more
+        than the similarity allows are never matched. Rather than scoring
+        candidates one by one, the trigrams of the titles are joined with
+        those of their blocks on (artist, trigram): the number of times a
+        pair of titles comes out of the join is the size of their
+        intersection. Returns (positions in `titles`, positions in this
+        index, similarities).
+        """
+        block_starts = np.searchsorted(self.artist_hashes, artist_hashes, side='left')
+        block_sizes = np.searchsorted(self.artist_hashes, artist_hashes, side='right') - block_starts
+        present = np.flatnonzero(block_sizes > 0)
+        if len(present) == 0:
+            return present, present, np.empty(0)
+        titles = titles[present]
+        # Each block's titles are taken once, however many titles are by its artist
+        blocks, first, title_block = np.unique(block_starts[present], return_index=True, return_inverse=True)
+        sizes = block_sizes[present][first]
+        candidates = expand_ranges(blocks, sizes)
+        candidate_block = np.repeat(np.arange(len(blocks)), sizes)
+
+        title_owners, title_trigrams = _trigrams(titles)
+        candidate_owners, candidate_trigrams = _trigrams(self.titles[candidates])
+        # Dense ids for the trigrams seen, by hashing rather than sorting
+        ids, trigrams = pd.factorize(np.concatenate([title_trigrams, candidate_trigrams]))
+        title_owners, title_ids = _trigram_sets(title_owners, ids[:len(title_trigrams)], len(trigrams))
+        candidate_owners, candidate_ids = _trigram_sets(candidate_owners, ids[len(title_trigrams):], len(trigrams))
+        title_set_sizes = np.bincount(title_owners, minlength=len(titles))
+        candidate_set_sizes = np.bincount(candidate_owners, minlength=len(candidates))
+
+        # Candidate trigrams sorted by (block, trigram), so those a title trigram joins with form one run
+        candidate_keys = candidate_block[candidate_owners] * len(trigrams) + candidate_ids
+        order = np.argsort(candidate_keys, kind='stable')
+        candidate_keys, candidate_owners = candidate_keys[order], candidate_owners[order]
+        title_keys = title_block[title_owners] * len(trigrams) + title_ids
+        run_starts = np.searchsorted(candidate_keys, title_keys, side='left')
+        run_lengths = np.searchsorted(candidate_keys, title_keys, side='right') - run_starts
+
+        # A title with n characters has at most n + 1 trigrams
+        title_lengths = pd.Series(titles, dtype=object).str.len().to_numpy() + 1
+        candidate_lengths = self.title_lengths[candidates]
+        found, positions, scores = [], [], []
+        # Titles are joined in passes of about MAX_PAIRS_PER_PASS pairs
+        pairs_so_far = np.cumsum(np.bincount(title_owners, weights=run_lengths, minlength=len(titles)))
+        ends = np.searchsorted(pairs_so_far, np.arange(1, pairs_so_far[-1] // MAX_PAIRS_PER_PASS + 1)
+                               * MAX_PAIRS_PER_PASS, side='right')
+        for start, stop in zip(np.r_[0, ends], np.r_[ends, len(titles)]):
+            lo, hi = np.searchsorted(title_owners, [start, stop])
+            if lo == hi:
+                continue
+            pair_titles = np.repeat(title_owners[lo:hi], run_lengths[lo:hi])
+            pair_candidates = candidate_owners[expand_ranges(run_starts[lo:hi], run_lengths[lo:hi])]
+            pairs, shared = np.unique(pair_titles * len(candidates) + pair_candidates, return_counts=True)
+            pair_titles, pair_candidates = np.divmod(pairs, len(candidates))
+            scores_of_pairs = shared / (title_set_sizes[pair_titles] + candidate_set_sizes[pair_candidates] - shared)
+            lengths, other_lengths = title_lengths[pair_titles], candidate_lengths[pair_candidates]
+            keep = np.flatnonzero((scores_of_pairs >= min_similarity) & (other_lengths >= min_similarity * lengths)
+                                  & (lengths >= min_similarity * other_lengths))
+            # Highest similarity first within each title, then the first Kaggle row
+            keep = keep[np.lexsort((pair_candidates[keep], -scores_of_pairs[keep], pair_titles[keep]))]
+            best = keep[np.r_[True, pair_titles[keep][1:] != pair_titles[keep][:-1]]] if len(keep) else keep
+            found.append(pair_titles[best])
+            positions.append(candidates[pair_candidates[best]])
+            scores.append(scores_of_pairs[best])
+
+        return present[np.concatenate(found)], np.concatenate(positions), np.concatenate(scores)
+
+    def match(self, scraped, min_similarity=MIN_TITLE_SIMILARITY):
+        """
+        Matches every scraped track (Kaggle column names) to at most one
+        Kaggle row: an exact (title, artist) match first, then the most
+        similar title by the same artist. Returns one row per matched scraped
+        track with both popularities, their difference (scraped minus
+        Kaggle), the match kind ('exact' or 'fuzzy') and the title similarity.
+        """
+        scraped_artist = primary_artists(scraped['artists'])
+        scraped_title = normalize_names(scraped['track_name'])
+        scraped_keys = _hash(scraped_title + KEY_SEPARATOR + scraped_artist)
+
+        # --- Exact (title, artist) keys ---
+        matched = np.full(len(scraped_keys), -1, dtype=np.int64) # Position in this index
+        if len(self.keys):
+            positions = np.minimum(np.searchsorted(self.keys, scraped_keys), len(self.keys) - 1)
+            hit = self.keys[positions] == scraped_keys
+            matched[hit] = self.position_of_key[positions[hit]]
+        kind = np.where(matched >= 0, "exact", "").astype(object)
+        similarity = np.where(matched >= 0, 1.0, np.nan)
+
+        # --- Fuzzy titles within each artist block ---
+        unmatched = np.flatnonzero((matched < 0) & (scraped_artist != ""))
+        if len(unmatched) and len(self.rows):
+            found, positions, scores = self._most_similar(scraped_title[unmatched], _hash(scraped_artist[unmatched]),
+                                                          min_similarity)
+            matched[unmatched[found]] = positions
+            kind[unmatched[found]] = "fuzzy"
+            similarity[unmatched[found]] = scores
+
+        # --- Popularity deltas ---
+        found = np.flatnonzero(matched >= 0)
+        positions = matched[found]
+        scraped_popularity = pd.to_numeric(scraped['popularity'], errors='coerce').to_numpy(dtype=np.float64)[found]
+        kaggle_popularity = self.popularity[positions]
+        return pd.DataFrame({
+            'track_name': scraped['track_name'].to_numpy()[found],
+            'artists': scraped['artists'].to_numpy()[found],
+            'kaggle_track_name': self.names[positions],
+            'scraped_popularity': scraped_popularity,
+            'kaggle_popularity': kaggle_popularity,
+            'popularity_delta': scraped_popularity - kaggle_popularity,
+            'match': kind[found],
+            'similarity': similarity[found],
+            'scraped_row': found,
+            'kaggle_row': self.rows[positions],
+        })
+
+
+class KaggleArtistBlocks:
+    """
+    Kaggle tracks to match scraped tracks against, without keeping every
+    Kaggle row in memory. One streamed pass spills the `_artist_rows` to
+    Arrow IPC files in a temporary directory, bucketed by primary artist
+    hash. `match` then holds a `KaggleTracks` of only the artists it has
+    been asked about, and reads the buckets of newly scraped artists as
+    they arrive to extend it.
+    """
+
+    def __init__(self, directory, bucket_count):
+        self._directory = directory # A TemporaryDirectory, removed with this object
+        self.bucket_count = bucket_count
+        self.tracks = KaggleTracks.from_batches(iter(()))
+        self.artist_hashes = np.empty(0, dtype=np.uint64) # Artists in `tracks`, or without Kaggle rows
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_batches(cls, kaggle_batches, row_count):
+        """Spills `kaggle_batches` (as for `KaggleTracks.from_batches`) of `row_count` rows in all."""
+        import pyarrow as pa
+
+        bucket_count = int(np.clip(row_count // ROWS_PER_BUCKET, 1, MAX_BUCKETS))
+        blocks = cls(tempfile.TemporaryDirectory(prefix="kaggle-artists-"), bucket_count)
+        schema = pa.schema([('row', pa.int64()), ('track_name', pa.string()), ('artist', pa.string()),
+                            ('artist_hash', pa.uint64()), ('popularity', pa.float64())])
+        writers = {}
+        try:
+            for frame in _artist_rows(kaggle_batches):
+                buckets = frame['artist_hash'].to_numpy() % np.uint64(bucket_count)
+                for bucket in np.unique(buckets):
+                    if bucket not in writers:
+                        writers[bucket] = pa.ipc.new_file(blocks._path(bucket), schema)
+                    part = frame[buckets == bucket]
+                    writers[bucket].write_batch(pa.RecordBatch.from_pandas(part, schema, preserve_index=False))
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return blocks
+
+    def _path(self, bucket):
+        return os.path.join(self._directory.name, f"artists-{bucket}.arrow")
+
+    def _read(self, artist_hashes):
+        import pyarrow as pa
+
+        def frames():
+            for bucket in np.unique(artist_hashes % np.uint64(self.bucket_count)):
+                if os.path.exists(self._path(bucket)):
+                    with pa.memory_map(self._path(bucket)) as source:
+                        yield pa.ipc.open_file(source).read_all().to_pandas()
+
+        return KaggleTracks.from_artist_rows(frames(), artist_hashes)
+
+    def match(self, scraped, min_similarity=MIN_TITLE_SIMILARITY):
+        """`KaggleTracks.match`, after adding the primary artists of `scraped` not indexed yet."""
+        artists = primary_artists(scraped['artists'])
+        artist_hashes = np.unique(_hash(artists[artists != ""]))
+        with self._lock:
+            missing = np.setdiff1d(artist_hashes, self.artist_hashes, assume_unique=True)
+            if len(missing):
+                self.tracks = self.tracks.merge(self._read(missing))
+                self.artist_hashes = np.union1d(self.artist_hashes, missing)
+            tracks = self.tracks
+        return tracks.match(scraped, min_similarity)
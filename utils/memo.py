@@ -0,0 +1,134 @@
+"""
+Memoization of filter-dependent results shared by every session of the
+server process. Results are keyed by a canonical signature of the filters
+that produced them, kept in least-recently-used order and evicted once
+their estimated size exceeds a memory budget.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BUDGET_MB = 256
+
+
+def _canonical(value):
+    if value is None:
+        return ()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, tuple): # Ordered, e.g. a (low, high) range
+        return tuple(_canonical(item) for item in value)
+    if isinstance(value, (list, set, frozenset, np.ndarray, pd.Index)): # A selection
+        return tuple(sorted(_canonical(item) for item in value))
+    return value
+
+
+def filter_signature(**filters):
+    """
+    Hashable key for a set of filter values that does not depend on how
+    they were entered: tuples keep their order (ranges), while lists, sets
+    and arrays are selections and are sorted. None and empty selections
+    are the same.
+    """
+    return tuple(sorted((name, _canonical(value)) for name, value in filters.items()))
+
+
+def estimate_size(value):
+    """Approximate memory held by a cached result, in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a memory budget. `get_or_compute` runs the
+    computation for a missing key once even when several sessions ask for it
+    at the same time: the others wait for that result instead of repeating
+    the work. Results larger than the whole budget are returned but not kept.
+    Cached values are shared, so callers must not modify them.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET_MB << 20):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (value, size)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                # Another session may have computed it while this one waited
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry[0]
+                self.misses += 1
+            try:
+                value = compute()
+                self._store(key, value)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+            return value
+
+    def _store(self, key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,94 @@
+"""
+"Tracks like this": nearest neighbours by standardized audio features.
+The vectors are kept as one float32 matrix in the filter engine's sorted
+(genre, popularity) row order, so the rows of any filter are a few
+contiguous blocks of it and a query is a blocked brute-force scan over just
+those blocks, with no gathering of rows.
+"""
+import numpy as np
+
+from utils.index import top_k
+from utils.parallel import imap
+
+BLOCK_ROWS = 1 << 16
+
+
+def standardize(values, means, scales):
+    """(values - mean) / std per column as float32; missing values sit at the mean (0)."""
+    z = (np.asarray(values, dtype=np.float64) - means) / scales
+    return np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32)
+
+
+def feature_scales(values):
+    """Column means and standard deviations over the finite values; constant or empty columns get a scale of 1."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    counts = finite.sum(axis=0)
+    means = np.divide(np.where(finite, values, 0).sum(axis=0), counts, out=np.zeros(values.shape[1]), where=counts > 0)
+    squares = np.where(finite, values - means, 0) ** 2
+    stds = np.sqrt(np.divide(squares.sum(axis=0), counts, out=np.zeros(values.shape[1]), where=counts > 0))
+    return means, np.where(stds > 0, stds, 1.0)
+
+
+def nearest_in_block(vectors, norms, query, k, offset=0, exclude=None):
+    """
+    (positions, squared distances) of the `k` rows of `vectors` closest to
+    `query`, nearest first with ties by position. Positions are shifted by
+    `offset`; the position `exclude` (the query itself) is skipped.
+    """
+    # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, one matrix-vector product per block
+    distances = norms - 2 * (vectors @ query) + float(query @ query)
+    if exclude is not None and offset <= exclude < offset + len(vectors):
+        distances[exclude - offset] = np.nan # top_k never selects NaN
+    best = top_k(-distances, k)
+    return best + offset, np.maximum(distances[best], 0)
+
+
+class FeatureNeighbors:
+    """
+    Standardized feature vectors of every track, stored in `order` (the
+    `FilterEngine` row order) with their squared norms.
+    """
+
+    def __init__(self, features, means, scales, order, vectors):
+        self.features = list(features)
+        self.means = means
+        self.scales = scales
+        self.order = order
+        self.vectors = vectors
+        self.norms = np.einsum('ij,ij->i', vectors, vectors)
+        self.position_of_row = np.empty(len(order), dtype=np.int64)
+        self.position_of_row[order] = np.arange(len(order))
+
+    @classmethod
+    def from_frame(cls, df, features, order):
+        values = df[features].to_numpy(dtype=np.float64)
+        means, scales = feature_scales(values)
+        return cls(features, means, scales, order, np.ascontiguousarray(standardize(values[order], means, scales)))
+
+    def nearest(self, row, k, ranges, block_rows=BLOCK_ROWS, workers=1):
+        """
+        The `k` tracks most similar to frame row `row` within `ranges` (see
+        `FilterEngine.select_ranges`), the track itself excluded: (frame rows,
+        Euclidean distances), nearest first.
+        """
+        position = self.position_of_row[row]
+        query = self.vectors[position]
+        blocks = [
+            (start, min(start + block_rows, stop))
+            for range_start, stop in ranges for start in range(range_start, stop, block_rows)
+        ]
+
+        def block_nearest(block):
+            start, stop = block
+            return nearest_in_block(self.vectors[start:stop], self.norms[start:stop], query, k, start, position)
+
+        found = list(imap(block_nearest, blocks, workers))
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions = np.concatenate([positions for positions, _ in found])
+        distances = np.concatenate([distances for _, distances in found])
+        best = top_k(-distances, k)
+        # Ties between blocks are broken by frame row
+        best = best[np.lexsort((self.order[positions[best]], distances[best]))]
+        return self.order[positions[best]].astype(np.int64), np.sqrt(distances[best])
@@ -0,0 +1,72 @@
+"""
+Parallel aggregation over row ranges or batches. The data is split into
+parts, each part is reduced to a small partial aggregate (counts, sums,
+sketches) on a shared thread pool, and the partials are merged in part
+order, so repeated runs give the same result. The numpy and
+pandas kernels the aggregates are built from (bincount, take, factorize,
+hashing) release the GIL, so threads run them on several cores while
+reading the same in-memory arrays, with nothing copied or pickled.
+"""
+import functools
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# A part has a fixed cost of about 0.4 ms (slicing, per-part arrays, the
+# merge) against about 5 ms of cube work at this size, so parts stay cheap;
+# smaller inputs take a few ms in one part. See utils/parallel_benchmark.py.
+MIN_ROWS_PER_PART = 1 << 18
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _executor(workers):
+    """One long-lived pool per worker count, shared by every caller in the process."""
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(workers, thread_name_prefix="aggregate")
+        return _executors[workers]
+
+
+def row_ranges(n_rows, workers, min_rows=MIN_ROWS_PER_PART):
+    """(start, stop) ranges covering `n_rows`: a few per worker, none much shorter than `min_rows`."""
+    parts = max(1, min(4 * workers, n_rows // max(min_rows, 1)))
+    bounds = [n_rows * i // parts for i in range(parts + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def imap(fn, items, workers=None):
+    """
+    `fn` over `items` on the pool, results in input order. At most two parts
+    per worker are in flight, so a streamed iterable (e.g. Parquet batches)
+    is never read far ahead of the merge. `fn` must not use the pool itself.
+    """
+    workers = workers or default_workers()
+    if workers == 1:
+        yield from map(fn, items)
+        return
+    executor, pending = _executor(workers), deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def map_reduce(fn, merge, items, workers=None, initial=None):
+    """`fn` over `items` in parallel, the partial results folded with `merge` in input order (onto `initial` if given)."""
+    partials = imap(fn, items, workers)
+    return functools.reduce(merge, partials) if initial is None else functools.reduce(merge, partials, initial)
+
+
+def map_reduce_rows(fn, merge, n_rows, workers=None, min_rows=MIN_ROWS_PER_PART):
+    """`map_reduce` over row ranges: `fn(start, stop)` returns the partial aggregate of those rows."""
+    workers = workers or default_workers()
+    return map_reduce(lambda bounds: fn(*bounds), merge, row_ranges(n_rows, workers, min_rows), workers)
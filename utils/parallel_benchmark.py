@@ -0,0 +1,105 @@
+"""
+Benchmark of the parallel aggregations (see utils/parallel.py) on a
+synthetic frame shaped like the Kaggle dataset:
+
+    python -m utils.parallel_benchmark --rows 10000000 --workers 1 2 4 8
+
+Times the genre cube, the moment cube and the per-artist means at each
+worker count, with the speedup over one worker. Then it aggregates the same
+rows on one thread in parts of several sizes: the time each extra part
+adds is the fixed cost that MIN_ROWS_PER_PART keeps small next to the work
+a part does.
+"""
+import argparse
+import functools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.cube import GenreCube, MomentCube
+from utils.index import ArtistIndex
+from utils.parallel import MIN_ROWS_PER_PART, row_ranges
+
+FEATURES = ['danceability', 'energy', 'valence', 'tempo']
+
+
+def synthetic_frame(n_rows, n_genres=114, n_artists=30_000, seed=0):
+    rng = np.random.default_rng(seed)
+    genres = pd.Categorical.from_codes(rng.integers(0, n_genres, n_rows), [f"genre {i}" for i in range(n_genres)])
+    artists = np.array([f"Artist {i}" for i in range(n_artists)], dtype=object)
+    # A fifth of the tracks have a second artist
+    combos = np.where(rng.random(n_artists) < 0.2, artists + ";" + rng.permutation(artists), artists)
+    df = pd.DataFrame({
+        'track_genre': genres,
+        'popularity': rng.integers(0, 101, n_rows),
+        'duration_ms': rng.normal(220_000, 40_000, n_rows),
+        'artists': pd.Categorical.from_codes(rng.integers(0, n_artists, n_rows), combos),
+    })
+    for feature in FEATURES:
+        df[feature] = rng.random(n_rows)
+    return df
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def worker_scaling(df, artist_index, workers_list, repeat):
+    popularity = df['popularity'].to_numpy()
+    tasks = {
+        'genre cube': lambda workers: GenreCube.from_frame(df, workers=workers),
+        'moment cube': lambda workers: MomentCube.from_frame(df, FEATURES, workers=workers),
+        'artist means': lambda workers: artist_index.mean_by_artist(popularity, workers=workers),
+    }
+    print(f"{len(df):,} rows, {os.cpu_count()} CPU(s); best of {repeat}, seconds (speedup over 1 worker)")
+    print(f"{'':14}" + "".join(f"{workers:>16}" for workers in workers_list))
+    for name, task in tasks.items():
+        times = [best_of(repeat, functools.partial(task, workers)) for workers in workers_list]
+        print(f"{name:14}" + "".join(f"{seconds:>8.3f} ({times[0] / seconds:4.1f}x)" for seconds in times))
+
+
+def part_overhead(df, part_sizes, repeat):
+    """Genre cube of every row, on one thread, built from parts of each size and merged."""
+    def build(part_rows):
+        ranges = row_ranges(len(df), workers=len(df), min_rows=part_rows)
+        return functools.reduce(GenreCube.merge, (
+            GenreCube.from_frame(df.iloc[start:stop], genres=genres) for start, stop in ranges
+        ))
+
+    genres = df['track_genre'].cat.categories
+    whole = best_of(repeat, lambda: GenreCube.from_frame(df, genres=genres))
+    print(f"\nGenre cube of {len(df):,} rows on one thread: {whole * 1e3:.1f} ms as one part "
+          f"({whole / len(df) * 1e9:.1f} ns per row)")
+    print(f"{'rows per part':>14}{'parts':>8}{'ms':>10}{'ms per extra part':>20}{'break-even rows':>17}")
+    for part_rows in part_sizes:
+        parts = len(row_ranges(len(df), workers=len(df), min_rows=part_rows))
+        seconds = best_of(repeat, functools.partial(build, part_rows))
+        per_part = (seconds - whole) / max(parts - 1, 1)
+        # Rows whose work equals the fixed cost of one part
+        print(f"{part_rows:>14,}{parts:>8}{seconds * 1e3:>10.1f}{per_part * 1e3:>20.3f}"
+              f"{per_part / whole * len(df):>17,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parallel aggregations in utils/parallel.py.")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Rows in the synthetic frame")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to time")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per timing; the fastest is reported")
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows)
+    artist_index = ArtistIndex.from_series(df['artists'])
+    worker_scaling(df, artist_index, args.workers, args.repeat)
+    sizes = [MIN_ROWS_PER_PART >> shift for shift in (6, 4, 2, 0)] + [MIN_ROWS_PER_PART << 2]
+    part_overhead(df.iloc[:min(len(df), 1 << 22)], sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Incremental loading of the scraped tracks. The scraper appends rows to its
+CSV over time; instead of re-reading the whole file, the data layer keeps a
+watermark of what it has parsed and only parses the new bytes, then folds
+the new rows into the loaded frames and the aggregates built from them.
+"""
+import copy
+import io
+import os
+import threading
+
+import pandas as pd
+
+from utils.compare import SourceSummary
+from utils.export import export_format
+from utils.timeline import YearArtistRollup, parse_release_dates
+from utils.words import WordFrequencies
+
+
+class AppendOnlyFile:
+    """
+    Reads a tracks file in increments. The format follows the extension, as
+    for the scraper's `open_writer` (see utils/export.py). A CSV is assumed
+    to only grow at its end: `poll` parses the complete lines written after
+    the byte watermark (a line still being written waits for the next poll)
+    and starts over when the file shrank or its header or the line before
+    the watermark changed. Parquet and Arrow IPC (.arrow/.feather) files are
+    re-read whole whenever their size or mtime change.
+    """
+
+    TAIL_BYTES = 256 # Bytes before the watermark that must be unchanged for an append
+
+    def __init__(self, path):
+        self.path = path
+        self.format = export_format(path) # Raises ValueError for other extensions
+        self.size = None
+        self.mtime_ns = None
+        self.watermark = 0 # Bytes parsed, always at a line end
+        self.header = b""
+        self.tail = b""
+
+    def _unchanged(self, file):
+        if self.watermark == 0 or os.fstat(file.fileno()).st_size < self.watermark:
+            return False
+        if file.read(len(self.header)) != self.header:
+            return False
+        file.seek(self.watermark - len(self.tail))
+        return file.read(len(self.tail)) == self.tail
+
+    def poll(self):
+        """
+        (new rows, reset) since the last poll: `reset` means the rows replace
+        everything read before. Returns (None, False) when nothing changed,
+        or when a Parquet or Arrow file cannot be read yet because its writer
+        has not closed it (the footer is written last) or a CSV's header is
+        not complete; a later poll picks it up. Raises FileNotFoundError if
+        the file is missing.
+        """
+        stat = os.stat(self.path)
+        if (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime_ns):
+            return None, False
+        read = self._read_appended(stat.st_size) if self.format == 'csv' else self._read_whole()
+        if read is None:
+            return None, False
+        # Recorded only once read, so a file that could not be read is tried again
+        self.size, self.mtime_ns = stat.st_size, stat.st_mtime_ns
+        return read
+
+    def _read_whole(self):
+        import pyarrow as pa
+
+        try:
+            return (pd.read_parquet if self.format == 'parquet' else pd.read_feather)(self.path), True
+        except pa.ArrowInvalid: # Still being written
+            return None
+
+    def _read_appended(self, size):
+        with open(self.path, 'rb') as file:
+            reset = not self._unchanged(file)
+            header, watermark, tail = self.header, self.watermark, self.tail
+            if reset:
+                file.seek(0)
+                header = file.readline()
+                if not header.endswith(b"\n"): # Still being written
+                    return None
+                watermark, tail = len(header), header[-self.TAIL_BYTES:]
+            file.seek(watermark)
+            appended = file.read(size - watermark)
+
+        complete = appended[:appended.rfind(b"\n") + 1]
+        if complete.strip():
+            rows = pd.read_csv(io.BytesIO(header + complete))
+        else:
+            rows = pd.read_csv(io.BytesIO(header)) if reset else None
+        self.header, self.watermark = header, watermark + len(complete)
+        self.tail = complete[-self.TAIL_BYTES:] if complete else tail
+        return rows, reset
+
+
+def timeline_rows(df):
+    """Scraped tracks with a complete release date, plus a 'Release Year' column."""
+    df = df.dropna(subset=['Song Name', 'Artist Name', 'Album Name', 'Release Date', 'Popularity'])
+    df = df.assign(**{'Release Date': parse_release_dates(df['Release Date'])}).dropna(subset=['Release Date'])
+    return df.assign(**{'Release Year': df['Release Date'].dt.year})
+
+
+def kaggle_rows(df):
+    """Scraped tracks renamed to the Kaggle column names so the two sources can be compared."""
+    df = df.rename(columns={
+        'Song Name': 'track_name',
+        'Artist Name': 'artists',
+        'Album Name': 'album',
+        'Release Date': 'release_date',
+        'Popularity': 'popularity'
+    })
+    # Ensure popularity is numeric
+    df = df.assign(popularity=pd.to_numeric(df['popularity'], errors='coerce'))
+    # Add placeholder genre if missing
+    if 'track_genre' not in df.columns:
+        df = df.assign(track_genre='unknown')
+    return df
+
+
+def _append(frame, rows):
+    return rows if frame is None else pd.concat([frame, rows])
+
+
+class ScrapedSnapshot:
+    """
+    One version of the scraped tracks and everything derived from them.
+    Derived results are built in full the first time they are asked for and
+    then kept. A snapshot never changes: `appended` returns the next one,
+    which inherits the results already built here with the new rows merged
+    in (frames concatenated, rollups, word counts and summaries merged, only
+    the new tracks matched). A page run that reads everything from one
+    snapshot therefore sees a single version, however many rows arrive
+    meanwhile.
+    """
+
+    def __init__(self, version, frame, kaggle_tracks, workers=1):
+        self.version = version
+        self.frame = frame
+        self._kaggle_tracks = kaggle_tracks # () -> `KaggleTracks` or `KaggleArtistBlocks` (see utils/matching.py)
+        self.workers = workers
+        self._lock = threading.RLock() # Derived results build on each other
+        self._timeline = None
+        self._as_kaggle = None
+        self._rollup = None
+        self._words = None
+        self._summaries = {} # features -> SourceSummary
+        self._matches = None
+        self._bin_edges = {}
+
+    def appended(self, rows):
+        """The next version: this one with `rows` appended."""
+        # Row labels continue the frame's, so derived rows keep pointing at their source row
+        rows.index = pd.RangeIndex(len(self.frame), len(self.frame) + len(rows))
+        following = ScrapedSnapshot(self.version + 1, _append(self.frame, rows), self._kaggle_tracks, self.workers)
+        timeline, as_kaggle = timeline_rows(rows), kaggle_rows(rows)
+        # Results being built here meanwhile are left out, and built afresh by the next version if needed
+        if self._rollup is not None:
+            following._rollup = self._rollup.merge(YearArtistRollup.from_frame(timeline))
+        if self._words is not None:
+            following._words = self._words.merge(WordFrequencies.from_frame(timeline))
+        following._summaries = {
+            features: copy.deepcopy(summary).update(as_kaggle) for features, summary in self._summaries.items()
+        }
+        if self._matches is not None:
+            matches = self._kaggle_tracks().match(as_kaggle) # Only the new rows
+            following._matches = self._matches
+            if len(matches): # Concatenating an empty frame would turn string columns into object
+                matches = matches.assign(scraped_row=matches['scraped_row'] + len(self._as_kaggle))
+                following._matches = pd.concat([self._matches, matches], ignore_index=True)
+        if self._timeline is not None:
+            following._timeline = _append(self._timeline, timeline)
+        if self._as_kaggle is not None:
+            following._as_kaggle = _append(self._as_kaggle, as_kaggle)
+        return following
+
+    # --- Derived results (built on first use) ---
+
+    def _derived(self, name, build):
+        with self._lock:
+            if getattr(self, name) is None:
+                setattr(self, name, build())
+            return getattr(self, name)
+
+    @property
+    def timeline(self):
+        """Tracks with a complete release date, plus a 'Release Year' column."""
+        return self._derived('_timeline', lambda: timeline_rows(self.frame))
+
+    @property
+    def as_kaggle(self):
+        """Tracks renamed to the Kaggle column names so the two sources can be compared."""
+        return self._derived('_as_kaggle', lambda: kaggle_rows(self.frame))
+
+    @property
+    def rollup(self):
+        """Track counts and popularity sums per (release year, artist) over `timeline`."""
+        return self._derived('_rollup', lambda: YearArtistRollup.from_frame(self.timeline))
+
+    @property
+    def words(self):
+        """Title word counts per (release year, artist) over `timeline`."""
+        return self._derived('_words', lambda: WordFrequencies.from_frame(self.timeline))
+
+    @property
+    def matches(self):
+        """Tracks linked to their Kaggle rows, with popularity deltas (see utils/matching.py)."""
+        # Kaggle is read (once) before taking the lock, so other results do not wait for it
+        kaggle_tracks = self._kaggle_tracks()
+        return self._derived('_matches', lambda: kaggle_tracks.match(self.as_kaggle))
+
+    def summary(self, features=()):
+        """`SourceSummary` of `as_kaggle`, with quantile sketches of `features`."""
+        features = tuple(features)
+        with self._lock:
+            if features not in self._summaries:
+                self._summaries[features] = SourceSummary.from_frame('Scraped', self.as_kaggle, features,
+                                                                     workers=self.workers)
+            return self._summaries[features]
+
+    def bin_edges(self, column, nbins, build):
+        """`build(values, nbins)` for a `timeline` column, e.g. histogram bin edges fixed across filters."""
+        with self._lock:
+            if (column, nbins) not in self._bin_edges:
+                self._bin_edges[column, nbins] = build(self.timeline[column].to_numpy(dtype=float), nbins)
+            return self._bin_edges[column, nbins]
+
+
+class ScrapedData:
+    """
+    The scraped tracks, kept current by `refresh`: each refresh that finds
+    new rows replaces `snapshot` with the next `ScrapedSnapshot`. Readers
+    holding an older snapshot are unaffected.
+    """
+
+    def __init__(self, path, kaggle_tracks, workers=1):
+        self.file = AppendOnlyFile(path)
+        self._kaggle_tracks = kaggle_tracks # () -> `KaggleTracks` or `KaggleArtistBlocks` (see utils/matching.py)
+        self.workers = workers
+        self.snapshot = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Folds in whatever was appended to the file since the last call and
+        returns the current snapshot; cheap when nothing was. Raises
+        FileNotFoundError while the file is missing or nothing complete has
+        been read from it yet.
+        """
+        with self._lock:
+            rows, reset = self.file.poll()
+            if rows is None:
+                if self.snapshot is None:
+                    raise FileNotFoundError(f"No complete scraped data in '{self.file.path}' yet")
+            elif reset:
+                version = self.snapshot.version + 1 if self.snapshot is not None else 1
+                self.snapshot = ScrapedSnapshot(version, rows, self._kaggle_tracks, self.workers)
+            elif len(rows):
+                self.snapshot = self.snapshot.appended(rows)
+            return self.snapshot
@@ -0,0 +1,177 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RequestStats:
+    """Thread-safe counter of HTTP requests, used to report requests/sec for a crawl."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.retries = 0
+        self.started = time.perf_counter()
+
+    def record(self, retry=False):
+        with self._lock:
+            self.count += 1
+            if retry:
+                self.retries += 1
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return f"{self.count} requests ({self.retries} retries) in {elapsed:.1f}s ({self.rate():.1f} req/s)"
+
+
+def make_session(pool_size):
+    # One keep-alive session shared by every call, with enough pooled
+    # connections for all worker threads so none of them has to reconnect.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class TokenCache:
+    """
+    Caches an access token together with its expiry time. `fetch` must return
+    (token, expires_in_seconds); it is called again `refresh_margin` seconds
+    before the cached token runs out, or immediately after `invalidate()`.
+    """
+
+    def __init__(self, fetch, refresh_margin=60, clock=time.monotonic):
+        self._fetch = fetch
+        self._refresh_margin = refresh_margin
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+
+    def get(self):
+        with self._lock:
+            if self._token is None or self._clock() >= self._expires_at - self._refresh_margin:
+                token, expires_in = self._fetch()
+                self._token = token
+                self._expires_at = self._clock() + expires_in
+            return self._token
+
+    def invalidate(self, token):
+        # Only drop the token the caller saw rejected, so a burst of 401s
+        # from parallel workers triggers a single refresh.
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+
+class TokenBucket:
+    """Blocking token bucket allowing `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class RequestScheduler:
+    """
+    Sends every Spotify API request through one pooled session: requests are
+    paced by a token bucket, authorised with a cached bearer token, and retried
+    with jittered exponential backoff on 429/5xx responses, connection errors
+    and timeouts. A 429's `Retry-After` header takes precedence over the
+    computed backoff. Every request gets a (connect, read) `timeout` unless the
+    caller passes its own, so a stalled connection cannot hold a worker forever.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    DEFAULT_TIMEOUT = (5.0, 30.0) # Seconds to connect, and between bytes of the response
+
+    def __init__(self, session, token_cache=None, rate=10.0, burst=None, max_retries=5,
+                 backoff_base=0.5, backoff_cap=30.0, stats=None, sleep=time.sleep, timeout=DEFAULT_TIMEOUT):
+        self.session = session
+        self.timeout = timeout
+        self.token_cache = token_cache
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.stats = stats if stats is not None else RequestStats()
+        self._sleep = sleep
+
+    def _backoff(self, attempt):
+        # "Full jitter": a random delay up to the exponential ceiling
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, auth=True, **kwargs):
+        headers = dict(kwargs.pop("headers", None) or {})
+        kwargs.setdefault("timeout", self.timeout)
+        refreshed = False
+
+        for attempt in range(self.max_retries + 1):
+            token = None
+            if auth:
+                token = self.token_cache.get()
+                headers["Authorization"] = "Bearer " + token
+
+            self.bucket.acquire()
+            self.stats.record(retry=attempt > 0)
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 401 and auth and not refreshed:
+                # Token expired or was revoked early: fetch a new one and retry once
+                self.token_cache.invalidate(token)
+                refreshed = True
+                continue
+
+            if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = response.headers.get("Retry-After")
+                if response.status_code == 429 and retry_after is not None:
+                    try:
+                        delay = float(retry_after) + random.uniform(0, self.backoff_base)
+                    except ValueError:
+                        delay = self._backoff(attempt)
+                else:
+                    delay = self._backoff(attempt)
+                self._sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response
+
+        response.raise_for_status()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
@@ -0,0 +1,186 @@
+"""
+Mergeable quantile and distinct-count sketches, so distribution charts and
+counts over large columns are drawn from a handful of summary numbers
+instead of every row.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_K = 200 # Rank error is roughly 1.7 / k
+DEFAULT_TAIL = 100 # Exact extreme values kept at each end, for outliers
+DEFAULT_DISTINCT_K = 4096 # Relative error of the distinct count is roughly 1 / sqrt(k)
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch. Items are kept in compactors whose weight doubles
+    per level; a compactor over its capacity sorts itself and promotes every
+    other item (from a random offset) to the next level. Memory stays
+    O(k log(n / k)) items and two sketches merge by concatenating their
+    levels. The count and the `tail` smallest and largest values are kept
+    exactly. Missing values are ignored.
+    """
+
+    def __init__(self, k=DEFAULT_K, tail=DEFAULT_TAIL, seed=0):
+        self.k = k
+        self.tail = tail
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.low_tail = np.empty(0)
+        self.high_tail = np.empty(0)
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_values(cls, values, k=DEFAULT_K, chunk_size=1 << 16):
+        """Sketch of `values`, fed in chunks as a stream would be."""
+        sketch = cls(k)
+        values = np.asarray(values, dtype=np.float64)
+        for start in range(0, len(values), chunk_size):
+            sketch.update(values[start:start + chunk_size])
+        return sketch
+
+    def _capacity(self, level):
+        # Lower levels shrink geometrically, as in the KLL paper (c = 2/3)
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            odd = len(items) % 2
+            promoted = items[odd:][self._rng.integers(2)::2]
+            self.levels[level] = items[:odd] # An odd item out stays behind
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level = 0 # Capacities changed if a level was added
+
+    @property
+    def min(self):
+        return self.low_tail.min() if len(self.low_tail) else np.nan
+
+    @property
+    def max(self):
+        return self.high_tail.max() if len(self.high_tail) else np.nan
+
+    def _update_tails(self, low, high):
+        low = np.concatenate([self.low_tail, low])
+        high = np.concatenate([self.high_tail, high])
+        if len(low) > self.tail:
+            low = np.partition(low, self.tail - 1)[:self.tail]
+        if len(high) > self.tail:
+            high = np.partition(high, len(high) - self.tail)[-self.tail:]
+        self.low_tail, self.high_tail = low, high
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self._update_tails(values, values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Folds `other` into this sketch and returns it."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._update_tails(other.low_tail, other.high_tail)
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(part), 2.0 ** level) for level, part in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantiles(self, qs):
+        """Approximate quantiles for the fractions `qs`; NaN when the sketch is empty."""
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        items, weights = self._weighted_items()
+        cumulative = np.cumsum(weights)
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        result = items[np.minimum(positions, len(items) - 1)]
+        # The ends are known exactly
+        result = np.where(qs <= 0, self.min, np.where(qs >= 1, self.max, result))
+        return np.clip(result, self.min, self.max)
+
+    def box_summary(self, max_outliers=200):
+        """
+        Box plot statistics: quartiles, Tukey whiskers (the most extreme
+        known values within 1.5 IQR of the box) and up to `max_outliers`
+        of the exact tail and sketch values beyond them. Returns None for an
+        empty sketch.
+        """
+        if self.count == 0:
+            return None
+        q1, median, q3 = self.quantiles([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        items = np.concatenate([self._weighted_items()[0], self.low_tail, self.high_tail])
+        inside = items[(items >= q1 - 1.5 * iqr) & (items <= q3 + 1.5 * iqr)]
+        lower = min(inside.min(), q1) if len(inside) else q1
+        upper = max(inside.max(), q3) if len(inside) else q3
+
+        outliers = np.unique(items[(items < lower) | (items > upper)])
+        if len(outliers) > max_outliers:
+            outliers = np.sort(self._rng.choice(outliers, max_outliers, replace=False))
+        return {
+            'count': self.count, 'min': self.min, 'max': self.max,
+            'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': lower, 'upperfence': upper, 'outliers': outliers,
+        }
+
+
+class DistinctSketch:
+    """
+    K-minimum-values distinct-count sketch. Values are hashed to 64 bits and
+    only the `k` smallest distinct hashes are kept; if the hashes are
+    uniform, n distinct values put the k-th smallest near k / n of the hash
+    range, which gives the estimate. Up to `k` distinct values the count is
+    exact. Memory is at most `k` hashes however many values are seen, and
+    two sketches merge by keeping the `k` smallest of their union, so the
+    result does not depend on how the values were split. Missing values are
+    ignored.
+    """
+
+    def __init__(self, k=DEFAULT_DISTINCT_K):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64) # Sorted, distinct
+
+    def _keep(self, hashes):
+        self.hashes = np.unique(hashes)[:self.k]
+
+    def update(self, values):
+        values = pd.Series(values, dtype=object).dropna().unique()
+        if len(values):
+            self._keep(np.concatenate([self.hashes, pd.util.hash_array(values)]))
+        return self
+
+    def merge(self, other):
+        """Folds `other` into this sketch and returns it."""
+        self._keep(np.concatenate([self.hashes, other.hashes]))
+        return self
+
+    @property
+    def is_exact(self):
+        return len(self.hashes) < self.k
+
+    def count(self):
+        """Number of distinct values: exact below `k`, else the (unbiased) KMV estimate."""
+        if self.is_exact:
+            return len(self.hashes)
+        kth = (float(self.hashes[-1]) + 1) / 2.0 ** 64 # Fraction of the hash range below the k-th hash
+        return (self.k - 1) / kth
@@ -0,0 +1,138 @@
+import json
+import sqlite3
+import time
+
+
+class CrawlStore:
+    """
+    SQLite-backed progress store for the scraper. Tracks are keyed by track id
+    (so duplicates are dropped on insert), artists by artist id, and the next
+    search offset is kept per query, which lets an interrupted crawl resume
+    where it stopped instead of starting over.
+    """
+
+    def __init__(self, path="crawl.sqlite"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS artists (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                found_via TEXT,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS tracks (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT UNIQUE NOT NULL,
+                artist_id TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pending_artists (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                found_via TEXT
+            );
+            CREATE TABLE IF NOT EXISTS search_offsets (
+                query TEXT PRIMARY KEY,
+                next_offset INTEGER NOT NULL,
+                exhausted INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Artists ---
+    def fetched_artist_ids(self):
+        return [artist_id for (artist_id,) in self.conn.execute("SELECT id FROM artists")]
+
+    def add_pending_artists(self, artists):
+        """Records discovered artists that still have to be fetched."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO pending_artists (id, name, found_via) VALUES (?, ?, ?)",
+                [(artist["id"], artist.get("name"), artist.get("found_via")) for artist in artists]
+            )
+
+    def pending_artists(self):
+        return [{"id": artist_id, "name": name, "found_via": found_via} for artist_id, name, found_via in
+                self.conn.execute("SELECT id, name, found_via FROM pending_artists")]
+
+    def save_artist_tracks(self, artist, tracks):
+        """
+        Stores an artist's tracks, marks the artist fetched and removes it from
+        the pending artists, all in one transaction. Returns the tracks that were new.
+        """
+        added = []
+        with self.conn:
+            for track in tracks:
+                if not track.get("id"):
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO tracks (id, artist_id, data) VALUES (?, ?, ?)",
+                    (track["id"], artist["id"], json.dumps(track))
+                )
+                if cursor.rowcount:
+                    added.append(track)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO artists (id, name, found_via, fetched_at) VALUES (?, ?, ?, ?)",
+                (artist["id"], artist.get("name"), artist.get("found_via"), time.time())
+            )
+            self.conn.execute("DELETE FROM pending_artists WHERE id = ?", (artist["id"],))
+        return added
+
+    # --- Tracks ---
+    def track_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def update_tracks(self, tracks):
+        """Replaces the stored data of existing tracks, e.g. after enrichment."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE tracks SET data = ? WHERE id = ?",
+                [(json.dumps(track), track["id"]) for track in tracks]
+            )
+
+    def iter_tracks(self, limit=None, page_size=1000):
+        """
+        Yields stored tracks in the order they were first collected. Rows are
+        read a page at a time, so the store can be updated while iterating.
+        """
+        last_seq = 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            rows = self.conn.execute(
+                "SELECT seq, data FROM tracks WHERE seq > ? ORDER BY seq LIMIT ?", (last_seq, size)
+            ).fetchall()
+            if not rows:
+                return
+            for seq, data in rows:
+                yield json.loads(data)
+            last_seq = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    # --- Search paging ---
+    def next_offset(self, query):
+        """Returns the next search offset for `query`, or None once its results are exhausted."""
+        row = self.conn.execute(
+            "SELECT next_offset, exhausted FROM search_offsets WHERE query = ?", (query,)
+        ).fetchone()
+        if row is None:
+            return 0
+        return None if row[1] else row[0]
+
+    def advance_offset(self, query, next_offset, exhausted=False):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO search_offsets (query, next_offset, exhausted) VALUES (?, ?, ?)",
+                (query, next_offset, int(exhausted))
+            )
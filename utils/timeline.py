@@ -0,0 +1,114 @@
+"""
+Release-date handling for the scraped tracks: fixed-format parsing of
+Spotify's variable-precision dates and per-(year, artist) rollups that the
+time filters and charts read instead of scanning rows.
+"""
+import numpy as np
+import pandas as pd
+
+# Spotify release dates are "YYYY", "YYYY-MM" or "YYYY-MM-DD" depending on
+# their precision, so the string length picks the format
+RELEASE_DATE_FORMATS = {4: '%Y', 7: '%Y-%m', 10: '%Y-%m-%d'}
+
+
+def parse_release_dates(values):
+    """
+    Release dates as datetime64, parsed with one fixed format per precision
+    (missing month or day become the first); unparseable values and dates
+    outside the datetime64[ns] range are NaT.
+    Already-parsed datetimes are returned unchanged.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    text = values.astype(str).str.strip()
+    lengths = text.str.len().to_numpy()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for length, date_format in RELEASE_DATE_FORMATS.items():
+        mask = lengths == length
+        if mask.any():
+            dates = pd.to_datetime(text[mask], format=date_format, errors='coerce')
+            # Spotify reports unknown dates as "0000", which is out of range for nanoseconds
+            parsed[mask] = dates.where(dates.between(pd.Timestamp.min, pd.Timestamp.max))
+    return parsed
+
+
+class YearArtistRollup:
+    """
+    Track count and popularity sum for every (release year, artist) pair in
+    the data. Filters on year range and artists select pairs, so every
+    answer costs a pass over the pairs rather than over the tracks.
+    """
+
+    def __init__(self, years, artist_codes, artist_names, counts, popularity_sums):
+        self.years = years
+        self.artist_codes = artist_codes
+        self.artist_names = artist_names
+        self.counts = counts
+        self.popularity_sums = popularity_sums
+
+    @classmethod
+    def from_frame(cls, df, year_col='Release Year', artist_col='Artist Name', popularity_col='Popularity'):
+        artist_codes, artist_names = pd.factorize(df[artist_col], sort=True)
+        years = df[year_col].to_numpy(dtype=np.int64)
+        popularity = df[popularity_col].to_numpy(dtype=np.float64)
+
+        n_artists = len(artist_names)
+        year_min = years.min() if len(years) else 0
+        pair_keys = (years - year_min) * n_artists + artist_codes
+        pairs, pair_of_row = np.unique(pair_keys, return_inverse=True)
+        counts = np.bincount(pair_of_row, minlength=len(pairs))
+        popularity_sums = np.bincount(pair_of_row, weights=popularity, minlength=len(pairs))
+        return cls(pairs // max(n_artists, 1) + year_min, pairs % max(n_artists, 1),
+                   np.asarray(artist_names, dtype=object), counts, popularity_sums)
+
+    def merge(self, other):
+        """A new rollup of the tracks of both, e.g. the loaded tracks and newly appended ones."""
+        artist_names = np.union1d(self.artist_names, other.artist_names) # Sorted, as from_frame
+        artist_codes = np.concatenate([
+            np.searchsorted(artist_names, self.artist_names)[self.artist_codes],
+            np.searchsorted(artist_names, other.artist_names)[other.artist_codes],
+        ])
+        years = np.concatenate([self.years, other.years]).astype(np.int64)
+
+        n_artists = max(len(artist_names), 1)
+        year_min = years.min() if len(years) else 0
+        pairs, pair_of_entry = np.unique((years - year_min) * n_artists + artist_codes, return_inverse=True)
+        counts = np.bincount(pair_of_entry, weights=np.concatenate([self.counts, other.counts]), minlength=len(pairs))
+        popularity_sums = np.bincount(pair_of_entry, weights=np.concatenate([self.popularity_sums, other.popularity_sums]),
+                                      minlength=len(pairs))
+        return YearArtistRollup(pairs // n_artists + year_min, pairs % n_artists, np.asarray(artist_names, dtype=object),
+                                counts.astype(np.int64), popularity_sums)
+
+    @property
+    def year_bounds(self):
+        return int(self.years.min()), int(self.years.max())
+
+    def _selected(self, year_range=None, artists=None):
+        selected = np.ones(len(self.years), dtype=bool)
+        if year_range is not None:
+            selected &= (self.years >= year_range[0]) & (self.years <= year_range[1])
+        if artists:
+            codes = np.flatnonzero(np.isin(self.artist_names, list(artists)))
+            selected &= np.isin(self.artist_codes, codes)
+        return selected
+
+    def artists_in(self, year_range=None):
+        """Sorted names of the artists with a release in the year range."""
+        return self.artist_names[np.unique(self.artist_codes[self._selected(year_range)])].tolist()
+
+    def totals(self, year_range=None, artists=None):
+        """(track count, distinct artists, mean popularity) of the selection; the mean is NaN when empty."""
+        selected = self._selected(year_range, artists)
+        count = int(self.counts[selected].sum())
+        mean_popularity = self.popularity_sums[selected].sum() / count if count else float('nan')
+        return count, len(np.unique(self.artist_codes[selected])), mean_popularity
+
+    def per_year(self, year_range=None, artists=None):
+        """Track count and mean popularity per release year of the selection, indexed by year."""
+        selected = self._selected(year_range, artists)
+        years, year_of_pair = np.unique(self.years[selected], return_inverse=True)
+        counts = np.bincount(year_of_pair, weights=self.counts[selected], minlength=len(years))
+        sums = np.bincount(year_of_pair, weights=self.popularity_sums[selected], minlength=len(years))
+        return pd.DataFrame({'count': counts.astype(np.int64), 'mean_popularity': sums / counts},
+                            index=pd.Index(years, name='year'))
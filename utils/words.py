@@ -0,0 +1,122 @@
+"""
+Title word counts for the word cloud, precomputed per (release year,
+artist) so a filter only merges a few count vectors instead of re-reading
+and re-tokenizing every title.
+"""
+import io
+import re
+
+import numpy as np
+import pandas as pd
+from wordcloud import STOPWORDS, WordCloud
+
+from utils.index import expand_ranges, top_k
+
+# WordCloud's own tokenizer; compiled so pandas uses Python's Unicode-aware \w
+WORD_PATTERN = re.compile(r"\w[\w']*")
+MAX_WORDS = 200 # WordCloud's default
+
+
+def title_words(titles):
+    """
+    Words of each title as WordCloud would count them: lower-cased, "'s"
+    removed, numbers and stopwords dropped. Returns a Series of words
+    indexed by the title's position.
+    """
+    words = pd.Series(titles, dtype=object).reset_index(drop=True).str.findall(WORD_PATTERN).explode().dropna()
+    words = words.astype(str).str.lower().str.replace(r"'s$", "", regex=True)
+    return words[~words.isin(STOPWORDS) & ~words.str.isdigit() & (words != "")]
+
+
+def _plural_fold(vocabulary):
+    """Code each word is counted under: "dogs" counts as "dog" when "dog" is also used."""
+    lookup = {word: code for code, word in enumerate(vocabulary)}
+    return np.array([
+        lookup.get(word[:-1], code) if word.endswith('s') and not word.endswith('ss') else code
+        for code, word in enumerate(vocabulary)
+    ], dtype=np.int64)
+
+
+class WordFrequencies:
+    """
+    Sparse word counts per (year, artist) group in CSR form: group `g`
+    counted `counts[i]` uses of `words[word_codes[i]]` for
+    `offsets[g] <= i < offsets[g + 1]`. Plurals are folded into their
+    singular when both occur, as WordCloud does.
+    """
+
+    def __init__(self, words, years, artists, offsets, word_codes, counts):
+        self.words = words
+        self.years = years
+        self.artists = artists
+        self.offsets = offsets
+        self.word_codes = word_codes
+        self.counts = counts
+
+    @classmethod
+    def _from_counts(cls, vocabulary, groups, group_codes, word_codes, counts):
+        """From (group, word, count) entries, which may repeat a pair: plurals folded, then one count per pair."""
+        word_codes = _plural_fold(vocabulary)[word_codes]
+
+        # One count per (group, word) pair, sorted by group
+        n_words = len(vocabulary)
+        pairs = np.asarray(group_codes, dtype=np.int64) * n_words + word_codes
+        pair_ids, pair_of_entry = np.unique(pairs, return_inverse=True)
+        pair_counts = np.bincount(pair_of_entry, weights=counts, minlength=len(pair_ids))
+        pair_groups = pair_ids // max(n_words, 1)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(pair_groups, minlength=len(groups)))])
+        return cls(
+            np.asarray(vocabulary, dtype=object), groups.get_level_values(0).to_numpy(),
+            groups.get_level_values(1).to_numpy(dtype=object), offsets,
+            (pair_ids % max(n_words, 1)).astype(np.int32), pair_counts.astype(np.int32)
+        )
+
+    @classmethod
+    def from_frame(cls, df, title_col='Song Name', year_col='Release Year', artist_col='Artist Name'):
+        group_codes, groups = pd.MultiIndex.from_arrays([df[year_col], df[artist_col]]).factorize()
+        words = title_words(df[title_col].to_numpy())
+        word_codes, vocabulary = pd.factorize(words.to_numpy())
+        return cls._from_counts(vocabulary, groups, group_codes[words.index.to_numpy()], word_codes,
+                                np.ones(len(word_codes)))
+
+    def merge(self, other):
+        """
+        New counts over the titles of both, e.g. the loaded tracks and newly
+        appended ones; plurals are folded over the combined vocabulary, so the
+        result is the same as counting all titles at once.
+        """
+        group_codes, groups = pd.MultiIndex.from_arrays([
+            np.concatenate([self.years, other.years]), np.concatenate([self.artists, other.artists])
+        ]).factorize()
+        word_codes, vocabulary = pd.factorize(np.concatenate([self.words, other.words]))
+        entry_groups = [np.repeat(np.arange(len(part.years)), np.diff(part.offsets)) for part in (self, other)]
+        return self._from_counts(
+            vocabulary, groups,
+            np.concatenate([group_codes[entry_groups[0]], group_codes[len(self.years) + entry_groups[1]]]),
+            np.concatenate([word_codes[self.word_codes], word_codes[len(self.words) + other.word_codes]]),
+            np.concatenate([self.counts, other.counts]).astype(np.float64)
+        )
+
+    def frequencies(self, year_range=None, artists=None, max_words=MAX_WORDS):
+        """{word: count} of the `max_words` most used words in the selected years and artists (all when None/empty)."""
+        selected = np.ones(len(self.years), dtype=bool)
+        if year_range is not None:
+            selected &= (self.years >= year_range[0]) & (self.years <= year_range[1])
+        if artists:
+            selected &= np.isin(self.artists, list(artists))
+        groups = np.flatnonzero(selected)
+        entries = expand_ranges(self.offsets[groups], self.offsets[groups + 1] - self.offsets[groups])
+        totals = np.bincount(self.word_codes[entries], weights=self.counts[entries], minlength=len(self.words))
+        top = top_k(totals, max_words)
+        top = top[totals[top] > 0]
+        return dict(zip(self.words[top], totals[top].astype(int).tolist()))
+
+
+def word_cloud_png(frequencies, width=800, height=400, background_color='white'):
+    """The word cloud of `frequencies` rendered straight to PNG bytes; None when there are no words."""
+    if not frequencies:
+        return None
+    cloud = WordCloud(width=width, height=height, background_color=background_color).generate_from_frequencies(frequencies)
+    buffer = io.BytesIO()
+    cloud.to_image().save(buffer, format='PNG')
+    return buffer.getvalue()